@@ -18,13 +18,17 @@ class Button:
                     ont is a valid pygame Font object.
 
         EFFECTS: Sets up the button image, text surfaces, rectangles, and clicked flag.
+                 The text is rendered once in each color (normal and hovered).
         """
         self.x = x # x coordinate of center of button
         self.y = y # y coordinate of center of button
         self.image = image # image to display button
         self.font = font  # font for button display
         self.text_input = text # text for button display
-        self.text = set_text(text, COLOR_WHITE, self.font) # text for button with font
+        self.text_normal = set_text(text, COLOR_WHITE, self.font) # text for button with font
+        self.text_hover = set_text(text, COLOR_GREEN, self.font) # text shown while the mouse is over the button
+        self.text = self.text_normal # text surface currently displayed
+        self.hovered = False # represents whether the mouse was over the button when last checked
         self.rect_image = self.image.get_rect(center=(self.x, self.y)) # rect image for button
         self.rect_text = self.text.get_rect(center=(self.x, self.y)) # rect image for text
         self.clicked = False # represents whether the button has been clicked
@@ -67,25 +71,38 @@ class Button:
             self.clicked = False
         return action
 
+    def is_clicked_by(self, event) -> bool:
+        """
+        PURPOSE: Determine if an event is a left click on the button.
+
+        PARAMETERS: event is a pygame Event.
+
+        RETURNS: True if event is a left mouse button press inside the button, False otherwise.
+        """
+        return (event.type == pygame.MOUSEBUTTONDOWN and event.button == 1
+                and self.rect_image.collidepoint(event.pos))
+
     def change_color(self, screen):
         """
         PURPOSE: Change the button text color when the mouse hovers over it.
 
         PARAMETER: screen is a valid pygame Surface.
 
-        MODIFIES: self.text updated based on hover state.
+        MODIFIES: self.text, self.hovered updated based on hover state.
                   screen (pixels updated when draw is called).
 
-        EFFECTS: Changes text color to COLOR_GREEN when hovered, COLOR_WHITE otherwise.
-                 Redraws the button.
-        """
-        mouse_position = pygame.mouse.get_pos()
-        if self.rect_image.collidepoint(mouse_position):
-            self.text = set_text(self.text_input, COLOR_GREEN, self.font)
-        else:
-            self.text = set_text(self.text_input, COLOR_WHITE, self.font)
+        EFFECTS: Swaps to the pre-rendered COLOR_GREEN text when hovered, COLOR_WHITE otherwise,
+                 and redraws the button only when the hover state changed.
 
+        RETURNS: True if the button was redrawn, False otherwise.
+        """
+        hovered = self.rect_image.collidepoint(pygame.mouse.get_pos())
+        if hovered == self.hovered:
+            return False
+        self.hovered = hovered
+        self.text = self.text_hover if hovered else self.text_normal
         self.draw(screen)
+        return True
 
 
 
@@ -100,8 +117,7 @@ def create_button(x, y, text, scale, font):
                 font is a valid pygame Font object.
     RETURNS: A Button object.
     """
-    button_img = pygame.image.load('images/buttonImage.png')
-    button_img = pygame.transform.scale(button_img, scale)
+    button_img = load_image('images/buttonImage.png', scale)
     button = Button(x, y, button_img, text, font)
     return button
 
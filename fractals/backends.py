@@ -0,0 +1,298 @@
+import json
+import math
+import os
+import platform
+import time
+import warnings
+import numpy as np
+
+try:
+    import numba
+except ImportError: # the JIT backend is optional
+    numba = None
+
+BACKEND = os.environ.get("FRACTALS_BACKEND", "auto") # escape-count kernel to use; "auto" picks the fastest one
+FALLBACK_BACKEND = "python" # kernel that needs nothing beyond the standard library, the reference for calibration
+BACKEND_CACHE_FILE = os.environ.get("FRACTALS_BACKEND_CACHE",
+                                    os.path.join(os.path.expanduser("~"), ".cache", "fractals", "backend.json"))
+CALIBRATION_VERSION = 2 # bump whenever a kernel changes, to calibrate again
+CALIBRATION_VIEW = ((-2, 1), (-1.5, 1.5)) # x and y limits of the view every backend computes during calibration
+CALIBRATION_SIZE = (64, 64) # pixels of the calibration view
+CALIBRATION_ITERATIONS = 200
+CALIBRATION_REPEATS = 3 # timed runs per backend; the fastest one counts
+
+backends = {} # name -> Backend, in the order they were registered
+selected_backend = None # Backend compute_escape_counts runs on, chosen on first use
+calibration = None # tuple (name, timings) of the calibration run by this process, None if none ran
+
+
+class Backend:
+    """
+    PURPOSE: An implementation of the escape-count kernel. All backends give identical counts.
+    """
+
+    def __init__(self, name, compute, description):
+        """
+        PURPOSE: Describe a backend.
+
+        PARAMETERS: name is the short name used by FRACTALS_BACKEND and the --backend flags.
+                    compute is a function (c_grid, max_iterations, magnitudes=None, z_grid=None)
+                    with the contract of mandelbrot.compute_escape_counts.
+                    description is a few words shown to the user.
+        """
+        self.name = name
+        self.compute = compute
+        self.description = description
+
+
+def register_backend(name, compute, description):
+    """
+    PURPOSE: Make a backend available for selection.
+
+    MODIFIES: backends (global variable).
+    """
+    backends[name] = Backend(name, compute, description)
+
+
+def get_backend_names() -> list:
+    """
+    PURPOSE: Returns the names of the available backends, in registration order.
+    """
+    return list(backends)
+
+
+def get_calibration_grid() -> np.ndarray:
+    """
+    PURPOSE: Build the points computed by every backend during calibration.
+
+    RETURNS: A complex128 array of shape CALIBRATION_SIZE covering CALIBRATION_VIEW,
+             indexed as [x, y] like mandelbrot.get_complex_grid.
+    """
+    (x_min, x_max), (y_min, y_max) = CALIBRATION_VIEW
+    width, height = CALIBRATION_SIZE
+    real = x_min + np.arange(width) * (x_max - x_min) / width
+    imag = y_max - np.arange(height) * (y_max - y_min) / height
+    return real[:, np.newaxis] + 1j * imag[np.newaxis, :]
+
+
+def calibrate_backends() -> dict:
+    """
+    PURPOSE: Time every available backend on the calibration view.
+
+    RETURNS: A dict mapping backend names to their fastest time in seconds. Backends that
+             fail, or whose escape counts or escape magnitudes differ from those of
+             FALLBACK_BACKEND, are left out (with a RuntimeWarning).
+
+    EFFECTS: Every backend is run once untimed first, so JIT compilation is not timed.
+    """
+    c_grid = get_calibration_grid()
+    reference_magnitudes = np.zeros(c_grid.shape)
+    reference = backends[FALLBACK_BACKEND].compute(c_grid, CALIBRATION_ITERATIONS, reference_magnitudes)
+    timings = {}
+    for name, backend in backends.items():
+        magnitudes = np.zeros(c_grid.shape)
+        try:
+            counts = backend.compute(c_grid, CALIBRATION_ITERATIONS, magnitudes)
+        except Exception as error:
+            warnings.warn(f"Compute backend {name} failed and is skipped: {error}", RuntimeWarning)
+            continue
+        if not np.array_equal(counts, reference) or not np.array_equal(magnitudes, reference_magnitudes):
+            warnings.warn(f"Compute backend {name} does not match the {FALLBACK_BACKEND} backend and is skipped",
+                          RuntimeWarning)
+            continue
+        best = math.inf
+        for _ in range(CALIBRATION_REPEATS):
+            started = time.perf_counter()
+            backend.compute(c_grid, CALIBRATION_ITERATIONS)
+            best = min(best, time.perf_counter() - started)
+        timings[name] = best
+    return timings
+
+
+def get_machine_key() -> dict:
+    """
+    PURPOSE: Describe what a calibration depends on: the machine, the Python and library
+             versions, the available backends and CALIBRATION_VERSION.
+    """
+    return {"machine": platform.machine(), "processor": platform.processor(), "cpus": os.cpu_count(),
+            "python": platform.python_version(), "numpy": np.__version__,
+            "numba": numba.__version__ if numba is not None else None,
+            "backends": get_backend_names(), "version": CALIBRATION_VERSION}
+
+
+def load_calibration():
+    """
+    PURPOSE: Read the backend chosen by the last calibration on this machine.
+
+    RETURNS: The backend name saved in BACKEND_CACHE_FILE, or None when there is no
+             cache, it is unreadable, or it was written for another machine key.
+    """
+    try:
+        with open(BACKEND_CACHE_FILE) as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("key") != get_machine_key() or cached.get("backend") not in backends:
+        return None
+    return cached["backend"]
+
+
+def save_calibration(name, timings):
+    """
+    PURPOSE: Save the result of a calibration to BACKEND_CACHE_FILE.
+
+    EFFECTS: Failing to write the cache is not an error; the next session calibrates again.
+    """
+    try:
+        os.makedirs(os.path.dirname(BACKEND_CACHE_FILE) or ".", exist_ok=True)
+        with open(BACKEND_CACHE_FILE, "w") as file:
+            json.dump({"key": get_machine_key(), "backend": name, "seconds": timings}, file, indent=2)
+    except OSError:
+        pass
+
+
+def choose_fastest_backend() -> str:
+    """
+    PURPOSE: Find the fastest backend of this machine, from the cached calibration or by calibrating.
+
+    MODIFIES: BACKEND_CACHE_FILE and calibration (global variable), when calibrating.
+
+    RETURNS: A backend name; FALLBACK_BACKEND when no other backend passed calibration.
+    """
+    global calibration
+    name = load_calibration()
+    if name is not None:
+        return name
+    timings = calibrate_backends()
+    name = min(timings, key=timings.get) if timings else FALLBACK_BACKEND
+    calibration = (name, timings)
+    save_calibration(name, timings)
+    return name
+
+
+def get_calibration_report():
+    """
+    PURPOSE: Describe the calibration run by this process, for the command-line programs to print
+             (the library itself prints nothing).
+
+    RETURNS: A line with the time of every backend and the one chosen, or None when no
+             calibration ran (a backend was named, or the cached choice was used).
+    """
+    if calibration is None:
+        return None
+    name, timings = calibration
+    return "Compute backends: " + ", ".join(f"{backend} {seconds * 1000:.1f} ms"
+                                            for backend, seconds in timings.items()) + f" - using {name}"
+
+
+def select_backend(name=None) -> Backend:
+    """
+    PURPOSE: Choose the backend the escape counts are computed with.
+
+    PARAMETERS: name is a backend name, "auto" for the fastest one, or None for BACKEND
+                (the FRACTALS_BACKEND environment variable, "auto" when unset).
+
+    MODIFIES: selected_backend (global variable).
+
+    EFFECTS: A backend that is not available (e.g. numba when Numba is not installed)
+             issues a RuntimeWarning and the fastest available one is used instead.
+
+    RETURNS: The selected Backend.
+    """
+    global selected_backend
+    name = BACKEND if name is None else name
+    if name != "auto" and name not in backends:
+        warnings.warn(f"Compute backend {name} is not available (available: {', '.join(backends)}), "
+                      "choosing automatically", RuntimeWarning, stacklevel=2)
+        name = "auto"
+    if name == "auto":
+        name = choose_fastest_backend()
+    selected_backend = backends[name]
+    return selected_backend
+
+
+def get_backend() -> Backend:
+    """
+    PURPOSE: Returns the selected backend, selecting one with select_backend on first use.
+    """
+    if selected_backend is None:
+        return select_backend()
+    return selected_backend
+
+
+def is_selected(name) -> bool:
+    """
+    PURPOSE: Tell whether the backend called name is the selected one, without selecting a backend.
+    """
+    return selected_backend is not None and selected_backend.name == name
+
+
+def iterate_points(c_real, c_imag, z_real, z_imag, saved_real, saved_imag, first_iteration, max_iterations,
+                   first_save, counts, magnitudes, status, cardioid, periodicity, tolerance_squared) -> tuple:
+    """
+    PURPOSE: Scalar escape-time loop over flat arrays of points, compiled by the numba backend.
+             It follows mandelbrot.EscapeState.iterate operation for operation, so that the
+             counts and magnitudes come out identical, and like it can resume an iteration.
+
+    PARAMETERS: c_real, c_imag are float64 arrays of the points' parameters.
+                z_real, z_imag are float64 arrays of the z the points have reached.
+                saved_real, saved_imag are float64 arrays of their z saved for the periodicity check.
+                first_iteration is the number of iterations already done, max_iterations the limit.
+                first_save is the iteration at which z is saved next (PERIODICITY_FIRST_CHECK
+                when starting); it doubles at every save.
+                counts is an int32 array receiving the escape counts.
+                magnitudes is a float64 array receiving |z| at escape, or an empty array.
+                status is a uint8 array receiving 0 for escaped points, 1 for points still
+                iterated at the limit and 2 for points found inside the set.
+                cardioid skips the iteration of cardioid and bulb points (only valid from z = 0).
+                periodicity enables the periodicity check, with tolerance_squared the squared
+                PERIODICITY_TOLERANCE.
+
+    MODIFIES: z_real, z_imag, saved_real, saved_imag (of the points still iterated),
+              counts, magnitudes, status.
+
+    RETURNS: A tuple (iterated, steps): the number of points iterated (not skipped by the
+             cardioid test) and the number of z updates done.
+    """
+    iterated = 0
+    steps = 0
+    for i in range(c_real.size):
+        x, y = c_real[i], c_imag[i]
+        counts[i] = max_iterations
+        status[i] = 1
+        if cardioid:
+            y_squared = y * y
+            shifted = x - 0.25
+            q = shifted * shifted + y_squared
+            if q * (q + shifted) < 0.25 * y_squared or (x + 1) * (x + 1) + y_squared < 0.0625:
+                status[i] = 2
+                continue
+        iterated += 1
+        point_real, point_imag = z_real[i], z_imag[i]
+        last_real, last_imag = saved_real[i], saved_imag[i]
+        next_save = first_save
+        for n in range(first_iteration, max_iterations):
+            steps += 1
+            magnitude = math.hypot(point_real, point_imag)
+            if magnitude > 2:
+                counts[i] = n
+                status[i] = 0
+                if magnitudes.size:
+                    magnitudes[i] = magnitude
+                break
+            point_real, point_imag = (point_real * point_real - point_imag * point_imag) + x, \
+                                     (point_real * point_imag + point_imag * point_real) + y
+            if periodicity:
+                distance_real, distance_imag = point_real - last_real, point_imag - last_imag
+                if distance_real * distance_real + distance_imag * distance_imag < tolerance_squared:
+                    status[i] = 2
+                    break
+                if n + 1 == next_save:
+                    last_real, last_imag = point_real, point_imag
+                    next_save *= 2
+        z_real[i], z_imag[i] = point_real, point_imag
+        saved_real[i], saved_imag[i] = last_real, last_imag
+    return iterated, steps
+
+
+iterate_points_jit = numba.njit(cache=True, nogil=True)(iterate_points) if numba is not None else None
@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # run without a window
+if __package__: # run as python -m fractals.benchmarks: the modules import each other by their bare names
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+import pygame
+from mandelbrot import *
+from perturbation import compute_iterations_precise, is_deep_zoom
+from progressive import viewport_passes
+from sierpinski import draw_sierpinski
+from sierpinski_recursive import sierpinski_recursive
+from backends import BACKEND, get_backend_names, get_calibration_report
+import tile_store
+
+BASELINE_FILE = "benchmark_baseline.json" # default place the baseline is stored
+REGRESSION_THRESHOLD = 0.25 # a case fails when it is this much slower than its baseline
+REPEATS = 3 # every case is timed this many times and the fastest run is kept
+
+MANDELBROT_VIEWPORTS = {
+    "full": ((Decimal("-0.5"), Decimal(0)), Decimal(3)),
+    "boundary": ((Decimal("-0.7453"), Decimal("0.1127")), Decimal("0.005")),
+    "interior": ((Decimal("-0.15"), Decimal("0.1")), Decimal("0.4")),
+    "deep": ((Decimal("-1.7499371995"), Decimal(0)), Decimal("1e-20")),
+}
+MANDELBROT_RENDERERS = ("frame", "progressive") # see mandelbrot_case
+MANDELBROT_SIZES = (200, 600)
+MANDELBROT_ITERATIONS = (200, 1000)
+CHAOS_POINTS = (10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+RECURSIVE_SIZES = (300, 600, 1200)
+
+
+def measure(function, repeats=REPEATS) -> tuple:
+    """
+    PURPOSE: Time a benchmark case and measure its peak Python memory use.
+
+    PARAMETERS: function takes no arguments and returns the amount of work it did
+                as a dict (e.g. {"pixels": ..., "iterations": ...}).
+                repeats is the number of timed runs.
+
+    RETURNS: A tuple (seconds, peak_bytes, work) with the fastest run time, the peak
+             memory traced by tracemalloc over one run (NumPy buffers included) and
+             the work dict of the last run.
+    """
+    best = float("inf")
+    for repeat in range(repeats):
+        start = time.perf_counter()
+        work = function()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, work
+
+
+def mandelbrot_case(viewport, frame_size, max_iterations, renderer):
+    """
+    PURPOSE: Build a benchmark case rendering a Mandelbrot viewport onto an off-screen Surface.
+
+    PARAMETERS: viewport is a tuple (center, width) from MANDELBROT_VIEWPORTS.
+                frame_size is a tuple (width, height) in pixels.
+                max_iterations is a positive integer.
+                renderer is one of MANDELBROT_RENDERERS:
+                "frame" computes the whole frame like generate_mandelbrot (compute_iterations_tiled
+                over RENDER_WORKERS processes, compute_iterations_strategy with one), without its
+                anti-aliasing; deep viewports, which it cannot render, use compute_iterations_precise.
+                "progressive" runs viewport_passes to the end, as the Mandelbrot screen does.
+
+    EFFECTS: The reported iterations are the sum of the escape counts, i.e. the work a plain
+             per-pixel loop would do, so shortcuts that skip iterations show up as a higher rate.
+    """
+    center, view_width = viewport
+    size = (view_width, view_width * frame_size[1] / frame_size[0])
+    domain, my_range = get_domain_range(center, size)
+    screen = pygame.Surface(frame_size)
+
+    def compute_frame():
+        if is_deep_zoom(center, size, frame_size):
+            return compute_iterations_precise(center, size, frame_size, max_iterations)
+        if RENDER_WORKERS > 1:
+            return compute_iterations_tiled(domain, my_range, frame_size, max_iterations)[0]
+        return compute_iterations_strategy(domain, my_range, frame_size, max_iterations)[0]
+
+    def compute_progressive():
+        for step, iterations in viewport_passes(center, size, frame_size, max_iterations):
+            pass
+        return iterations
+
+    def run():
+        iterations = compute_frame() if renderer == "frame" else compute_progressive()
+        blit_iterations(screen, iterations, max_iterations)
+        return {"pixels": iterations.size, "iterations": int(iterations.sum(dtype=np.int64))}
+    return run
+
+
+def chaos_case(points):
+    """
+    PURPOSE: Build a benchmark case drawing the chaos-game Sierpinski triangle.
+
+    PARAMETERS: points is the number of points to draw.
+    """
+    def run():
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        screen.fill(COLOR_WHITE)
+        draw_sierpinski(screen, (WIDTH / 2, HEIGHT / 2), points, reveal_time=0)
+        return {"points": points}
+    return run
+
+
+def recursive_case(side):
+    """
+    PURPOSE: Build a benchmark case drawing the recursive Sierpinski triangle.
+
+    PARAMETERS: side is the size of the (square) window in pixels.
+    """
+    def run():
+        screen = pygame.display.set_mode((side, side))
+        screen.fill(COLOR_WHITE)
+        sierpinski_recursive(screen, (side / 2, 50), (50, side - 50), (side - 50, side - 50))
+        return {"pixels": side * side}
+    return run
+
+
+def get_cases(quick=False) -> dict:
+    """
+    PURPOSE: List every benchmark case.
+
+    PARAMETERS: quick keeps only the smallest size of every family, for a fast smoke run.
+
+    RETURNS: A dict mapping case names to functions built by the *_case functions.
+    """
+    sizes = MANDELBROT_SIZES[:1] if quick else MANDELBROT_SIZES
+    iteration_limits = MANDELBROT_ITERATIONS[:1] if quick else MANDELBROT_ITERATIONS
+    cases = {}
+    for renderer in MANDELBROT_RENDERERS:
+        for name, viewport in MANDELBROT_VIEWPORTS.items():
+            for side in sizes:
+                for max_iterations in iteration_limits:
+                    cases[f"mandelbrot/{renderer}/{name}/{side}px/{max_iterations}it"] = \
+                        mandelbrot_case(viewport, (side, side), max_iterations, renderer)
+    for points in CHAOS_POINTS[:2] if quick else CHAOS_POINTS:
+        cases[f"chaos/{points}pts"] = chaos_case(points)
+    for side in RECURSIVE_SIZES[:1] if quick else RECURSIVE_SIZES:
+        cases[f"recursive/{side}px"] = recursive_case(side)
+    return cases
+
+
+def run_benchmarks(cases, repeats=REPEATS) -> dict:
+    """
+    PURPOSE: Run benchmark cases and print one line per case.
+
+    RETURNS: A dict mapping case names to results: seconds, peak_bytes and a
+             <unit>_per_second rate for every kind of work the case reported.
+    """
+    results = {}
+    for name, function in cases.items():
+        seconds, peak, work = measure(function, repeats)
+        result = {"seconds": seconds, "peak_bytes": peak}
+        for unit, amount in work.items():
+            result[f"{unit}_per_second"] = amount / seconds
+        results[name] = result
+        rates = "  ".join(f"{key}={value:,.0f}" for key, value in result.items() if key.endswith("_per_second"))
+        print(f"{name:45} {seconds * 1000:10.1f} ms  {peak / 2 ** 20:8.1f} MiB  {rates}")
+    return results
+
+
+def find_regressions(results, baseline, threshold=REGRESSION_THRESHOLD) -> list:
+    """
+    PURPOSE: Compare results against a baseline.
+
+    PARAMETERS: results and baseline are dicts returned by run_benchmarks.
+                threshold is the allowed slowdown (0.25 means 25% slower).
+
+    RETURNS: A list of messages, one per case slower than its baseline by more than threshold.
+             Cases missing from the baseline are ignored.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        allowed = baseline[name]["seconds"] * (1 + threshold)
+        if result["seconds"] > allowed:
+            regressions.append(f"{name}: {result['seconds'] * 1000:.1f} ms, "
+                               f"baseline {baseline[name]['seconds'] * 1000:.1f} ms")
+    return regressions
+
+
+def main():
+    """
+    PURPOSE: Command-line entry point: run the benchmarks, then save or check the baseline.
+
+    EFFECTS: Exits with status 1 when a case regressed beyond the threshold.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the fractal renderers.")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="JSON baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="allowed slowdown before a case fails (0.25 = 25%%)")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="timed runs per case")
+    parser.add_argument("--quick", action="store_true", help="only run the smallest case of every family")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--backend", default=BACKEND,
+                        help=f"compute backend: auto or one of {', '.join(get_backend_names())} (default: %(default)s)")
+    args = parser.parse_args()
+    name = select_backend(args.backend).name
+    report = get_calibration_report()
+    if report:
+        print(report)
+    print("Compute backend:", name)
+    tile_store.TILE_STORE_ENABLED = False # time the renderers, not reads of tiles stored by earlier runs
+
+    pygame.init()
+    cases = {name: case for name, case in get_cases(args.quick).items() if args.filter in name}
+    try:
+        results = run_benchmarks(cases, args.repeats)
+    finally:
+        shutdown_process_pool()
+    pygame.quit()
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                baseline = json.load(file)
+        baseline.update(results)
+        with open(args.baseline, "w") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print("Saved baseline to", args.baseline)
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline at", args.baseline, "- run with --save-baseline first")
+        return
+    with open(args.baseline) as file:
+        regressions = find_regressions(results, json.load(file), args.threshold)
+    for message in regressions:
+        print("REGRESSION", message)
+    if regressions:
+        sys.exit(1)
+    print("No regressions beyond", f"{args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import time
+from concurrent.futures import as_completed
+import numpy as np
+from sierpinski import *
+from mandelbrot import get_process_pool, RENDER_WORKERS
+from ifs import *
+
+DENSITY_POINTS = 10 ** 8 # points drawn by the density view of the chaos game
+CHAIN_POINTS = 10 ** 7 # points per independent chain handed to a worker process
+DENSITY_FPS = 10 # display updates per second while the histogram fills
+
+
+def accumulate_histogram(histogram, xs, ys):
+    """
+    PURPOSE: Count chaos-game points into a 2D histogram of pixel hits.
+
+    PARAMETERS: histogram is an integer array of shape (width, height).
+                xs and ys are arrays of point coordinates, in pixels.
+
+    MODIFIES: histogram (every pixel gains the number of points that fall in it).
+              Points outside the histogram are ignored.
+    """
+    width, height = histogram.shape
+    xs, ys = xs.astype(np.intp), ys.astype(np.intp)
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    hits = np.bincount(xs[inside] * height + ys[inside], minlength=width * height)
+    histogram += hits.reshape(width, height).astype(histogram.dtype)
+
+
+def compute_chain_histogram(frame_size, points, seed, ifs=None) -> np.ndarray:
+    """
+    PURPOSE: Run one chaos-game chain and count its points. Runs inside the worker processes.
+
+    PARAMETERS: frame_size is a tuple (width, height) in pixels.
+                points is the number of points counted.
+                seed seeds the chain's random map choices (an int or np.random.SeedSequence).
+                ifs is an IFS in screen pixels (see fit_ifs); defaults to the Sierpinski
+                triangle of CORNERS.
+
+    RETURNS: A uint32 array of shape frame_size. Memory use does not depend on points.
+    """
+    ifs = get_sierpinski_ifs() if ifs is None else ifs
+    histogram = np.zeros(frame_size, dtype=np.uint32)
+    for xs, ys in ifs_points(ifs, points, rng=np.random.default_rng(seed)):
+        accumulate_histogram(histogram, xs, ys)
+    return histogram
+
+
+def get_chains(points, chain_points=CHAIN_POINTS) -> list:
+    """
+    PURPOSE: Split a point count into the lengths of independent chains.
+
+    RETURNS: A list of positive ints of at most chain_points each, summing to points.
+    """
+    return [min(chain_points, points - start) for start in range(0, points, chain_points)]
+
+
+def compute_density_histograms(frame_size, points, workers=None, seed=None, ifs=None):
+    """
+    PURPOSE: Count chaos-game points in independent chains spread over the render process pool.
+
+    PARAMETERS: frame_size is a tuple (width, height) in pixels.
+                points is the total number of points.
+                workers is the number of processes to use (defaults to RENDER_WORKERS).
+                seed makes the result reproducible when given.
+                ifs is an IFS in screen pixels, as in compute_chain_histogram.
+
+    YIELDS: The running uint64 histogram of shape frame_size, after every finished chain
+            (after every batch of points when computed in this process, so that a job
+            consuming it can stop quickly). The same array is updated and yielded each time.
+
+    EFFECTS: At most one chain histogram per worker is held besides the total, so memory
+             stays fixed however many points are drawn.
+    """
+    workers = RENDER_WORKERS if workers is None else workers
+    chains = get_chains(points)
+    seeds = np.random.SeedSequence(seed).spawn(len(chains))
+    total = np.zeros(frame_size, dtype=np.uint64)
+    if workers <= 1:
+        ifs = get_sierpinski_ifs() if ifs is None else ifs
+        for chain_points, chain_seed in zip(chains, seeds):
+            for xs, ys in ifs_points(ifs, chain_points, rng=np.random.default_rng(chain_seed)):
+                accumulate_histogram(total, xs, ys)
+                yield total
+        return
+
+    pool = get_process_pool(workers)
+    jobs = iter(zip(chains, seeds))
+    pending = set()
+    for chain_points, chain_seed in jobs:
+        pending.add(pool.submit(compute_chain_histogram, frame_size, chain_points, chain_seed, ifs))
+        if len(pending) >= workers:
+            break
+    while pending:
+        future = next(as_completed(pending))
+        pending.remove(future)
+        total += future.result()
+        for chain_points, chain_seed in jobs:
+            pending.add(pool.submit(compute_chain_histogram, frame_size, chain_points, chain_seed, ifs))
+            break
+        yield total
+
+
+def tone_map_density(histogram, color=COLOR_BLACK, background=COLOR_WHITE) -> np.ndarray:
+    """
+    PURPOSE: Turn a hit histogram into an image with logarithmic density tone mapping.
+
+    PARAMETERS: histogram is an integer array of shape (width, height).
+                color is the (R, G, B) of the densest pixels, background that of empty ones.
+
+    RETURNS: A uint8 array of shape (width, height, 3), ready for pygame.surfarray.blit_array.
+             Pixel brightness follows log(1 + hits) / log(1 + most hits), so the fine
+             structure of sparse regions stays visible next to saturated ones.
+    """
+    peak = histogram.max()
+    density = np.log1p(histogram.astype(np.float32))
+    if peak > 0:
+        density /= np.log1p(np.float32(peak))
+    color = np.array(color, dtype=np.float32)
+    background = np.array(background, dtype=np.float32)
+    image = background + density[..., None] * (color - background)
+    return image.astype(np.uint8)
+
+
+def density_passes(frame_size, points=DENSITY_POINTS, workers=None, ifs=None):
+    """
+    PURPOSE: Compute a chaos-game density image as a job for RenderWorker.submit_passes.
+
+    PARAMETERS: frame_size is a tuple (width, height) in pixels.
+                points, workers and ifs are as in compute_density_histograms.
+
+    YIELDS: A tuple (step, image) at most DENSITY_FPS times per second while the histogram
+            fills, with step 0, then the final image with step 1. image is the tone-mapped
+            uint8 array of shape (width, height, 3) (see tone_map_density).
+
+    EFFECTS: Cancelling the job stops it at the next finished chain or batch of points.
+    """
+    histogram = np.zeros(frame_size, dtype=np.uint64)
+    last_update = 0
+    for histogram in compute_density_histograms(frame_size, points, workers, ifs=ifs):
+        now = time.perf_counter()
+        if now - last_update >= 1 / DENSITY_FPS:
+            yield 0, tone_map_density(histogram)
+            last_update = now
+    yield 1, tone_map_density(histogram)
+
+
+def ifs_density_passes(ifs, frame_size, points=DENSITY_POINTS, workers=None):
+    """
+    PURPOSE: density_passes for an IFS in its own coordinates (see make_ifs).
+
+    EFFECTS: The IFS is fitted to the frame (see fit_ifs) when the job starts, on the job's
+             thread, as estimating the attractor's extent iterates it too.
+    """
+    yield from density_passes(frame_size, points, workers, fit_ifs(ifs, frame_size))
+
+
+def draw_sierpinski_density(screen, points=DENSITY_POINTS, workers=None, ifs=None):
+    """
+    PURPOSE: Draw the Sierpinski triangle, or another IFS attractor, as a chaos-game density image.
+
+    PARAMETERS: screen is a valid pygame Surface object.
+                points is the number of points to count.
+                workers is the number of processes to use (defaults to RENDER_WORKERS).
+                ifs is an IFS in screen pixels (see fit_ifs); defaults to the Sierpinski
+                triangle of CORNERS.
+
+    MODIFIES: screen, the pygame display.
+
+    EFFECTS: Blocks until every point is counted, showing every update of density_passes.
+             Interactive code submits density_passes to a RenderWorker instead.
+    """
+    for step, image in density_passes(screen.get_size(), points, workers, ifs):
+        pygame.surfarray.blit_array(screen, image)
+        pygame.display.flip()
+        pygame.event.pump()
@@ -0,0 +1,114 @@
+import math
+import threading
+import numpy as np
+from mandelbrot import *
+
+AUTO_DEEPENING = True # keep raising the iteration limit in the background after a render
+STARTING_ITERATIONS = MAX_ITERATIONS # iteration limit of the full view
+ITERATIONS_PER_ZOOM_DECADE = 150 # iterations added to the starting limit per 10x zoom
+DEEPENING_FACTOR = 2 # the iteration limit is multiplied by this at every deepening step
+DEEPENING_MIN_ESCAPED = 0.001 # automatic deepening stops once fewer pixels than this share escape in a step
+MAX_DEEPENING_ITERATIONS = 50000 # iteration limit deepening never goes past
+INITIAL_VIEW_WIDTH = 3.0 # width of the full view in the complex plane
+
+
+def get_starting_iterations(domain, my_range) -> int:
+    """
+    PURPOSE: Choose the iteration limit of a viewport from its zoom depth.
+
+    PARAMETERS: domain, my_range are tuples of floats (the viewport's x and y limits).
+
+    RETURNS: STARTING_ITERATIONS for the full view, plus ITERATIONS_PER_ZOOM_DECADE for every
+             factor of 10 the view is zoomed in by.
+    """
+    width = min(domain[1] - domain[0], my_range[1] - my_range[0])
+    zoom = INITIAL_VIEW_WIDTH / width if width > 0 else 1.0
+    return STARTING_ITERATIONS + max(0, int(ITERATIONS_PER_ZOOM_DECADE * math.log10(max(zoom, 1.0))))
+
+
+class IterationDeepener:
+    """
+    PURPOSE: Raise the iteration limit of a rendered frame by resuming its unescaped pixels.
+    """
+
+    def __init__(self, domain, my_range, frame_size, iterations, max_iterations, states=None):
+        """
+        PURPOSE: Remember a rendered frame so its iteration limit can be raised.
+
+        PARAMETERS: domain, my_range are tuples of floats (the viewport's x and y limits).
+                    frame_size is a tuple (width, height) in pixels.
+                    iterations is the frame's escape-count array of shape frame_size.
+                    max_iterations is the iteration limit it was rendered with.
+                    states is the list of (pixels, EscapeState) the render kept of the pieces
+                    it computed (see progressive.viewport_passes), or None when the frame was
+                    not rendered that way (cached, panned or loaded frames).
+        """
+        self.domain = domain
+        self.my_range = my_range
+        self.frame_size = frame_size
+        self.iterations = iterations
+        self.max_iterations = max_iterations
+        self.states = states
+        self.mirror = get_mirror(my_range, frame_size) # rows copied across the real axis, or None
+        self.state = None # EscapeState of the frame, built on first use
+        self.lock = threading.Lock() # serializes deepening steps of cancelled and new jobs
+
+    def get_state(self) -> EscapeState:
+        """
+        PURPOSE: Return the frame's EscapeState, building it on first use.
+
+        MODIFIES: self.state, self.states.
+
+        EFFECTS: The states kept by the render are merged, so its unescaped pixels resume from
+                 the z they reached. Without them, the pixels that had not escaped are iterated
+                 once up to the frame's limit to recover z. Escaped pixels keep their counts and
+                 are never iterated again, and pixels mirrored across the real axis are not
+                 iterated at all (get_iterations copies them).
+        """
+        if self.state is None:
+            if self.states:
+                self.state = merge_escape_states(self.states, self.iterations)
+                self.states = None
+            else:
+                c_grid = get_complex_grid(self.domain, self.my_range, self.frame_size)
+                unescaped = np.asarray(self.iterations) >= self.max_iterations
+                if self.mirror is not None:
+                    unescaped[:, self.mirror[2]] = False
+                self.state = EscapeState(c_grid, pixels=np.flatnonzero(unescaped), counts=self.iterations)
+                self.state.iterate(self.max_iterations)
+        return self.state
+
+    def get_iterations(self) -> np.ndarray:
+        """
+        PURPOSE: Return a copy of the frame's escape counts at the state's current limit,
+                 with the mirrored rows copied from the rows they mirror.
+        """
+        iterations = self.state.counts.reshape(self.frame_size).copy()
+        if self.mirror is not None:
+            _, _, targets, sources = self.mirror
+            iterations[:, targets] = iterations[:, sources]
+        return iterations
+
+    def passes(self, max_iterations=None):
+        """
+        PURPOSE: Deepen the frame as a job for RenderWorker.submit_passes.
+
+        PARAMETERS: max_iterations is the limit to reach in one step. When None, the limit is
+                    multiplied by DEEPENING_FACTOR at every step for as long as at least
+                    DEEPENING_MIN_ESCAPED of the pixels escape in a step (automatic mode).
+
+        YIELDS: A tuple (limit, iterations) after every step, limit being the iteration
+                limit the new int32 escape counts were computed with.
+        """
+        pixels = self.frame_size[0] * self.frame_size[1]
+        while True:
+            with self.lock:
+                state = self.get_state()
+                limit = max_iterations or min(state.limit * DEEPENING_FACTOR, MAX_DEEPENING_ITERATIONS)
+                if limit <= state.limit:
+                    return
+                escaped = state.iterate(limit)
+                iterations = self.get_iterations()
+            yield limit, iterations
+            if max_iterations is not None or escaped < DEEPENING_MIN_ESCAPED * pixels:
+                return
@@ -0,0 +1,208 @@
+import numpy as np
+from sierpinski import CORNERS
+
+IFS_CHAINS = 16384 # points advanced together, one vectorized step at a time
+IFS_BURN_IN = 64 # steps before a chain's points are used (the start is not on the attractor)
+IFS_CHUNK_SIZE = 65536 # points yielded per batch by ifs_points
+IFS_MARGIN = 0.05 # share of the frame left empty around a fitted attractor
+BOUNDS_SAMPLE = 20000 # points used to estimate the extent of an attractor
+MIN_PROBABILITY = 0.01 # weight given to maps with zero area (such as the fern's stem)
+
+# Every row is one affine map (x, y) -> (a x + b y + e, c x + d y + f), picked with probability p.
+# Columns:                a      b      c      d      e      f      p
+IFS_PRESETS = {
+    "sierpinski": [[0.5,   0,     0,     0.5,   0,     0,     1],
+                   [0.5,   0,     0,     0.5,   0.5,   0,     1],
+                   [0.5,   0,     0,     0.5,   0.25,  0.5,   1]],
+    "fern":       [[0,     0,     0,     0.16,  0,     0,     0.01],
+                   [0.85,  0.04,  -0.04, 0.85,  0,     1.6,   0.85],
+                   [0.2,   -0.26, 0.23,  0.22,  0,     1.6,   0.07],
+                   [-0.15, 0.28,  0.26,  0.24,  0,     0.44,  0.07]],
+    "carpet":     [[1 / 3, 0, 0, 1 / 3, x / 3, y / 3, 1]
+                   for x in range(3) for y in range(3) if (x, y) != (1, 1)],
+}
+
+
+def make_ifs(maps, probabilities=None) -> tuple:
+    """
+    PURPOSE: Build an iterated function system from a table of affine maps.
+
+    PARAMETERS: maps is a sequence of rows (a, b, c, d, e, f) or (a, b, c, d, e, f, p), each
+                the map (x, y) -> (a x + b y + e, c x + d y + f) picked with weight p.
+                probabilities optionally overrides the weights. Without either, every map
+                is weighted by the area it keeps, |a d - b c| (at least MIN_PROBABILITY).
+
+    RETURNS: A tuple (coefficients, aliases): a float64 array of shape (n, 6) and the alias
+             table the maps are picked with (see make_alias_table).
+
+    RAISES: ValueError if the table is malformed or the weights are not positive.
+    """
+    table = np.array(maps, dtype=np.float64)
+    if table.ndim != 2 or table.shape[1] not in (6, 7) or len(table) == 0:
+        raise ValueError("An IFS needs rows of 6 coefficients (a, b, c, d, e, f) and an optional weight")
+    coefficients = table[:, :6].copy()
+    if probabilities is None and table.shape[1] == 7:
+        probabilities = table[:, 6]
+    if probabilities is None:
+        areas = np.abs(coefficients[:, 0] * coefficients[:, 3] - coefficients[:, 1] * coefficients[:, 2])
+        probabilities = np.maximum(areas / areas.sum() if areas.sum() > 0 else areas, MIN_PROBABILITY)
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    if probabilities.shape != (len(coefficients),) or (probabilities < 0).any() or probabilities.sum() <= 0:
+        raise ValueError("IFS weights must be one non-negative number per map, not all zero")
+    return coefficients, make_alias_table(probabilities)
+
+
+def make_alias_table(probabilities) -> tuple:
+    """
+    PURPOSE: Build the alias table (Vose's method) picking indices with the given weights
+             in constant time per pick, however many there are.
+
+    PARAMETERS: probabilities is a float64 array of non-negative weights, not all zero.
+
+    RETURNS: A tuple (thresholds, aliases) of arrays of the weights' length. Column i is
+             picked uniformly, then gives i with probability thresholds[i] and aliases[i]
+             otherwise (see select_maps).
+    """
+    count = len(probabilities)
+    scaled = probabilities * count / probabilities.sum()
+    thresholds = np.ones(count)
+    aliases = np.arange(count)
+    small = [i for i in range(count) if scaled[i] < 1]
+    large = [i for i in range(count) if scaled[i] >= 1]
+    while small and large:
+        short, tall = small.pop(), large.pop()
+        thresholds[short], aliases[short] = scaled[short], tall
+        scaled[tall] -= 1 - scaled[short]
+        (small if scaled[tall] < 1 else large).append(tall)
+    return thresholds, aliases # columns left over (rounding errors) keep threshold 1
+
+
+def get_ifs_preset(name) -> tuple:
+    """
+    PURPOSE: Returns the IFS of one of IFS_PRESETS.
+
+    RAISES: ValueError if there is no preset called name.
+    """
+    if name not in IFS_PRESETS:
+        raise ValueError(f"Unknown IFS preset {name!r}, expected one of {', '.join(IFS_PRESETS)}")
+    return make_ifs(IFS_PRESETS[name])
+
+
+def load_ifs(path) -> tuple:
+    """
+    PURPOSE: Read a user-supplied IFS from a text file with one map per line,
+             "a b c d e f" or "a b c d e f p" (lines starting with # are ignored).
+    """
+    return make_ifs(np.loadtxt(path, ndmin=2))
+
+
+def get_sierpinski_ifs(corners=None) -> tuple:
+    """
+    PURPOSE: Build the IFS of the chaos game of get_new_point: move halfway towards a corner.
+
+    PARAMETERS: corners is a sequence of (x, y) corners (defaults to CORNERS, in screen pixels).
+
+    RETURNS: An IFS as returned by make_ifs, in the coordinates of the corners.
+    """
+    corners = CORNERS if corners is None else corners
+    return make_ifs([(0.5, 0, 0, 0.5, x / 2, y / 2, 1) for x, y in corners])
+
+
+def select_maps(aliases, rng, count) -> np.ndarray:
+    """
+    PURPOSE: Pick count map indices with the alias table of an IFS (see make_alias_table).
+
+    EFFECTS: Every pick takes one uniform number: its integer part, scaled by the number
+             of maps, is the column and its fraction is compared with the column's threshold.
+    """
+    thresholds, targets = aliases
+    scaled = rng.random(count) * len(thresholds)
+    columns = np.minimum(scaled.astype(np.intp), len(thresholds) - 1)
+    return np.where(scaled - columns < thresholds[columns], columns, targets[columns])
+
+
+def ifs_points(ifs, count, chains=IFS_CHAINS, chunk_size=IFS_CHUNK_SIZE, rng=None):
+    """
+    PURPOSE: Generate points of the attractor of an IFS in batches of NumPy arrays.
+
+    PARAMETERS: ifs is a tuple (coefficients, aliases) from make_ifs.
+                count is the number of points to generate.
+                chains is the number of independent chains advanced together.
+                chunk_size is the approximate number of points per batch.
+                rng is an optional numpy.random.Generator.
+
+    YIELDS: Tuples (xs, ys) of float64 arrays with the next points.
+
+    EFFECTS: Every step applies a randomly selected map to all chains at once, with one
+             gather of the coefficients and a few vectorized multiply-adds. The first
+             IFS_BURN_IN steps are discarded.
+    """
+    coefficients, aliases = ifs
+    rng = np.random.default_rng() if rng is None else rng
+    chains = max(1, min(chains, count))
+    xs, ys = np.zeros(chains), np.zeros(chains)
+    for step in range(IFS_BURN_IN):
+        xs, ys = apply_maps(coefficients[select_maps(aliases, rng, chains)], xs, ys)
+
+    steps_per_chunk = max(1, chunk_size // chains)
+    while count > 0:
+        steps = min(steps_per_chunk, -(-count // chains))
+        chunk_xs, chunk_ys = np.empty((steps, chains)), np.empty((steps, chains))
+        for step in range(steps):
+            xs, ys = apply_maps(coefficients[select_maps(aliases, rng, chains)], xs, ys)
+            chunk_xs[step], chunk_ys[step] = xs, ys
+        size = min(count, steps * chains)
+        yield chunk_xs.ravel()[:size], chunk_ys.ravel()[:size]
+        count -= size
+
+
+def apply_maps(maps, xs, ys) -> tuple:
+    """
+    PURPOSE: Apply one affine map per point.
+
+    PARAMETERS: maps is an array of shape (n, 6) with the coefficients used for every point.
+                xs and ys are arrays of n coordinates.
+
+    RETURNS: A tuple (new_xs, new_ys).
+    """
+    a, b, c, d, e, f = maps.T
+    return a * xs + b * ys + e, c * xs + d * ys + f
+
+
+def get_ifs_bounds(ifs, rng=None) -> tuple:
+    """
+    PURPOSE: Estimate the extent of the attractor of an IFS from BOUNDS_SAMPLE points.
+
+    RETURNS: A tuple (min_x, min_y, max_x, max_y).
+    """
+    xs, ys = next(ifs_points(ifs, BOUNDS_SAMPLE, chunk_size=BOUNDS_SAMPLE, rng=rng))
+    return xs.min(), ys.min(), xs.max(), ys.max()
+
+
+def fit_ifs(ifs, frame_size, margin=IFS_MARGIN, rng=None) -> tuple:
+    """
+    PURPOSE: Rewrite an IFS so its attractor fills a frame, in screen pixels.
+
+    PARAMETERS: ifs is a tuple from make_ifs, with y pointing up.
+                frame_size is a tuple (width, height) in pixels.
+                margin is the share of the frame left empty on each side.
+
+    RETURNS: An IFS whose points are screen pixels (y pointing down), the attractor
+             centered in the frame and scaled uniformly to fit it.
+
+    EFFECTS: Every map f becomes T f T^-1, T being the plane-to-screen transform, so no
+             per-point conversion is needed afterwards.
+    """
+    coefficients, aliases = ifs
+    min_x, min_y, max_x, max_y = get_ifs_bounds(ifs, rng)
+    width, height = frame_size
+    scale = (1 - 2 * margin) * min(width / max(max_x - min_x, 1e-12), height / max(max_y - min_y, 1e-12))
+    offset_x = width / 2 - scale * (min_x + max_x) / 2
+    offset_y = height / 2 + scale * (min_y + max_y) / 2
+
+    a, b, c, d, e, f = coefficients.T
+    # T(x, y) = (scale x + offset_x, -scale y + offset_y)
+    fitted = np.column_stack((a, -b, -c, d,
+                              scale * e + offset_x - a * offset_x + b * offset_y,
+                              -scale * f + offset_y + c * offset_x - d * offset_y))
+    return fitted, aliases
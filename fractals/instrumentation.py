@@ -0,0 +1,385 @@
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import pygame
+from utils import get_font, COLOR_BLACK, COLOR_WHITE
+
+INSTRUMENTATION_ENABLED = os.environ.get("FRACTALS_STATS") == "1" # record render stats even with the overlay hidden
+STATS_LOG_FILE = os.environ.get("FRACTALS_STATS_LOG", # one JSON line per recorded render ("" for none)
+                                os.path.join(os.path.expanduser("~"), ".cache", "fractals", "render_stats.jsonl"))
+PROFILE_FILE = os.environ.get("FRACTALS_PROFILE", # where a captured cProfile of one render is saved
+                              os.path.join(os.path.expanduser("~"), ".cache", "fractals", "render_profile.prof"))
+PROFILE_LINES = 20 # functions of a captured profile printed, by cumulative time
+STATS_KEY = pygame.K_s # shows and hides the stats overlay
+PROFILE_KEY = pygame.K_c # captures a cProfile of the next render
+OVERLAY_FONT_SIZE = 12
+OVERLAY_MARGIN = 6 # pixels between the overlay text and its background's edges
+OVERLAY_ALPHA = 200 # opacity of the overlay background
+RATE_COUNTERS = ("points", "triangles", "iterations", "iterated_pixels") # counters also reported per second
+
+current_stats = None # RenderStats of the render in progress, None when nothing is recorded
+last_stats = None # RenderStats of the last finished render
+overlay_visible = False # whether the stats overlay is drawn over the display
+overlay_shown = None # (overlay_visible, last_stats) as of the last flip_display
+profile_requested = False # whether the next render is profiled
+collecting = threading.local() # stats: RenderStats of the calling thread's innermost StatsCollector
+
+
+class RenderStats:
+    """
+    PURPOSE: Timings and counters of one render.
+    """
+
+    def __init__(self, kind, profiler=None):
+        """
+        PURPOSE: Start the stats of a render.
+
+        PARAMETERS: kind names what is rendered (e.g. "mandelbrot", "chaos game").
+                    profiler is a cProfile.Profile already enabled for this render, or None.
+        """
+        self.kind = kind
+        self.profiler = profiler
+        self.started = time.perf_counter()
+        self.seconds = 0.0 # wall time from start_render to finish_render
+        self.stages = {} # stage name -> seconds spent in it
+        self.counters = {} # counter name -> total
+
+    def get_busy_seconds(self) -> float:
+        """
+        PURPOSE: Returns the time spent inside the stages, leaving out waits between them.
+        """
+        return sum(self.stages.values())
+
+    def get_rates(self) -> dict:
+        """
+        PURPOSE: Returns the RATE_COUNTERS per busy second (e.g. points or iterations per second).
+        """
+        busy = self.get_busy_seconds()
+        if busy <= 0:
+            return {}
+        return {f"{name}_per_second": count / busy for name, count in self.counters.items() if name in RATE_COUNTERS}
+
+    def to_dict(self) -> dict:
+        """
+        PURPOSE: Returns the stats as a JSON-serializable dict.
+                 skipped_pixels is derived from pixels and iterated_pixels, and
+                 supersampled_fraction from frame_pixels and supersampled_pixels,
+                 when they were counted.
+        """
+        counters = dict(self.counters)
+        if "pixels" in counters:
+            counters["skipped_pixels"] = max(0, counters["pixels"] - counters.get("iterated_pixels", 0))
+        if counters.get("frame_pixels"):
+            counters["supersampled_fraction"] = counters.get("supersampled_pixels", 0) / counters["frame_pixels"]
+        return {"kind": self.kind, "timestamp": time.time(), "seconds": self.seconds,
+                "busy_seconds": self.get_busy_seconds(), "stages": self.stages,
+                "counters": counters, "rates": self.get_rates()}
+
+
+class Stage:
+    """
+    PURPOSE: Context manager adding the time spent in its block to a stage of a RenderStats.
+    """
+    __slots__ = ("stats", "name", "started")
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        stages = self.stats.stages
+        stages[self.name] = stages.get(self.name, 0.0) + time.perf_counter() - self.started
+        return False
+
+
+class NullStage:
+    """
+    PURPOSE: Context manager that does nothing, used by render_stage when nothing is recorded.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+
+null_stage = NullStage()
+
+
+class StatsCollector:
+    """
+    PURPOSE: Context manager gathering the counters and stage times that the calling thread
+             records in its block into a RenderStats of its own, instead of the render in
+             progress. Worker processes, which do not see the render, use it to send their
+             counters back with their results.
+    """
+
+    def __init__(self):
+        self.stats = RenderStats("collected")
+        self.outer = None # RenderStats of the enclosing StatsCollector, if any
+
+    def __enter__(self):
+        self.outer = getattr(collecting, "stats", None)
+        collecting.stats = self.stats
+        return self.stats
+
+    def __exit__(self, *exception):
+        collecting.stats = self.outer
+        return False
+
+
+def get_recorded_stats():
+    """
+    PURPOSE: Returns the RenderStats the calling thread records into: that of its innermost
+             StatsCollector, else that of the render in progress (None when nothing is recorded).
+    """
+    collected = getattr(collecting, "stats", None)
+    return current_stats if collected is None else collected
+
+
+def is_enabled() -> bool:
+    """
+    PURPOSE: Determine whether renders are recorded: with INSTRUMENTATION_ENABLED, while the
+             overlay is visible, or when a profile was requested.
+    """
+    return INSTRUMENTATION_ENABLED or overlay_visible or profile_requested
+
+
+def is_recording() -> bool:
+    """
+    PURPOSE: Determine whether a render is being recorded, so hooks can skip computing
+             counters (such as sums over a frame) nobody would read.
+    """
+    return get_recorded_stats() is not None
+
+
+def take_profiler():
+    """
+    PURPOSE: Hand over the profile requested with request_profile, once.
+
+    MODIFIES: profile_requested (global variable).
+
+    RETURNS: A new cProfile.Profile if a profile was requested, None otherwise.
+             The caller enables it on the thread that does the work and passes it
+             to save_profile when done.
+    """
+    global profile_requested
+    if not profile_requested:
+        return None
+    profile_requested = False
+    return cProfile.Profile()
+
+
+def request_profile():
+    """
+    PURPOSE: Profile the next render with cProfile.
+
+    MODIFIES: profile_requested (global variable).
+    """
+    global profile_requested
+    profile_requested = True
+
+
+def save_profile(profiler):
+    """
+    PURPOSE: Save a captured profile to PROFILE_FILE and print its most expensive functions.
+
+    PARAMETERS: profiler is a cProfile.Profile from take_profiler, already disabled.
+
+    EFFECTS: The functions are printed even when the file cannot be written.
+    """
+    try:
+        os.makedirs(os.path.dirname(PROFILE_FILE) or ".", exist_ok=True)
+        profiler.dump_stats(PROFILE_FILE)
+        print(f"Profile saved to {PROFILE_FILE}")
+    except OSError as error:
+        print(f"Could not save the profile to {PROFILE_FILE}: {error}")
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(PROFILE_LINES)
+
+
+def start_render(kind, profile=True):
+    """
+    PURPOSE: Start recording a render.
+
+    PARAMETERS: kind names what is rendered.
+                profile lets this render take a requested profile, profiling the calling
+                thread; pass False when the work runs on another thread that takes it instead
+                (see RenderWorker.run).
+
+    MODIFIES: current_stats (global variable); a render still in progress is dropped.
+
+    EFFECTS: Does nothing unless is_enabled().
+    """
+    global current_stats
+    if current_stats is not None and current_stats.profiler is not None:
+        current_stats.profiler.disable()
+    if not is_enabled():
+        current_stats = None
+        return
+    profiler = take_profiler() if profile else None
+    if profiler is not None:
+        profiler.enable()
+    current_stats = RenderStats(kind, profiler)
+
+
+def finish_render():
+    """
+    PURPOSE: Finish recording the render in progress.
+
+    MODIFIES: current_stats, last_stats (global variables), STATS_LOG_FILE.
+
+    EFFECTS: Appends the render's stats as one JSON line to STATS_LOG_FILE (failing to write
+             it is not an error) and saves its profile, if one was captured. Does nothing
+             when no render is recorded.
+    """
+    global current_stats, last_stats
+    stats = current_stats
+    if stats is None:
+        return
+    current_stats = None
+    stats.seconds = time.perf_counter() - stats.started
+    if stats.profiler is not None:
+        stats.profiler.disable()
+        save_profile(stats.profiler)
+    if STATS_LOG_FILE:
+        try:
+            os.makedirs(os.path.dirname(STATS_LOG_FILE) or ".", exist_ok=True)
+            with open(STATS_LOG_FILE, "a") as file:
+                file.write(json.dumps(stats.to_dict()) + "\n")
+        except OSError:
+            pass
+    last_stats = stats
+
+
+def render_stage(name):
+    """
+    PURPOSE: Time a stage of the render in progress.
+
+    PARAMETERS: name is the stage ("mapping", "iterations", "coloring", "pixel writes", "flip", ...).
+                The time of every block with the same name adds up.
+
+    RETURNS: A context manager timing its block, or a shared one doing nothing when no render
+             is recorded.
+    """
+    stats = get_recorded_stats()
+    if stats is None:
+        return null_stage
+    return Stage(stats, name)
+
+
+def add_stage_time(name, seconds):
+    """
+    PURPOSE: Add time measured by the caller to a stage of the render in progress.
+    """
+    stats = get_recorded_stats()
+    if stats is not None:
+        stats.stages[name] = stats.stages.get(name, 0.0) + seconds
+
+
+def count_stat(name, amount):
+    """
+    PURPOSE: Add to a counter of the render in progress ("pixels", "iterated_pixels",
+             "iterations", "points", ...).
+    """
+    stats = get_recorded_stats()
+    if stats is not None:
+        stats.counters[name] = stats.counters.get(name, 0) + amount
+
+
+def handle_instrumentation_key(event) -> bool:
+    """
+    PURPOSE: React to STATS_KEY and PROFILE_KEY.
+
+    MODIFIES: overlay_visible, profile_requested (global variables).
+
+    RETURNS: True if the event was one of these keys.
+    """
+    global overlay_visible
+    if event.type != pygame.KEYDOWN:
+        return False
+    if event.key == STATS_KEY:
+        overlay_visible = not overlay_visible
+        return True
+    if event.key == PROFILE_KEY:
+        request_profile()
+        return True
+    return False
+
+
+def get_overlay_lines(stats) -> list:
+    """
+    PURPOSE: Format the stats of a render as lines of text for the overlay.
+    """
+    lines = [f"{stats.kind}: {stats.seconds * 1000:.0f} ms, busy {stats.get_busy_seconds() * 1000:.0f} ms"]
+    lines += [f"{name}: {seconds * 1000:.1f} ms" for name, seconds in stats.stages.items()]
+    counters = stats.to_dict()["counters"]
+    lines += [f"{name.replace('_', ' ')}: {count:,}" for name, count in counters.items()]
+    lines += [f"{name.replace('_', ' ')}: {rate:,.0f}" for name, rate in stats.get_rates().items()]
+    return lines
+
+
+def draw_stats_overlay(screen, stats) -> tuple:
+    """
+    PURPOSE: Draw the stats of a render in the top-right corner of the screen.
+
+    PARAMETERS: screen is a valid pygame Surface object.
+                stats is a RenderStats.
+
+    MODIFIES: screen (its pixel buffer is updated).
+
+    RETURNS: A tuple (rect, saved) where saved is a copy of what the overlay covers,
+             so it can be blitted back at rect.
+    """
+    font = get_font(OVERLAY_FONT_SIZE)
+    texts = [font.render(line, True, COLOR_WHITE) for line in get_overlay_lines(stats)]
+    width = max(text.get_width() for text in texts) + 2 * OVERLAY_MARGIN
+    height = sum(text.get_height() for text in texts) + 2 * OVERLAY_MARGIN
+    rect = pygame.Rect(screen.get_width() - width, 0, width, height).clip(screen.get_rect())
+    saved = screen.subsurface(rect).copy()
+    background = pygame.Surface(rect.size)
+    background.fill(COLOR_BLACK)
+    background.set_alpha(OVERLAY_ALPHA)
+    screen.blit(background, rect)
+    y = rect.top + OVERLAY_MARGIN
+    for text in texts:
+        screen.blit(text, (rect.left + OVERLAY_MARGIN, y))
+        y += text.get_height()
+    return rect, saved
+
+
+def is_overlay_changed() -> bool:
+    """
+    PURPOSE: Determine whether the display must be flipped to show or hide the overlay,
+             or to show the stats of a render finished since the last flip_display.
+    """
+    return overlay_shown != (overlay_visible, last_stats)
+
+
+def flip_display():
+    """
+    PURPOSE: Flip the display, with the stats overlay over it when it is visible.
+
+    MODIFIES: overlay_shown (global variable), the pygame display.
+
+    EFFECTS: The overlay is only drawn for the flip: what it covered is restored on the
+             display surface right after, so the scenes never draw over it.
+    """
+    global overlay_shown
+    screen = pygame.display.get_surface()
+    with render_stage("flip"):
+        if overlay_visible and last_stats is not None:
+            rect, saved = draw_stats_overlay(screen, last_stats)
+            pygame.display.flip()
+            screen.blit(saved, rect)
+        else:
+            pygame.display.flip()
+    overlay_shown = (overlay_visible, last_stats)
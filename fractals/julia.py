@@ -0,0 +1,114 @@
+import numpy as np
+from progressive import *
+
+JULIA_DOMAIN = (-1.6, 1.6) # x limits of the Julia set view
+JULIA_RANGE = (-1.6, 1.6) # y limits of the Julia set view
+JULIA_C = complex(-0.8, 0.156) # parameter shown before the mouse picks one
+JULIA_MAX_ITERATIONS = 300 # iteration limit of the Julia set and of the Mandelbrot inset
+JULIA_PREVIEW_SCALE = 4 # previews computed while the mouse moves have one sample per block of this side
+JULIA_REFINE_DELAY = 0.15 # seconds without mouse movement before the full-resolution render starts
+JULIA_INSET_SIZE = 180 # side of the Mandelbrot view the parameter is picked from, in pixels
+
+
+def compute_julia_counts(z_grid, c, max_iterations) -> np.ndarray:
+    """
+    PURPOSE: Vectorized escape counts of the Julia set of c.
+
+    PARAMETERS: z_grid is a complex NumPy array of starting points.
+                c is a complex number.
+                max_iterations is a positive integer.
+
+    RETURNS: An int32 array with the same shape as z_grid holding the escape count of every
+             starting point under z = z ** 2 + c (max_iterations for points that do not escape).
+
+    EFFECTS: Iterates the points with the Mandelbrot kernel (see compute_escape_counts), c being
+             the same for all of them.
+    """
+    return compute_escape_counts(np.full(z_grid.shape, c), max_iterations, z_grid=z_grid)
+
+
+def get_julia_kernel(c, frame_size, max_iterations):
+    """
+    PURPOSE: Build a function computing the escape counts of arbitrary pixels of the Julia set view.
+
+    PARAMETERS: c is a complex number.
+                frame_size is a tuple (width, height) in pixels.
+                max_iterations is a positive integer.
+
+    RETURNS: A function taking pixel coordinate arrays (xs, ys) and returning their escape
+             counts, pixels being mapped to JULIA_DOMAIN and JULIA_RANGE like pixel_to_complex.
+    """
+    def compute_pixels(xs, ys):
+        return compute_julia_counts(get_complex_points(JULIA_DOMAIN, JULIA_RANGE, frame_size, xs, ys), c,
+                                    max_iterations)
+    return compute_pixels
+
+
+def julia_preview_passes(c, frame_size, max_iterations, scale=JULIA_PREVIEW_SCALE):
+    """
+    PURPOSE: Compute a reduced-resolution Julia set as a job for RenderWorker.submit_passes.
+
+    PARAMETERS: c is a complex number.
+                frame_size is a tuple (width, height) in pixels.
+                max_iterations is a positive integer.
+                scale is the side of the blocks sharing one sample.
+
+    YIELDS: One tuple (scale, image), image being a full-size escape-count array in which every
+            scale x scale block shows the value of its top-left pixel.
+    """
+    frame_width, frame_height = frame_size
+    xs, ys = np.mgrid[0:frame_width:scale, 0:frame_height:scale]
+    lattice = get_julia_kernel(c, frame_size, max_iterations)(xs, ys)
+    yield scale, lattice.repeat(scale, axis=0).repeat(scale, axis=1)[:frame_width, :frame_height]
+
+
+def julia_passes(c, frame_size, max_iterations):
+    """
+    PURPOSE: Compute the Julia set at full resolution as a job for RenderWorker.submit_passes.
+
+    RETURNS: A progressive_passes generator over the Julia set view (without mirroring, as
+             Julia sets are not symmetric about the real axis).
+    """
+    return progressive_passes(JULIA_DOMAIN, JULIA_RANGE, frame_size, max_iterations,
+                              compute_pixels=get_julia_kernel(c, frame_size, max_iterations), mirror=False)
+
+
+def get_inset_rect(frame_size) -> pygame.Rect:
+    """
+    PURPOSE: Returns where the Mandelbrot view used to pick c is drawn: the bottom-left corner.
+    """
+    return pygame.Rect(0, frame_size[1] - JULIA_INSET_SIZE, JULIA_INSET_SIZE, JULIA_INSET_SIZE)
+
+
+def get_mandelbrot_inset(size, max_iterations) -> pygame.Surface:
+    """
+    PURPOSE: Render the current Mandelbrot viewport, scaled down, for picking c.
+
+    PARAMETERS: size is a tuple (width, height) in pixels.
+                max_iterations is a positive integer.
+
+    RETURNS: A pygame Surface of the given size, colored like get_color_mandelbrot.
+    """
+    iterations = compute_iterations(*get_viewport(), size, max_iterations)
+    return pygame.surfarray.make_surface(color_iterations_mandelbrot(iterations, max_iterations))
+
+
+def get_inset_c(pos, rect) -> complex:
+    """
+    PURPOSE: Find the parameter c under a point of the Mandelbrot inset.
+
+    PARAMETERS: pos is the (x, y) mouse position, inside rect.
+                rect is the pygame.Rect of the inset.
+
+    RETURNS: The complex number pixel_to_complex gives for the corresponding pixel of the
+             full-size Mandelbrot view.
+    """
+    return pixel_to_complex(((pos[0] - rect.left) * WIDTH / rect.width, (pos[1] - rect.top) * HEIGHT / rect.height))
+
+
+def get_inset_pos(c, rect) -> tuple:
+    """
+    PURPOSE: Find the point of the Mandelbrot inset showing a parameter c (the inverse of get_inset_c).
+    """
+    x, y = complex_to_pixel(c)
+    return rect.left + x * rect.width / WIDTH, rect.top + y * rect.height / HEIGHT
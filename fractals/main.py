@@ -1,150 +1,591 @@
+import argparse
+import os
+import sys
+import time
+
+if __package__: # run as python -m fractals.main: the modules import each other by their bare names
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from fractals import initialize_screen
-from events import handle_events
 from utils import *
 from main_menu import *
 from fractals.Button import *
 from sierpinski import draw_sierpinski
-from sierpinski_recursive import sierpinski_recursive
+from sierpinski_recursive import draw_sierpinski_levels, LEVEL_DELAY
 from sierpinski import initialize_sierpinski_screen, draw_line_and_point
-from mandelbrot import generate_mandelbrot, zoom_in
-
-
-def main_menu():
+from chaos_density import density_passes, ifs_density_passes
+from ifs import IFS_PRESETS, get_ifs_preset, load_ifs
+from mandelbrot import set_viewport, get_precise_viewport, get_max_iterations, blit_iterations, shutdown_process_pool
+from mandelbrot import get_viewport, set_max_iterations, ANTIALIASING
+from progressive import antialias_passes
+from perturbation import is_deep_zoom
+from deepening import IterationDeepener, AUTO_DEEPENING, DEEPENING_FACTOR, get_starting_iterations
+from render_worker import RenderWorker, RENDER_FPS
+from viewport_history import *
+from palette import cycle_palette
+from julia import *
+from instrumentation import start_render, finish_render, count_stat, handle_instrumentation_key
+from instrumentation import flip_display, is_overlay_changed
+from backends import BACKEND, select_backend, get_backend_names, get_calibration_report
+
+IDLE_FPS = 30 # frame rate of scenes that only wait for input
+
+loaded_ifs = [] # (name, IFS) of the map tables given with --ifs, cycled through after IFS_PRESETS
+
+
+class Scene:
     """
-    PURPOSE: Initialize and run the main menu screen with buttons.
-
-    MODIFIES: screen (pygame display) is updated with menu visuals and button states.
-              Button objects' internal state.
-    EFFECTS: Displays the main menu.
-             Handles user interactions via buttons.
-             Calls the corresponding functions when buttons are clicked.
-
+    PURPOSE: One screen of the program. The run loop feeds it events and frames, and a scene
+             asks for another one by returning it from handle_event or update.
     """
-    screen = initialize_screen("Main Menu", (126, 196, 252))
-    draw_main_menu(screen)
+    fps = IDLE_FPS # frames per second the run loop paces this scene at
+    screen_changed = False # set when the scene drew something that is not displayed yet
 
-    pygame.display.flip()
+    def handle_event(self, event):
+        """
+        PURPOSE: React to one pygame event.
 
-    running = True
+        RETURNS: The scene to switch to, or None to stay on this one.
+        """
+        return None
 
-    buttons = get_main_menu_buttons()
-    while running:
-        running = handle_events()
-        if buttons["mandelbrot_button"].is_clicked():
-            mandelbrot_main()
-        if buttons["sierpinski_chaos_button"].is_clicked():
-            sierpinski_chaos_main()
-        if buttons["sierpinski_recursive_button"].is_clicked():
-            sierpinski_recursive_main()
+    def update(self):
+        """
+        PURPOSE: Do the per-frame work of the scene.
 
-        for button in buttons.values():
-            button.change_color(screen)  # updates hover/default color
+        RETURNS: The scene to switch to, or None to stay on this one.
+        """
+        return None
 
-        pygame.display.flip()
+    def close(self):
+        """
+        PURPOSE: Release what the scene holds (background work, ...) before it is left.
+        """
 
 
-
-def sierpinski_chaos_main():
+def run_scenes(scene):
     """
-    PURPOSE: Initialize and run the Sierpinski Triangle visualization using the chaos method.
+    PURPOSE: Run the program, one scene at a time, until the window is closed.
 
-    MODIFIES: screen (pygame Surface) is updated with the Sierpinski triangle and lines.
-              Button objects' internal state.
+    PARAMETERS: scene is the first Scene.
 
-    EFFECTS: Allows user to pick a point to start the chaos method.
-             Continuously draws points and lines as user interacts with the mouse.
-             Provides a "Go Back" button to return to the main menu.
+    EFFECTS: A single loop pumps the events, hands them to the current scene, paces frames
+             with pygame.time.Clock at the scene's fps and flips the display only when
+             the scene drew something (its screen_changed flag).
+             Switching scenes replaces the current one, so nothing accumulates over a session.
+             STATS_KEY shows the render stats overlay and PROFILE_KEY profiles the next
+             render, in every scene.
     """
-    screen = initialize_screen("Sierpinski Triangle Chaos", COLOR_WHITE)
-    initialize_sierpinski_screen(screen)
-    go_back_button = get_go_back_button()
-    go_back_button.draw(screen)
-    pygame.display.flip()
-
-    running = True
-    picked = False
-    started_drawing = False
-    while running:
+    clock = pygame.time.Clock()
+    while scene is not None:
+        next_scene = None
         for e in pygame.event.get():
             if e.type == pygame.QUIT:
-                pygame.quit()
-                running = False
-            elif go_back_button.is_clicked():
-                main_menu()
-            elif e.type == pygame.MOUSEBUTTONDOWN:
-                if not picked and not started_drawing:
-                    mouse_pos = pygame.mouse.get_pos()
-                    screen.fill(COLOR_WHITE)
-                    go_back_button.draw(screen)
-                    draw_sierpinski(screen, mouse_pos, repetitions=30000)
-                    picked = True
-                    started_drawing = True
-                elif started_drawing:
-                    mouse_pos = pygame.mouse.get_pos()
-                    draw_line_and_point(screen, mouse_pos)
-
-
-
-
+                scene.close()
+                return
+            if handle_instrumentation_key(e):
+                continue
+            next_scene = scene.handle_event(e)
+            if next_scene is not None:
+                break
+        if next_scene is None:
+            next_scene = scene.update()
+        if next_scene is not None:
+            scene.close()
+            scene = next_scene
+            continue
+        if scene.screen_changed or is_overlay_changed():
+            flip_display()
+            scene.screen_changed = False
+        clock.tick(scene.fps)
+
+
+class MainMenuScene(Scene):
+    """
+    PURPOSE: The main menu, with one button per fractal.
+    """
 
-def sierpinski_recursive_main():
+    def __init__(self):
+        """
+        PURPOSE: Initialize the main menu screen with buttons.
+
+        MODIFIES: screen (pygame display) is updated with menu visuals.
+        """
+        self.screen = initialize_screen("Main Menu", (126, 196, 252))
+        self.buttons = get_main_menu_buttons()
+        draw_main_menu(self.screen, self.buttons)
+        self.screen_changed = True
+
+    def handle_event(self, event):
+        """
+        PURPOSE: Open the fractal whose button was clicked, and highlight the hovered button.
+        """
+        if self.buttons["mandelbrot_button"].is_clicked_by(event):
+            return MandelbrotScene()
+        if self.buttons["sierpinski_chaos_button"].is_clicked_by(event):
+            return SierpinskiChaosScene()
+        if self.buttons["sierpinski_recursive_button"].is_clicked_by(event):
+            return SierpinskiRecursiveScene()
+        if self.buttons["julia_button"].is_clicked_by(event):
+            return JuliaScene()
+        if event.type == pygame.MOUSEMOTION:
+            for button in self.buttons.values():
+                if button.change_color(self.screen): # updates hover/default color
+                    self.screen_changed = True
+        return None
+
+
+class SierpinskiChaosScene(Scene):
+    """
+    PURPOSE: The Sierpinski Triangle visualization using the chaos method.
     """
-    PURPOSE: Initialize and display the Sierpinski Triangle using the recursive method.
 
-    MODIFIES: screen (pygame Surface) is updated with the recursive Sierpinski triangle.
-              Button objects' internal state.
+    def __init__(self):
+        """
+        PURPOSE: Initialize the Sierpinski Triangle visualization using the chaos method.
+
+        MODIFIES: screen (pygame Surface) is updated with the triangle's outline.
+        """
+        self.screen = initialize_screen("Sierpinski Triangle Chaos", COLOR_WHITE)
+        initialize_sierpinski_screen(self.screen)
+        self.go_back_button = get_go_back_button()
+        self.go_back_button.draw(self.screen)
+        self.screen_changed = True
+        self.started_drawing = False
+        self.ifs_list = [(name, get_ifs_preset(name)) for name in IFS_PRESETS] + loaded_ifs
+        self.ifs_index = -1
+        self.worker = RenderWorker() # computes density images in the background
+
+    def handle_event(self, event):
+        """
+        PURPOSE: React to the user's clicks and keys.
+
+        MODIFIES: screen (pygame Surface) is updated with the Sierpinski triangle and lines.
+
+        EFFECTS: The first click picks the point to start the chaos method from, later clicks
+                 draw points and lines from the mouse (stopping any density image in progress).
+                 D draws the triangle as a log-scaled density image of DENSITY_POINTS points,
+                 I draws the next of IFS_PRESETS (fern, carpet, ...) and of the tables loaded
+                 with --ifs the same way. Density
+                 images are computed on the worker and shown as they fill (see update).
+                 The "Go Back" button returns to the main menu.
+        """
+        if self.go_back_button.is_clicked_by(event):
+            return MainMenuScene()
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            self.worker.cancel()
+            if not self.started_drawing:
+                self.screen.fill(COLOR_WHITE)
+                self.go_back_button.draw(self.screen)
+                draw_sierpinski(self.screen, event.pos, repetitions=30000)
+                self.started_drawing = True
+            else:
+                draw_line_and_point(self.screen, event.pos)
+        elif event.type == pygame.KEYDOWN and event.key in (pygame.K_d, pygame.K_i):
+            if event.key == pygame.K_i:
+                self.ifs_index = (self.ifs_index + 1) % len(self.ifs_list)
+                self.worker.submit_passes(ifs_density_passes(self.ifs_list[self.ifs_index][1], self.screen.get_size()))
+            else:
+                self.worker.submit_passes(density_passes(self.screen.get_size()))
+            self.started_drawing = True
+        return None
+
+    def update(self):
+        """
+        PURPOSE: Show the latest update of the density image in progress.
+        """
+        update = self.worker.poll()
+        if update is not None:
+            pygame.surfarray.blit_array(self.screen, update[1])
+            self.go_back_button.draw(self.screen)
+            self.screen_changed = True
+        self.worker.take_result()
+        return None
+
+    def close(self):
+        """
+        PURPOSE: Stop the density image in progress.
+        """
+        self.worker.cancel()
+
+
+class SierpinskiRecursiveScene(Scene):
+    """
+    PURPOSE: The Sierpinski Triangle drawn with the recursive method.
+    """
 
-    EFFECTS: Draws the Sierpinski triangle recursively.
+    def __init__(self):
+        """
+        PURPOSE: Initialize the Sierpinski Triangle screen and start drawing it.
+
+        MODIFIES: screen (pygame Surface) is cleared.
+
+        EFFECTS: Starts the animated construction (see update).
+                 Provides a "Go Back" button to return to the main menu.
+        """
+        self.screen = initialize_screen("Sierpinski Triangle Recursive", COLOR_WHITE)
+        self.go_back_button = get_go_back_button()
+        self.levels = None # draw_sierpinski_levels generator of the drawing in progress
+        self.next_level = 0 # time, in milliseconds of pygame.time.get_ticks, to draw the next level at
+        self.start_drawing()
+
+    def start_drawing(self, instant=False):
+        """
+        PURPOSE: Clear the screen and start drawing the triangle.
+
+        PARAMETERS: instant draws the whole triangle at once (see draw_sierpinski_pascal)
+                    instead of level by level.
+
+        MODIFIES: screen, the render stats (a new render is recorded).
+        """
+        self.screen.fill(COLOR_WHITE)
+        start_render("recursive triangle")
+        self.levels = draw_sierpinski_levels(self.screen, (WIDTH / 2, 50), (50, HEIGHT - 50),
+                                             (WIDTH - 50, HEIGHT - 50), instant)
+        self.next_level = 0
+        self.update()
+
+    def handle_event(self, event):
+        """
+        PURPOSE: React to the user's clicks and keys.
+
+        EFFECTS: I draws the triangle again at once, R draws it again level by level.
+                 The "Go Back" button returns to the main menu.
+        """
+        if self.go_back_button.is_clicked_by(event):
+            return MainMenuScene()
+        if event.type == pygame.KEYDOWN and event.key in (pygame.K_i, pygame.K_r):
+            self.start_drawing(instant=event.key == pygame.K_i)
+        return None
+
+    def update(self):
+        """
+        PURPOSE: Draw the next level of the triangle once LEVEL_DELAY has passed since the last one.
+
+        EFFECTS: The level is displayed by the run loop's flip; the event loop keeps running
+                 between levels.
+        """
+        if self.levels is None or pygame.time.get_ticks() < self.next_level:
+            return None
+        if next(self.levels, None) is None:
+            self.levels = None
+            finish_render()
+            return None
+        self.go_back_button.draw(self.screen)
+        self.screen_changed = True
+        self.next_level = pygame.time.get_ticks() + LEVEL_DELAY
+        return None
+
+
+class MandelbrotScene(Scene):
+    """
+    PURPOSE: The Mandelbrot set visualization.
+
+    EFFECTS: Displays the Mandelbrot set on screen, refining it from a coarse preview.
+             Rendering runs on a background RenderWorker that is polled every frame,
+             so clicks are handled while a frame is being computed.
+             Allows zooming in at mouse click positions (right click zooms out), panning
+             with the arrow keys and going back/forward through visited views with B/F,
+             cancelling the render in flight. Visited views are kept in a RenderCache so
+             returning to them is instant. P switches palette, recoloring the current
+             frame without iterating again.
+             The iteration limit starts from the zoom depth and, with AUTO_DEEPENING, keeps
+             rising in the background after every render while it reveals detail; + raises
+             it by DEEPENING_FACTOR. Deepening only continues the pixels that have not escaped.
+             Once the limit settles, the pixels on sharp edges are supersampled in the
+             background (adaptive anti-aliasing); A turns this on and off.
              Provides a "Go Back" button to return to the main menu.
     """
-    screen = initialize_screen("Sierpinski Triangle Recursive", COLOR_WHITE)
-    sierpinski_recursive(screen, (WIDTH / 2, 50), (50, HEIGHT - 50), (WIDTH - 50, HEIGHT - 50))
-
-    go_back_button = get_go_back_button()
-    go_back_button.draw(screen)
-    pygame.display.flip()
-
-    running = True
-    while running:
-        running = handle_events()
-        if go_back_button.is_clicked():
-            main_menu()
-
-
-def mandelbrot_main():
+    fps = RENDER_FPS
+
+    def __init__(self):
+        """
+        PURPOSE: Initialize the Mandelbrot screen and start rendering the current viewport.
+
+        MODIFIES: screen (pygame Surface) is updated with the Mandelbrot visualization.
+        """
+        self.screen = initialize_screen("Simple Mandelbrot Fractal", COLOR_WHITE)
+        self.go_back_button = get_go_back_button()
+        self.go_back_button.draw(self.screen)
+        self.screen_changed = True
+        self.worker = RenderWorker()
+        self.cache = RenderCache()
+        self.history = ViewportHistory(get_precise_viewport())
+        self.deepener = None # IterationDeepener of the displayed frame, once deepening started
+        self.states = [] # iteration state kept by the render of the displayed frame, for the deepener
+        self.deepening = False # whether the worker's current job deepens the displayed frame
+        self.antialiasing = False # whether the worker's current job supersamples the displayed frame
+        self.antialias_enabled = ANTIALIASING # whether finished frames are supersampled
+        self.samples = None # sub-samples of the displayed frame's edges (see supersample_edges)
+        self.image = self.show(self.history.current()) # escape counts currently displayed
+
+    def show(self, viewport, pan_from=None):
+        """
+        PURPOSE: Display a viewport (see show_viewport) and redraw the "Go Back" button over it.
+
+        MODIFIES: The render stats: a new render is recorded, finished at once when cached.
+
+        RETURNS: The escape counts shown if the viewport was cached, None otherwise.
+        """
+        self.deepener = None
+        self.states = []
+        self.deepening = False
+        self.antialiasing = False
+        self.samples = None
+        start_render("mandelbrot", profile=False)
+        count_stat("pixels", self.screen.get_width() * self.screen.get_height())
+        shown = show_viewport(self.screen, self.worker, self.cache, viewport, pan_from, self.states)
+        if shown is not None:
+            self.go_back_button.draw(self.screen)
+            self.screen_changed = True
+            finish_render()
+        return shown
+
+    def handle_event(self, event):
+        """
+        PURPOSE: Zoom, pan, navigate the history or switch palette in response to the user.
+        """
+        if self.go_back_button.is_clicked_by(event):
+            return MainMenuScene()
+        history = self.history
+        shown = None
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 3:
+            history.push(get_zoomed_out_viewport(*history.current()))
+            shown = self.show(history.current())
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            set_viewport(event.pos)
+            history.push(get_precise_viewport())
+            shown = self.show(history.current())
+        elif event.type == pygame.KEYDOWN and event.key in PAN_KEYS:
+            previous = history.current()
+            shift = PAN_KEYS[event.key]
+            history.push(get_panned_viewport(*previous, self.screen.get_size(), shift))
+            shown = self.show(history.current(), (previous, shift))
+        elif event.type == pygame.KEYDOWN and event.key == BACK_KEY and history.back():
+            shown = self.show(history.current())
+        elif event.type == pygame.KEYDOWN and event.key == FORWARD_KEY and history.forward():
+            shown = self.show(history.current())
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_p and self.image is not None:
+            cycle_palette()
+            blit_iterations(self.screen, self.image, get_max_iterations(), samples=self.samples)
+            self.go_back_button.draw(self.screen)
+            self.screen_changed = True
+        elif event.type == pygame.KEYDOWN and event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+            self.deepen(get_max_iterations() * DEEPENING_FACTOR)
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_a and self.image is not None:
+            self.antialias_enabled = not self.antialias_enabled
+            if self.antialias_enabled:
+                self.antialias()
+            else:
+                if self.antialiasing:
+                    self.worker.cancel()
+                    self.antialiasing = False
+                self.samples = None
+                blit_iterations(self.screen, self.image, get_max_iterations())
+                self.go_back_button.draw(self.screen)
+                self.screen_changed = True
+        if shown is not None:
+            self.image = shown
+            self.antialias()
+        return None
+
+    def deepen(self, max_iterations=None):
+        """
+        PURPOSE: Raise the iteration limit of the displayed frame on the worker.
+
+        PARAMETERS: max_iterations is the limit to reach, or None to deepen automatically
+                    (see IterationDeepener.passes).
+
+        EFFECTS: Does nothing while the frame is still being rendered, and for deep zooms
+                 (their perturbation engine does not keep an iteration state).
+                 Supersampling in progress is cancelled, as the frame changes.
+
+        RETURNS: True if deepening started.
+        """
+        if self.image is None or (self.worker.is_busy() and not (self.deepening or self.antialiasing)):
+            return False
+        center, size = get_precise_viewport()
+        if is_deep_zoom(center, size, self.screen.get_size()):
+            return False
+        if self.deepener is None:
+            self.deepener = IterationDeepener(*get_viewport(), self.screen.get_size(), self.image,
+                                              get_max_iterations(), self.states)
+            self.states = []
+        start_render("deepening", profile=False)
+        self.worker.submit_passes(self.deepener.passes(max_iterations))
+        self.deepening = True
+        self.antialiasing = False
+        self.samples = None
+        return True
+
+    def antialias(self):
+        """
+        PURPOSE: Supersample the edges of the displayed frame on the worker (see antialias_passes).
+
+        EFFECTS: Does nothing when anti-aliasing is off or the worker is still busy with the frame.
+        """
+        if not self.antialias_enabled or self.image is None or self.worker.is_busy():
+            return
+        start_render("antialiasing", profile=False)
+        self.worker.submit_passes(antialias_passes(*get_precise_viewport(), self.screen.get_size(), self.image,
+                                                   get_max_iterations()))
+        self.antialiasing = True
+        self.deepening = False
+
+    def update(self):
+        """
+        PURPOSE: Show the latest pass of the render in flight and keep finished frames in the
+                 cache and the tile store. Once a frame is neither rendered nor deepened
+                 anymore, its edges are supersampled.
+        """
+        update = self.worker.poll()
+        if update is not None:
+            step, payload = update
+            if self.antialiasing:
+                self.samples = payload
+            else:
+                self.image = payload
+                if self.deepening:
+                    set_max_iterations(step)
+            blit_iterations(self.screen, self.image, get_max_iterations(), samples=self.samples)
+            self.go_back_button.draw(self.screen)
+            self.screen_changed = True
+        result = self.worker.take_result()
+        if result is not None:
+            finish_render()
+            if self.antialiasing:
+                self.antialiasing = False
+                return None
+            viewport = get_precise_viewport()
+            max_iterations = get_starting_iterations(*get_viewport())
+            self.cache.put(get_cache_key(*viewport, self.screen.get_size(), max_iterations), result, get_max_iterations())
+            store_frame(*viewport, self.screen.get_size(), max_iterations, result, get_max_iterations())
+            if not (AUTO_DEEPENING and not self.deepening and self.deepen()):
+                self.antialias()
+        return None
+
+    def close(self):
+        """
+        PURPOSE: Cancel the render in flight.
+        """
+        self.worker.cancel()
+
+
+class JuliaScene(Scene):
     """
-    PURPOSE: Initialize and display the Mandelbrot set visualization.
-
-    MODIFIES: screen (pygame Surface) is updated with the Mandelbrot visualization.
-              Button objects' internal state.
-
-    EFFECTS: Displays the Mandelbrot set on screen.
-             Allows zooming in at mouse click positions.
+    PURPOSE: The Julia set explorer.
+
+    EFFECTS: Shows the Julia set of a parameter c picked by moving the mouse over a small view
+             of the current Mandelbrot viewport, in the bottom-left corner.
+             Every mouse move asks for a preview at 1 / JULIA_PREVIEW_SCALE resolution. Only
+             the latest c is rendered: values the mouse passes while a preview is computed
+             are skipped. Once the mouse rests for JULIA_REFINE_DELAY seconds, the set is
+             refined to full resolution in the background; moving again cancels it.
              Provides a "Go Back" button to return to the main menu.
     """
-    screen = initialize_screen("Simple Mandelbrot Fractal", COLOR_WHITE)
-    generate_mandelbrot(screen)
-
-    go_back_button = get_go_back_button()
-    go_back_button.draw(screen)
-    pygame.display.flip()
+    fps = RENDER_FPS
+
+    def __init__(self):
+        """
+        PURPOSE: Initialize the Julia set screen and start rendering the set of JULIA_C.
+
+        MODIFIES: screen (pygame Surface) is updated with the Mandelbrot inset.
+        """
+        self.screen = initialize_screen("Julia Set Explorer", COLOR_BLACK)
+        self.go_back_button = get_go_back_button()
+        self.inset_rect = get_inset_rect(self.screen.get_size())
+        self.inset = get_mandelbrot_inset(self.inset_rect.size, JULIA_MAX_ITERATIONS)
+        self.worker = RenderWorker()
+        self.c = JULIA_C # parameter of the set displayed or being rendered
+        self.pending = JULIA_C # latest parameter picked with the mouse, not rendered yet
+        self.refining = False # whether the worker's current job renders at full resolution
+        self.refined = False # whether self.c was rendered (or is being rendered) at full resolution
+        self.last_move = 0.0 # time of the last mouse move over the inset, from time.perf_counter
+        self.image = np.zeros(self.screen.get_size(), dtype=np.int32) # escape counts displayed
+        self.draw()
+
+    def handle_event(self, event):
+        """
+        PURPOSE: Pick c under the mouse when it moves over the Mandelbrot inset.
+        """
+        if self.go_back_button.is_clicked_by(event):
+            return MainMenuScene()
+        if event.type == pygame.MOUSEMOTION and self.inset_rect.collidepoint(event.pos):
+            self.pending = get_inset_c(event.pos, self.inset_rect)
+            self.last_move = time.perf_counter()
+        return None
+
+    def update(self):
+        """
+        PURPOSE: Start the next render (preview of the latest c, or refinement) and show its passes.
+        """
+        if self.pending is not None and (self.refining or not self.worker.is_busy()):
+            self.c, self.pending = self.pending, None
+            start_render("julia preview", profile=False)
+            self.worker.submit_passes(julia_preview_passes(self.c, self.screen.get_size(), JULIA_MAX_ITERATIONS))
+            self.refining = self.refined = False
+        elif self.pending is None and not self.refined and not self.worker.is_busy() \
+                and time.perf_counter() - self.last_move >= JULIA_REFINE_DELAY:
+            start_render("julia", profile=False)
+            self.worker.submit_passes(julia_passes(self.c, self.screen.get_size(), JULIA_MAX_ITERATIONS))
+            self.refining = self.refined = True
+
+        update = self.worker.poll()
+        if update is not None:
+            step, image = update
+            if not self.refining or step < JULIA_PREVIEW_SCALE: # coarser passes would undo the preview
+                self.image = image
+                self.draw()
+        if self.worker.take_result() is not None:
+            finish_render()
+            self.refining = False
+        return None
+
+    def draw(self):
+        """
+        PURPOSE: Draw the Julia set, the Mandelbrot inset with a mark at c, the value of c and
+                 the "Go Back" button.
+        """
+        blit_iterations(self.screen, self.image, JULIA_MAX_ITERATIONS)
+        self.screen.blit(self.inset, self.inset_rect)
+        pygame.draw.rect(self.screen, COLOR_WHITE, self.inset_rect, 1)
+        pygame.draw.circle(self.screen, COLOR_WHITE, get_inset_pos(self.c, self.inset_rect), 3, 1)
+        label = get_font(10).render(f"c = {self.c.real:.5f} {self.c.imag:+.5f}i", True, COLOR_WHITE)
+        self.screen.blit(label, label.get_rect(topright=(self.screen.get_width() - 10, 10)))
+        self.go_back_button.draw(self.screen)
+        self.screen_changed = True
+
+    def close(self):
+        """
+        PURPOSE: Cancel the render in flight.
+        """
+        self.worker.cancel()
 
-    running = True
-    while running:
-        for e in pygame.event.get():
-            if e.type == pygame.QUIT:
-                running = False
-            elif go_back_button.is_clicked():
-                main_menu()
-            elif e.type == pygame.MOUSEBUTTONDOWN:
-                mouse_pos = pygame.mouse.get_pos()
-                zoom_in(screen, mouse_pos)
-                go_back_button.draw(screen)
-                pygame.display.flip()
 
+def main_menu():
+    """
+    PURPOSE: Run the program from the main menu until the window is closed.
+    """
+    run_scenes(MainMenuScene())
+    shutdown_process_pool()
     pygame.quit()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Explore fractals.")
+    parser.add_argument("--backend", default=BACKEND,
+                        help=f"compute backend: auto or one of {', '.join(get_backend_names())} (default: %(default)s)")
+    parser.add_argument("--ifs", action="append", default=[], metavar="FILE",
+                        help="map table of an IFS to add to those the I key cycles through in the chaos view, "
+                             "one map 'a b c d e f [p]' per line (may be repeated)")
+    args = parser.parse_args()
+    for path in args.ifs:
+        try:
+            loaded_ifs.append((os.path.splitext(os.path.basename(path))[0], load_ifs(path)))
+        except (OSError, ValueError) as error:
+            parser.error(f"cannot load IFS {path}: {error}")
+    select_backend(args.backend)
+    report = get_calibration_report()
+    if report:
+        print(report)
     pygame.init()
-    main_menu()
\ No newline at end of file
+    main_menu()
@@ -1,19 +1,21 @@
 from utils import *
 from Button import *
-def draw_main_menu(screen):
+def draw_main_menu(screen, buttons=None):
     """
     PURPOSE: Draw the main menu screen, including background, title, and buttons.
 
     PARAMETERS: screen is a valid pygame Surface object.
+                buttons is the dictionary of get_main_menu_buttons to draw (created when None).
 
     MODIFIES: screen (updates the visual display of the menu).
 
     EFFECTS: Displays the main menu background and title.
-             Creates and draws all buttons on the screen.
+             Draws all buttons on the screen.
     """
     screen.blit(get_main_screen_background(), (0, 0))
     display_title(get_font(55), screen)
-    buttons = get_main_menu_buttons()
+    if buttons is None:
+        buttons = get_main_menu_buttons()
     draw_buttons(screen, buttons)
 
 
@@ -36,13 +38,14 @@ def get_main_menu_buttons() -> dict[str, 'Button']:
     """
     PURPOSE: Create and return all buttons for the main menu.
 
-    EFFECTS: Instantiates three Button objects for the main menu.
+    EFFECTS: Instantiates four Button objects for the main menu.
 
     RETURNS: A dictionary mapping button names to Button objects.
     """
     font = get_font(10)
     return {
-        "sierpinski_chaos_button": create_button(WIDTH / 2, 225, "Sierpinski Triangle", (400, 75), font),
-        "sierpinski_recursive_button": create_button(WIDTH / 2, 325, "Sierpinski Triangle Recursive", (400, 75), font),
-        "mandelbrot_button": create_button(WIDTH / 2, 425, "Simple Mandelbrot Fractal", (400, 75), font)
+        "sierpinski_chaos_button": create_button(WIDTH / 2, 205, "Sierpinski Triangle", (400, 75), font),
+        "sierpinski_recursive_button": create_button(WIDTH / 2, 290, "Sierpinski Triangle Recursive", (400, 75), font),
+        "mandelbrot_button": create_button(WIDTH / 2, 375, "Simple Mandelbrot Fractal", (400, 75), font),
+        "julia_button": create_button(WIDTH / 2, 460, "Julia Set Explorer", (400, 75), font)
     }
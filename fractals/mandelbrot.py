@@ -1,5 +1,14 @@
 from utils import *
-import colorsys
+import os
+import time
+from decimal import Decimal, localcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from palette import *
+from tile_store import get_tile_store, get_float_tile_key
+from instrumentation import start_render, finish_render, render_stage, add_stage_time, count_stat, is_recording, \
+    StatsCollector
+from backends import register_backend, get_backend, select_backend, is_selected, iterate_points_jit
 
 ZOOM_IN_FACTOR = 0.2
 DOMAIN = (-2, 1)
@@ -7,23 +16,120 @@ RANGE = (-1.5, 1.5)
 X_PIXEL_WEIGHT = abs(DOMAIN[1] - DOMAIN[0]) / WIDTH
 Y_PIXEL_WEIGHT = abs(RANGE[1] - RANGE[0])/HEIGHT
 MAX_ITERATIONS = 200
+CENTER = (Decimal("-0.5"), Decimal(0)) # center of the viewport, in high precision
+SIZE = (Decimal(3), Decimal(3)) # width and height of the viewport, in high precision
+EXTRA_DIGITS = 20 # decimal digits kept beyond the pixel size in high-precision viewport math
+RENDER_WORKERS = os.cpu_count() or 1 # number of processes used to render a frame
+TILE_SIZE = 64 # side of the square tiles the frame is split into, in pixels
+RENDER_STRATEGY = "full" # "full" iterates every pixel, "mariani_silver" skips uniform rectangles
+MARIANI_SILVER_MIN_SIZE = 6 # rectangles this small are iterated pixel by pixel
+INTERIOR_SHORTCUTS = True # skip the iteration of points known to be inside the set
+PERIODICITY_TOLERANCE = 1e-13 # orbits returning this close to a saved z are treated as periodic
+PERIODICITY_FIRST_CHECK = 8 # iteration at which z is first saved for the periodicity check
+MIRROR_SYMMETRY = True # compute one side of viewports crossing the real axis and flip it onto the other
+MIRROR_TOLERANCE = 1e-6 # how far, in pixels, the real axis may be from a row (or half-row) for mirroring
+ANTIALIASING = True # supersample the pixels on sharp edges of finished frames
+AA_SAMPLES = 16 # jittered sub-samples per supersampled pixel (a square number)
+AA_SAMPLE_BUDGET = 100000 # most sub-samples taken per frame; the sharpest edges are supersampled first
+AA_EDGE_THRESHOLD = 0.01 # a pixel is on an edge when a neighbour's escape count differs by this fraction of the limit
+AA_SEED = 0 # seed of the sub-sample jitter, so that frames are reproducible
 
+process_pool = None
+process_pool_workers = 0
+iterated_pixels = 0 # number of pixels actually iterated by the last generate_mandelbrot
 
-def generate_mandelbrot(screen):
+
+def generate_mandelbrot(screen, workers=None, tile_size=None, strategy=None):
     """
     PURPOSE: Generate the Mandelbrot set visualization on the given screen.
 
+    PARAMETERS: Screen is a valid pygame Surface object.
+                workers is the number of processes to use (defaults to RENDER_WORKERS).
+                tile_size is the side of the tiles in pixels (defaults to TILE_SIZE).
+                strategy is the name of the render strategy (defaults to RENDER_STRATEGY).
+
+    MODIFIES: screen (its pixel buffer is updated).
+              iterated_pixels (global variable).
+
+    EFFECTS: Computes the escape counts of the whole frame with NumPy, split into tiles
+             over a process pool when more than one worker is configured, and blits
+             the colored frame to the screen in a single call.
+             With smooth coloring on, the fractional escape counts of the whole frame are
+             computed in this process instead.
+             With ANTIALIASING on, the pixels on sharp edges are then supersampled (see
+             supersample_edges) and colored with the average color of their sub-samples,
+             timed as the render's "antialiasing" stage.
+             Records how many pixels were actually iterated in iterated_pixels, and the
+             render's stage timings when instrumentation is on (see start_render).
+
+    """
+    global iterated_pixels
+    workers = RENDER_WORKERS if workers is None else workers
+    tile_size = TILE_SIZE if tile_size is None else tile_size
+    start_render("mandelbrot")
+    count_stat("pixels", WIDTH * HEIGHT)
+    if is_smooth_coloring():
+        iterations = compute_iterations_smooth(DOMAIN, RANGE, (WIDTH, HEIGHT), MAX_ITERATIONS)
+        iterated_pixels = iterations.size
+    elif workers > 1:
+        with render_stage("iterations"):
+            iterations, iterated_pixels = compute_iterations_tiled(DOMAIN, RANGE, (WIDTH, HEIGHT), MAX_ITERATIONS,
+                                                                   workers, tile_size, strategy)
+    else:
+        iterations, iterated_pixels = compute_iterations_strategy(DOMAIN, RANGE, (WIDTH, HEIGHT), MAX_ITERATIONS,
+                                                                  strategy=strategy)
+    samples = None
+    if ANTIALIASING:
+        with render_stage("antialiasing"), StatsCollector() as supersampling: # its kernel stages are in this one
+            compute_pixels = get_float_pixel_kernel(DOMAIN, RANGE, (WIDTH, HEIGHT), MAX_ITERATIONS,
+                                                    np.issubdtype(iterations.dtype, np.floating))
+            samples = supersample_edges(compute_pixels, iterations, MAX_ITERATIONS)
+        for name in ("frame_pixels", "supersampled_pixels", "iterations"): # sub-samples are not iterated pixels
+            count_stat(name, supersampling.counters.get(name, 0))
+    blit_iterations(screen, iterations, MAX_ITERATIONS, samples=samples)
+    finish_render()
+
+
+def generate_mandelbrot_scalar(screen):
+    """
+    PURPOSE: Generate the Mandelbrot set visualization one pixel at a time.
+             Kept as the reference implementation for the vectorized engine.
+
     PARAMETERS: Screen is a valid pygame Surface object.
 
     MODIFIES: screen (its pixel buffer is updated).
 
     EFFECTS: Computes the Mandelbrot set for each pixel and colors the screen accordingly.
+             When instrumentation is on, the escape counts and the set_at writes are
+             timed separately, pixel by pixel.
 
     """
+    start_render("mandelbrot (scalar)")
+    count_stat("pixels", WIDTH * HEIGHT)
+    count_stat("iterated_pixels", WIDTH * HEIGHT)
+    if not is_recording():
+        for x in range(WIDTH):
+            for y in range(HEIGHT):
+                complex_num = pixel_to_complex((x, y))
+                mandelbrot(screen, complex_num)
+        return
+
+    iterations = 0
+    iteration_time = pixel_time = 0.0
     for x in range(WIDTH):
         for y in range(HEIGHT):
+            started = time.perf_counter()
             complex_num = pixel_to_complex((x, y))
-            mandelbrot(screen, complex_num)
+            num_iterations = get_escape_count(complex_num, MAX_ITERATIONS)
+            computed = time.perf_counter()
+            color_pixels_mandelbrot(complex_num, num_iterations, screen)
+            pixel_time += time.perf_counter() - computed
+            iteration_time += computed - started
+            iterations += num_iterations
+    add_stage_time("iterations", iteration_time)
+    add_stage_time("set_at", pixel_time)
+    count_stat("iterations", iterations)
+    finish_render()
 
 
 def mandelbrot(screen, complex_num):
@@ -38,14 +144,898 @@ def mandelbrot(screen, complex_num):
 
     EFFECTS: Colors the pixel corresponding to complex_num based on the number of iterations.
     """
-    z = 0
-    for n in range(MAX_ITERATIONS):
-        if abs(z) > 2:
-            color_pixels_mandelbrot(complex_num, n, screen)
-            return
+    color_pixels_mandelbrot(complex_num, get_escape_count(complex_num, MAX_ITERATIONS), screen)
+
+
+def get_escape_count(complex_num, max_iterations) -> int:
+    """
+    PURPOSE: Count the iterations of z = z ** 2 + complex_num (starting at z = 0)
+             until |z| > 2.
+
+    PARAMETERS: complex_num is a complex number.
+                max_iterations is a positive integer.
+
+    RETURNS: The escape count n, or max_iterations if the point never escaped
+             (i.e. it is inside the set).
+
+    EFFECTS: When INTERIOR_SHORTCUTS is on, points in the main cardioid or the period-2
+             bulb return max_iterations without iterating, and the loop stops early
+             (returning max_iterations) once the orbit comes back to a saved z.
+    """
+    return get_escape(complex_num, max_iterations)[0]
+
+
+def get_escape(complex_num, max_iterations, z=None) -> tuple:
+    """
+    PURPOSE: Iterate z = z ** 2 + complex_num until |z| > 2, like get_escape_count,
+             optionally from another starting z (for Julia sets).
+
+    PARAMETERS: complex_num is a complex number.
+                max_iterations is a positive integer.
+                z is the starting point, or None for z = 0 (which also allows the
+                cardioid and bulb shortcut).
+
+    RETURNS: A tuple (n, magnitude, steps): the escape count (max_iterations if the point
+             never escaped), |z| at escape (None if it did not escape) and the number of
+             z updates done.
+    """
+    if z is None:
+        if INTERIOR_SHORTCUTS and is_in_cardioid_or_bulb(complex_num.real, complex_num.imag):
+            return max_iterations, None, 0
+        z = 0
+    saved_z = z
+    next_save = PERIODICITY_FIRST_CHECK
+    for n in range(max_iterations):
+        magnitude = abs(z)
+        if magnitude > 2:
+            return n, magnitude, n + 1
         z = z ** 2 + complex_num
+        if INTERIOR_SHORTCUTS:
+            distance = z - saved_z
+            if distance.real * distance.real + distance.imag * distance.imag < PERIODICITY_TOLERANCE ** 2:
+                return max_iterations, None, n + 1
+            if n + 1 == next_save:
+                saved_z = z
+                next_save *= 2
     # if the loop finishes then it's inside the set
-    color_pixels_mandelbrot(complex_num, MAX_ITERATIONS, screen)
+    return max_iterations, None, max_iterations
+
+
+def is_in_cardioid_or_bulb(x, y):
+    """
+    PURPOSE: Analytic test for the two largest components of the Mandelbrot set.
+
+    PARAMETERS: x, y are the real and imaginary parts of a point, either floats
+                or NumPy arrays of the same shape.
+
+    RETURNS: True (or a boolean array) where the point lies strictly inside the main
+             cardioid or the period-2 bulb centered at -1, i.e. where it is in the set.
+    """
+    y_squared = y * y
+    q = (x - 0.25) ** 2 + y_squared
+    in_cardioid = q * (q + (x - 0.25)) < 0.25 * y_squared
+    in_bulb = (x + 1) ** 2 + y_squared < 0.0625
+    return in_cardioid | in_bulb
+
+
+def get_complex_grid(domain, my_range, frame_size, rect=None) -> np.ndarray:
+    """
+    PURPOSE: Build the complex numbers of a block of pixels in one array, using the
+             same mapping as pixel_to_complex.
+
+    PARAMETERS: domain, my_range are tuples of floats (the viewport's x and y limits).
+                frame_size is a tuple (width, height) of the whole frame in pixels.
+                rect is an optional tuple (x, y, width, height) selecting a block of
+                pixels inside the frame. Defaults to the whole frame.
+
+    RETURNS: A complex128 array of shape (width, height) indexed as [x, y],
+             matching the layout used by pygame.surfarray.
+    """
+    frame_width, frame_height = frame_size
+    x, y, width, height = rect if rect is not None else (0, 0, frame_width, frame_height)
+    x_weight = (domain[1] - domain[0]) / frame_width
+    y_weight = (my_range[1] - my_range[0]) / frame_height
+
+    with render_stage("mapping"):
+        real = np.arange(x, x + width) * x_weight + domain[0]
+        imag = my_range[1] - np.arange(y, y + height) * y_weight
+        return real[:, np.newaxis] + 1j * imag[np.newaxis, :]
+
+
+def get_complex_points(domain, my_range, frame_size, xs, ys) -> np.ndarray:
+    """
+    PURPOSE: Map arbitrary pixels to complex numbers, using the same mapping as pixel_to_complex.
+
+    PARAMETERS: domain, my_range, frame_size are as in get_complex_grid.
+                xs, ys are integer NumPy arrays of the same shape holding pixel coordinates.
+
+    RETURNS: A complex128 array with the same shape as xs.
+    """
+    frame_width, frame_height = frame_size
+    x_weight = (domain[1] - domain[0]) / frame_width
+    y_weight = (my_range[1] - my_range[0]) / frame_height
+    with render_stage("mapping"):
+        return (xs * x_weight + domain[0]) + 1j * (my_range[1] - ys * y_weight)
+
+
+def get_mirror(my_range, frame_size, rect=None):
+    """
+    PURPOSE: Find the rows of a block of pixels that mirror other rows of the block across
+             the real axis, the Mandelbrot set being symmetric about it.
+
+    PARAMETERS: my_range is a tuple of floats (the viewport's y limits).
+                frame_size and rect are as in get_complex_grid.
+
+    RETURNS: None when MIRROR_SYMMETRY is off, the real axis is not within MIRROR_TOLERANCE
+             of a row or of the middle of two rows, or no two rows of the block mirror each
+             other. Otherwise a tuple (computed, offset, targets, sources):
+             computed is the rect (x, y, width, height) of the rows to compute, offset is where
+             its first row goes in the block, and targets, sources are integer arrays of rows
+             of the block such that row targets[i] is a copy of row sources[i].
+             The computed rows are the unique half plus whatever band of the block lies
+             past the mirrored part, so they form one rectangle.
+    """
+    if not MIRROR_SYMMETRY:
+        return None
+    frame_width, frame_height = frame_size
+    x, y, width, height = rect if rect is not None else (0, 0, frame_width, frame_height)
+    y_weight = (my_range[1] - my_range[0]) / frame_height
+    twice_axis = 2 * my_range[1] / y_weight # row of the real axis, doubled
+    n = round(twice_axis) # row r mirrors row n - r
+    if abs(twice_axis - n) > 2 * MIRROR_TOLERANCE:
+        return None
+    top, bottom = y, y + height - 1
+    low, high = max(top, n - bottom), min(bottom, n - top) # rows whose mirror is in the block
+    if high <= low:
+        return None
+    if bottom > high: # more rows below the axis: compute those, copy the top of the pair band
+        targets = np.arange(low, (n - 1) // 2 + 1)
+        computed = (x, targets[-1] + 1, width, bottom - targets[-1])
+    else:
+        targets = np.arange(n // 2 + 1, high + 1)
+        computed = (x, top, width, targets[0] - top)
+    return computed, computed[1] - top, targets - top, n - targets - top
+
+
+def mirror_block(part, mirror) -> np.ndarray:
+    """
+    PURPOSE: Assemble a block of pixels from its computed rows and their mirror images.
+
+    PARAMETERS: part is the array computed for the rect mirror[0], indexed as [x, y].
+                mirror is a tuple returned by get_mirror.
+
+    RETURNS: An array of the whole block, with the same dtype as part.
+    """
+    computed, offset, targets, sources = mirror
+    block = np.empty((part.shape[0], part.shape[1] + targets.size) + part.shape[2:], dtype=part.dtype)
+    block[:, offset:offset + part.shape[1]] = part
+    block[:, targets] = block[:, sources]
+    return block
+
+
+def get_float_pixel_kernel(domain, my_range, frame_size, max_iterations, smooth=False):
+    """
+    PURPOSE: Build a function computing the escape counts of arbitrary pixels of a viewport
+             given as float limits, like get_pixel_kernel for shallow zooms.
+
+    PARAMETERS: domain, my_range, frame_size are as in get_complex_grid.
+                max_iterations is a positive integer.
+                smooth makes the function return fractional escape counts instead.
+
+    RETURNS: A function taking pixel coordinate arrays (xs, ys), which may be fractional,
+             and returning their escape counts.
+    """
+    def compute_pixels(xs, ys):
+        points = get_complex_points(domain, my_range, frame_size, xs, ys)
+        if not smooth:
+            return compute_escape_counts(points, max_iterations)
+        magnitudes = np.zeros(points.shape)
+        return get_smooth_iterations(compute_escape_counts(points, max_iterations, magnitudes), magnitudes,
+                                     max_iterations)
+    return compute_pixels
+
+
+def compute_escape_counts(c_grid, max_iterations, magnitudes=None, z_grid=None) -> np.ndarray:
+    """
+    PURPOSE: Vectorized version of get_escape_count for a whole array of points.
+
+    PARAMETERS: c_grid is a complex NumPy array of any shape.
+                max_iterations is a positive integer.
+                magnitudes is an optional float array shaped like c_grid; when given,
+                |z| at escape is stored in it for every escaped point (for smooth coloring).
+                z_grid optionally gives the starting z of every point (see EscapeState).
+
+    RETURNS: An int32 array with the same shape as c_grid holding the escape count
+             of every point (max_iterations for points inside the set).
+
+    EFFECTS: Runs the compute backend selected for this machine (see backends.select_backend).
+             All backends give identical counts and magnitudes.
+    """
+    return get_backend().compute(c_grid, max_iterations, magnitudes, z_grid)
+
+
+def compute_escape_counts_numpy(c_grid, max_iterations, magnitudes=None, z_grid=None) -> np.ndarray:
+    """
+    PURPOSE: The "numpy" backend of compute_escape_counts: iterates the points with an
+             EscapeState (see EscapeState.iterate).
+    """
+    state = EscapeState(c_grid, magnitudes, z_grid=z_grid)
+    state.iterate(max_iterations)
+    return state.counts.reshape(c_grid.shape)
+
+
+def compute_escape_counts_python(c_grid, max_iterations, magnitudes=None, z_grid=None) -> np.ndarray:
+    """
+    PURPOSE: The "python" backend of compute_escape_counts: runs get_escape on every point,
+             so it needs nothing but the standard library's arithmetic.
+    """
+    timer = time.perf_counter()
+    points = c_grid.ravel().tolist()
+    starts = z_grid.ravel().tolist() if z_grid is not None else [None] * len(points)
+    counts = np.empty(len(points), dtype=np.int32)
+    flat_magnitudes = magnitudes.reshape(-1) if magnitudes is not None else None
+    iterated = steps = 0
+    for i, (complex_num, z) in enumerate(zip(points, starts)):
+        counts[i], magnitude, point_steps = get_escape(complex_num, max_iterations, z)
+        if magnitude is not None and flat_magnitudes is not None:
+            flat_magnitudes[i] = magnitude
+        iterated += point_steps > 0
+        steps += point_steps
+    add_stage_time("iterations", time.perf_counter() - timer)
+    count_stat("iterated_pixels", iterated)
+    count_stat("iterations", steps)
+    return counts.reshape(c_grid.shape)
+
+
+def compute_escape_counts_jit(c_grid, max_iterations, magnitudes=None, z_grid=None) -> np.ndarray:
+    """
+    PURPOSE: The "numba" backend of compute_escape_counts: runs the compiled scalar loop
+             backends.iterate_points over the points, which stops every point as soon as it
+             escapes instead of iterating arrays in lockstep.
+    """
+    timer = time.perf_counter()
+    c_real = np.ascontiguousarray(c_grid.real, dtype=np.float64).ravel()
+    c_imag = np.ascontiguousarray(c_grid.imag, dtype=np.float64).ravel()
+    if z_grid is None:
+        z_real, z_imag = np.zeros_like(c_real), np.zeros_like(c_imag)
+    else:
+        z_real = np.array(z_grid.real, dtype=np.float64).ravel()
+        z_imag = np.array(z_grid.imag, dtype=np.float64).ravel()
+    counts = np.empty(c_real.size, dtype=np.int32)
+    escaped_magnitudes = magnitudes.reshape(-1) if magnitudes is not None else np.empty(0)
+    iterated, steps = iterate_points_jit(c_real, c_imag, z_real, z_imag, z_real.copy(), z_imag.copy(), 0,
+                                         max_iterations, PERIODICITY_FIRST_CHECK, counts, escaped_magnitudes,
+                                         np.empty(c_real.size, dtype=np.uint8), INTERIOR_SHORTCUTS and z_grid is None,
+                                         INTERIOR_SHORTCUTS, PERIODICITY_TOLERANCE ** 2)
+    add_stage_time("iterations", time.perf_counter() - timer)
+    count_stat("iterated_pixels", iterated)
+    count_stat("iterations", steps)
+    return counts.reshape(c_grid.shape)
+
+
+register_backend("python", compute_escape_counts_python, "pure Python, one point at a time")
+register_backend("numpy", compute_escape_counts_numpy, "NumPy, whole arrays of points")
+if iterate_points_jit is not None:
+    register_backend("numba", compute_escape_counts_jit, "Numba JIT-compiled loop")
+
+
+class EscapeState:
+    """
+    PURPOSE: Escape-time iteration of an array of points that can be stopped at an iteration
+             limit and resumed later with a higher one, continuing only the points that
+             have not escaped from the z they had reached.
+    """
+
+    def __init__(self, c_grid, magnitudes=None, pixels=None, counts=None, z_grid=None):
+        """
+        PURPOSE: Set up the iteration of the points of c_grid from z = 0, or from z_grid.
+
+        PARAMETERS: c_grid is a complex NumPy array of any shape.
+                    magnitudes is an optional float array shaped like c_grid; |z| at escape
+                    is stored in it for every point that escapes.
+                    pixels optionally restricts the iteration to these flat indices of c_grid.
+                    counts optionally gives the escape counts of the other points (it is copied).
+                    z_grid optionally gives the starting z of every point, shaped like c_grid
+                    (Julia sets iterate a grid of starting points with a single c).
+
+        EFFECTS: When INTERIOR_SHORTCUTS is on, cardioid and bulb points are never iterated
+                 (only when starting from z = 0, which the shortcut assumes).
+        """
+        self.counts = np.zeros(c_grid.size, dtype=np.int32) if counts is None \
+            else np.array(counts, dtype=np.int32).ravel() # escape counts, flat
+        self.magnitudes = magnitudes
+        self.limit = 0 # iterations done so far
+        self.alive = np.arange(c_grid.size) if pixels is None else np.asarray(pixels) # points still iterated
+        self.c_real = np.ascontiguousarray(c_grid.real).ravel()[self.alive]
+        self.c_imag = np.ascontiguousarray(c_grid.imag).ravel()[self.alive]
+        self.interior = np.empty(0, dtype=self.alive.dtype) # points known to be inside the set
+        if INTERIOR_SHORTCUTS and z_grid is None:
+            inside = is_in_cardioid_or_bulb(self.c_real, self.c_imag)
+            self.interior = self.alive[inside]
+            self.alive, self.c_real, self.c_imag = self.alive[~inside], self.c_real[~inside], self.c_imag[~inside]
+        if z_grid is None:
+            self.z_real = np.zeros_like(self.c_real)
+            self.z_imag = np.zeros_like(self.c_imag)
+        else:
+            self.z_real = np.ascontiguousarray(z_grid.real, dtype=np.float64).ravel()[self.alive]
+            self.z_imag = np.ascontiguousarray(z_grid.imag, dtype=np.float64).ravel()[self.alive]
+        self.saved_real = self.z_real.copy() # z saved for the periodicity check
+        self.saved_imag = self.z_imag.copy()
+        self.next_save = PERIODICITY_FIRST_CHECK # iteration at which z is saved next
+
+    def keep(self, still_alive):
+        """
+        PURPOSE: Drop the points that are no longer iterated from the working arrays.
+
+        PARAMETERS: still_alive is a boolean array over the points still iterated.
+        """
+        self.alive = self.alive[still_alive]
+        self.c_real, self.c_imag = self.c_real[still_alive], self.c_imag[still_alive]
+        self.z_real, self.z_imag = self.z_real[still_alive], self.z_imag[still_alive]
+        self.saved_real, self.saved_imag = self.saved_real[still_alive], self.saved_imag[still_alive]
+
+    def iterate(self, max_iterations) -> int:
+        """
+        PURPOSE: Continue the iteration up to a new iteration limit.
+
+        PARAMETERS: max_iterations is the new limit, at least self.limit.
+
+        MODIFIES: self.counts (points that have not escaped get max_iterations), the working
+                  arrays, self.limit.
+
+        EFFECTS: Iterates all points that have not escaped yet together. Escaped points
+                 are dropped from the working arrays so later iterations only touch the
+                 live pixels. The real and imaginary parts are kept in separate float
+                 arrays and combined in the same order as Python's complex arithmetic,
+                 since NumPy's complex multiply may fuse operations and round differently.
+                 When INTERIOR_SHORTCUTS is on, points whose orbit comes back to a saved z
+                 are dropped as interior, as in get_escape_count.
+                 Counts the pixels and iterations done for the render being recorded, if any.
+
+        RETURNS: The number of points that escaped during this call.
+        """
+        if is_selected("numba"):
+            return self.iterate_compiled(max_iterations)
+        timer = time.perf_counter()
+        counts = self.counts
+        escaped_count = 0
+        started = self.alive.size if self.limit == 0 else 0 # points this state starts iterating
+        steps = 0 # z updates done, for instrumentation
+        for n in range(self.limit, max_iterations):
+            if self.alive.size == 0:
+                break
+            steps += self.alive.size
+            magnitude = np.hypot(self.z_real, self.z_imag)
+            escaped = magnitude > 2
+            if escaped.any():
+                counts[self.alive[escaped]] = n
+                escaped_count += int(escaped.sum())
+                if self.magnitudes is not None:
+                    self.magnitudes.reshape(-1)[self.alive[escaped]] = magnitude[escaped]
+                self.keep(~escaped)
+            z_real, z_imag = self.z_real, self.z_imag
+            # z = z ** 2 + c, i.e. (a*a - b*b, a*b + b*a) + c
+            self.z_real, self.z_imag = (z_real * z_real - z_imag * z_imag) + self.c_real, \
+                                       (z_real * z_imag + z_imag * z_real) + self.c_imag
+
+            if INTERIOR_SHORTCUTS:
+                distance_real, distance_imag = self.z_real - self.saved_real, self.z_imag - self.saved_imag
+                periodic = distance_real * distance_real + distance_imag * distance_imag < PERIODICITY_TOLERANCE ** 2
+                if periodic.any():
+                    self.interior = np.concatenate((self.interior, self.alive[periodic]))
+                    self.keep(~periodic)
+                if n + 1 == self.next_save:
+                    self.saved_real, self.saved_imag = self.z_real.copy(), self.z_imag.copy()
+                    self.next_save *= 2
+
+        self.limit = max(self.limit, max_iterations)
+        counts[self.alive] = self.limit
+        counts[self.interior] = self.limit
+        add_stage_time("iterations", time.perf_counter() - timer)
+        count_stat("iterated_pixels", started)
+        count_stat("iterations", steps)
+        return escaped_count
+
+    def iterate_compiled(self, max_iterations) -> int:
+        """
+        PURPOSE: iterate, with the compiled loop of the numba backend (backends.iterate_points),
+                 which runs every point to its escape instead of all points in lockstep.
+                 The results are the same.
+        """
+        timer = time.perf_counter()
+        started = self.alive.size if self.limit == 0 else 0
+        counts = np.empty(self.alive.size, dtype=np.int32)
+        magnitudes = np.zeros(self.alive.size) if self.magnitudes is not None else np.empty(0)
+        status = np.empty(self.alive.size, dtype=np.uint8)
+        iterated, steps = iterate_points_jit(self.c_real, self.c_imag, self.z_real, self.z_imag, self.saved_real,
+                                             self.saved_imag, self.limit, max_iterations, self.next_save, counts,
+                                             magnitudes, status, False, INTERIOR_SHORTCUTS, PERIODICITY_TOLERANCE ** 2)
+        escaped = status == 0
+        self.counts[self.alive[escaped]] = counts[escaped]
+        if self.magnitudes is not None:
+            self.magnitudes.reshape(-1)[self.alive[escaped]] = magnitudes[escaped]
+        self.interior = np.concatenate((self.interior, self.alive[status == 2]))
+        self.keep(status == 1)
+        if INTERIOR_SHORTCUTS:
+            while self.next_save <= max_iterations:
+                self.next_save *= 2
+        self.limit = max(self.limit, max_iterations)
+        self.counts[self.alive] = self.limit
+        self.counts[self.interior] = self.limit
+        add_stage_time("iterations", time.perf_counter() - timer)
+        count_stat("iterated_pixels", started)
+        count_stat("iterations", steps)
+        return int(escaped.sum())
+
+
+def merge_escape_states(parts, counts) -> EscapeState:
+    """
+    PURPOSE: Combine the states of the pieces of a frame, iterated to the same limit, into
+             one state of the whole frame, to resume them all together.
+
+    PARAMETERS: parts is a list of tuples (pixels, state): pixels holds the flat indices in the
+                frame of the points of the state. The pieces do not overlap.
+                counts is the escape-count array of the whole frame (it is copied).
+
+    RETURNS: An EscapeState over the flat frame that continues the points the parts still iterate.
+    """
+    state = EscapeState(np.empty(0, dtype=complex), counts=counts)
+    state.alive = np.concatenate([pixels[part.alive] for pixels, part in parts])
+    state.interior = np.concatenate([pixels[part.interior] for pixels, part in parts])
+    for name in ("c_real", "c_imag", "z_real", "z_imag", "saved_real", "saved_imag"):
+        setattr(state, name, np.concatenate([getattr(part, name) for _, part in parts]))
+    state.limit = max(part.limit for _, part in parts)
+    # pieces whose points all escaped stopped advancing their save schedule
+    state.next_save = max(part.next_save for _, part in parts)
+    return state
+
+
+def compute_iterations(domain, my_range, frame_size, max_iterations, rect=None) -> np.ndarray:
+    """
+    PURPOSE: Compute the escape counts of a viewport (or of a block of it).
+
+    PARAMETERS: domain, my_range, frame_size and rect are as in get_complex_grid.
+                max_iterations is a positive integer.
+
+    RETURNS: An int32 array of shape (width, height) with the escape count of every pixel.
+
+    EFFECTS: Rows mirroring others across the real axis are copied instead (see get_mirror).
+    """
+    mirror = get_mirror(my_range, frame_size, rect)
+    if mirror is not None:
+        return mirror_block(compute_iterations(domain, my_range, frame_size, max_iterations, mirror[0]), mirror)
+    return compute_escape_counts(get_complex_grid(domain, my_range, frame_size, rect), max_iterations)
+
+
+def compute_iterations_smooth(domain, my_range, frame_size, max_iterations, rect=None) -> np.ndarray:
+    """
+    PURPOSE: Compute the fractional escape counts of a viewport (or of a block of it).
+
+    PARAMETERS: domain, my_range, frame_size and rect are as in get_complex_grid.
+                max_iterations is a positive integer.
+
+    RETURNS: A float array of shape (width, height) from get_smooth_iterations.
+
+    EFFECTS: Rows mirroring others across the real axis are copied instead (see get_mirror).
+    """
+    mirror = get_mirror(my_range, frame_size, rect)
+    if mirror is not None:
+        return mirror_block(compute_iterations_smooth(domain, my_range, frame_size, max_iterations, mirror[0]),
+                            mirror)
+    c_grid = get_complex_grid(domain, my_range, frame_size, rect)
+    magnitudes = np.zeros(c_grid.shape)
+    iterations = compute_escape_counts(c_grid, max_iterations, magnitudes)
+    return get_smooth_iterations(iterations, magnitudes, max_iterations)
+
+
+def compute_iterations_strategy(domain, my_range, frame_size, max_iterations, rect=None, strategy=None) -> tuple:
+    """
+    PURPOSE: Compute the escape counts of a viewport (or of a block of it) with the chosen strategy.
+
+    PARAMETERS: domain, my_range, frame_size and rect are as in get_complex_grid.
+                max_iterations is a positive integer.
+                strategy is "full" or "mariani_silver" (defaults to RENDER_STRATEGY).
+
+    RETURNS: A tuple (iterations, iterated) where iterations is an array of shape (width, height)
+             and iterated is the number of pixels whose escape count was actually computed.
+    """
+    strategy = RENDER_STRATEGY if strategy is None else strategy
+    if strategy == "full":
+        iterations = compute_iterations(domain, my_range, frame_size, max_iterations, rect)
+        return iterations, iterations.size
+    if strategy == "mariani_silver":
+        return compute_iterations_mariani_silver(domain, my_range, frame_size, max_iterations, rect)
+    raise ValueError(f"Unknown render strategy: {strategy}")
+
+
+def get_border(x, y, width, height) -> tuple:
+    """
+    PURPOSE: List the pixels on the border of a rectangle.
+
+    PARAMETERS: x, y, width, height are integers describing the rectangle.
+
+    RETURNS: A tuple (xs, ys) of integer NumPy arrays with the coordinates of the border pixels.
+    """
+    right, bottom = x + width - 1, y + height - 1
+    columns = np.arange(x, x + width)
+    rows = np.arange(y + 1, bottom)
+    xs = np.concatenate((columns, columns, np.full(rows.size, x), np.full(rows.size, right)))
+    ys = np.concatenate((np.full(width, y), np.full(width, bottom), rows, rows))
+    return xs, ys
+
+
+def compute_iterations_mariani_silver(domain, my_range, frame_size, max_iterations, rect=None) -> tuple:
+    """
+    PURPOSE: Compute the escape counts of a viewport with Mariani-Silver subdivision.
+
+    PARAMETERS: domain, my_range, frame_size and rect are as in get_complex_grid.
+                max_iterations is a positive integer.
+
+    RETURNS: A tuple (iterations, iterated) as in compute_iterations_strategy.
+
+    EFFECTS: Computes only the border of each rectangle. If every border pixel has the same
+             escape count the interior is filled with it, otherwise the rectangle is split in
+             four (the halves share their middle row and column) and the process repeats.
+             Rectangles of at most MARIANI_SILVER_MIN_SIZE pixels per side are iterated fully.
+             All rectangles of one level are computed in a single batch.
+             Like every border-tracing method this assumes the set is connected, so detail
+             that lies entirely inside a uniform border (e.g. sub-pixel minibrots) can be missed.
+             Rows mirroring others across the real axis are copied instead (see get_mirror).
+    """
+    mirror = get_mirror(my_range, frame_size, rect)
+    if mirror is not None:
+        iterations, iterated = compute_iterations_mariani_silver(domain, my_range, frame_size, max_iterations,
+                                                                 mirror[0])
+        return mirror_block(iterations, mirror), iterated
+    frame_width, frame_height = frame_size
+    x0, y0, width, height = rect if rect is not None else (0, 0, frame_width, frame_height)
+    iterations = np.zeros((width, height), dtype=np.int32)
+    known = np.zeros((width, height), dtype=bool)
+    iterated = 0
+
+    def compute_pixels(xs, ys):
+        nonlocal iterated
+        index = np.unique(xs * height + ys)
+        index = index[~known.ravel()[index]]
+        xs, ys = index // height, index % height
+        points = get_complex_points(domain, my_range, frame_size, xs + x0, ys + y0)
+        iterations[xs, ys] = compute_escape_counts(points, max_iterations)
+        known[xs, ys] = True
+        iterated += index.size
+
+    rects = [(0, 0, width, height)]
+    while rects:
+        borders = [get_border(*r) for r in rects]
+        compute_pixels(np.concatenate([xs for xs, ys in borders]), np.concatenate([ys for xs, ys in borders]))
+
+        next_rects = []
+        small = []
+        for (x, y, w, h), (xs, ys) in zip(rects, borders):
+            values = iterations[xs, ys]
+            if w <= 2 or h <= 2:
+                continue
+            if (values == values[0]).all():
+                iterations[x + 1:x + w - 1, y + 1:y + h - 1] = values[0]
+                known[x + 1:x + w - 1, y + 1:y + h - 1] = True
+            elif w <= MARIANI_SILVER_MIN_SIZE or h <= MARIANI_SILVER_MIN_SIZE:
+                small.append((x + 1, y + 1, w - 2, h - 2))
+            else:
+                half_w, half_h = w // 2, h // 2
+                next_rects += [(x, y, half_w + 1, half_h + 1), (x + half_w, y, w - half_w, half_h + 1),
+                               (x, y + half_h, half_w + 1, h - half_h), (x + half_w, y + half_h, w - half_w, h - half_h)]
+
+        if small:
+            grids = [np.mgrid[x:x + w, y:y + h].reshape(2, -1) for x, y, w, h in small]
+            compute_pixels(np.concatenate([g[0] for g in grids]), np.concatenate([g[1] for g in grids]))
+        rects = next_rects
+
+    return iterations, iterated
+
+
+def get_tiles(frame_size, tile_size) -> list:
+    """
+    PURPOSE: Split a frame into square tiles.
+
+    PARAMETERS: frame_size is a tuple (width, height) in pixels.
+                tile_size is a positive integer.
+
+    RETURNS: A list of rects (x, y, width, height) covering the frame. Tiles on the
+             right and bottom edges are cropped to the frame.
+    """
+    frame_width, frame_height = frame_size
+    return [(x, y, min(tile_size, frame_width - x), min(tile_size, frame_height - y))
+            for y in range(0, frame_height, tile_size)
+            for x in range(0, frame_width, tile_size)]
+
+
+def get_iteration_dtype(max_iterations):
+    """
+    PURPOSE: Smallest unsigned integer type that can hold escape counts up to max_iterations.
+    """
+    return np.uint16 if max_iterations <= np.iinfo(np.uint16).max else np.uint32
+
+
+def compute_tile(domain, my_range, frame_size, rect, max_iterations, strategy=None) -> tuple:
+    """
+    PURPOSE: Compute the escape counts of one tile. Runs inside the worker processes.
+
+    PARAMETERS: domain, my_range, frame_size and rect describe the tile as in get_complex_grid.
+                max_iterations is a positive integer.
+                strategy is as in compute_iterations_strategy.
+
+    RETURNS: A tuple (rect, iterations, iterated, work) where iterations is a compact unsigned
+             integer array of shape (width, height), iterated is the number of pixels whose
+             escape count was computed, and work is a tuple (iterated, steps) of the points the
+             escape-count kernel iterated (leaving out those the cardioid test skipped) and of
+             its z updates, for the render stats of the parent process.
+    """
+    with StatsCollector() as stats:
+        iterations, iterated = compute_iterations_strategy(domain, my_range, frame_size, max_iterations, rect,
+                                                           strategy)
+    work = (stats.counters.get("iterated_pixels", 0), stats.counters.get("iterations", 0))
+    return rect, iterations.astype(get_iteration_dtype(max_iterations)), iterated, work
+
+
+def get_process_pool(workers) -> ProcessPoolExecutor:
+    """
+    PURPOSE: Return the shared render process pool, creating it on first use.
+
+    PARAMETERS: workers is the number of processes the pool should have.
+
+    MODIFIES: process_pool, process_pool_workers (global variables).
+
+    EFFECTS: Reuses the existing pool when it has the requested size so worker
+             processes are only started once per session. The workers compute with
+             the backend selected in this process.
+    """
+    global process_pool, process_pool_workers
+    if process_pool is None or process_pool_workers != workers:
+        shutdown_process_pool()
+        process_pool = ProcessPoolExecutor(max_workers=workers, initializer=select_backend,
+                                           initargs=(get_backend().name,))
+        process_pool_workers = workers
+    return process_pool
+
+
+def shutdown_process_pool():
+    """
+    PURPOSE: Stop the render process pool if it is running.
+
+    MODIFIES: process_pool, process_pool_workers (global variables).
+    """
+    global process_pool, process_pool_workers
+    if process_pool is not None:
+        process_pool.shutdown(cancel_futures=True)
+        process_pool = None
+        process_pool_workers = 0
+
+
+def compute_iterations_tiled(domain, my_range, frame_size, max_iterations,
+                             workers=None, tile_size=None, strategy=None) -> tuple:
+    """
+    PURPOSE: Compute the escape counts of a viewport on a pool of worker processes.
+
+    PARAMETERS: domain, my_range, frame_size are as in get_complex_grid.
+                max_iterations is a positive integer.
+                workers is the number of processes (defaults to RENDER_WORKERS).
+                tile_size is the side of the tiles in pixels (defaults to TILE_SIZE).
+                strategy is as in compute_iterations_strategy.
+
+    RETURNS: A tuple (iterations, iterated) where iterations is an array of shape frame_size
+             with the escape count of every pixel and iterated is the number of pixels
+             actually iterated.
+
+    EFFECTS: Tiles found in the tile store are copied from it. The others are submitted
+             up front; the pool hands the next tile to whichever worker becomes free,
+             so cheap exterior tiles and expensive interior tiles balance out. Tiles are
+             copied into the frame, and saved to the tile store, as they complete.
+             When the viewport crosses the real axis, only the tiles of the rows computed
+             by get_mirror are rendered and the mirrored rows are copied at the end.
+             The iterated points and iterations of the workers are added to the render in
+             progress here, as they complete.
+    """
+    workers = RENDER_WORKERS if workers is None else workers
+    tile_size = TILE_SIZE if tile_size is None else tile_size
+    kind = strategy or RENDER_STRATEGY
+    store = get_tile_store()
+    pool = get_process_pool(workers)
+
+    iterations = np.empty(frame_size, dtype=get_iteration_dtype(max_iterations))
+    iterated = 0
+    futures = []
+    mirror = get_mirror(my_range, frame_size)
+    for rect in get_tiles(frame_size, tile_size):
+        if mirror is not None:
+            rect = clip_rows(rect, mirror[0])
+            if rect is None:
+                continue
+        x, y, width, height = rect
+        stored = store and store.get(get_float_tile_key(domain, my_range, frame_size, rect, max_iterations, kind))
+        if stored:
+            iterations[x:x + width, y:y + height] = stored[0]
+        else:
+            futures.append(pool.submit(compute_tile, domain, my_range, frame_size, rect, max_iterations, strategy))
+    for future in as_completed(futures):
+        rect, tile, tile_iterated, (points, steps) = future.result()
+        x, y, width, height = rect
+        iterations[x:x + width, y:y + height] = tile
+        iterated += tile_iterated
+        count_stat("iterated_pixels", points)
+        count_stat("iterations", steps)
+        if store:
+            store.put(get_float_tile_key(domain, my_range, frame_size, rect, max_iterations, kind), tile, max_iterations)
+    if mirror is not None:
+        computed, offset, targets, sources = mirror
+        iterations[:, targets] = iterations[:, sources]
+    return iterations, iterated
+
+
+def clip_rows(rect, rows):
+    """
+    PURPOSE: Restrict a tile to the rows of another rectangle.
+
+    PARAMETERS: rect and rows are tuples (x, y, width, height); only the rows of rows are used.
+
+    RETURNS: The tile's part within those rows, or None if there is none.
+    """
+    x, y, width, height = rect
+    top, bottom = max(y, rows[1]), min(y + height, rows[1] + rows[3])
+    if bottom <= top:
+        return None
+    return x, top, width, bottom - top
+
+
+def color_iterations_mandelbrot(iterations, max_iterations) -> np.ndarray:
+    """
+    PURPOSE: Color a whole buffer of escape counts with the current palette,
+             giving the same colors as get_color_mandelbrot.
+
+    PARAMETERS: iterations is a NumPy array of escape counts in [0, max_iterations]:
+                integers, or floats from get_smooth_iterations for smooth coloring.
+                max_iterations is a positive integer.
+
+    RETURNS: A uint8 array of shape iterations.shape + (3,) holding RGB colors.
+    """
+    if np.issubdtype(iterations.dtype, np.floating):
+        return color_smooth_iterations(iterations, max_iterations)
+    return color_iterations(iterations, max_iterations)
+
+
+def blit_iterations(screen, iterations, max_iterations, position=(0, 0), samples=None):
+    """
+    PURPOSE: Color a buffer of escape counts and copy it onto the screen.
+
+    PARAMETERS: screen is a valid pygame Surface object.
+                iterations is an integer array of shape (width, height).
+                max_iterations is a positive integer.
+                position is the (x, y) pixel where the top-left corner of the buffer goes.
+                samples optionally holds sub-samples of some pixels (see supersample_edges),
+                which are then colored with the average color of their sub-samples.
+
+    MODIFIES: screen (its pixel buffer is updated).
+
+    EFFECTS: Writes the whole frame with one pygame.surfarray call when the buffer
+             covers the screen, otherwise blits it as a block at position.
+    """
+    with render_stage("coloring"):
+        rgb = color_iterations_mandelbrot(iterations, max_iterations)
+        if samples is not None:
+            color_supersampled(rgb, samples, max_iterations)
+    with render_stage("pixel writes"):
+        if position == (0, 0) and iterations.shape == screen.get_size():
+            pygame.surfarray.blit_array(screen, rgb)
+        else:
+            screen.blit(pygame.surfarray.make_surface(rgb), position)
+
+
+def get_edge_contrast(iterations) -> np.ndarray:
+    """
+    PURPOSE: Measure how sharply every pixel's escape count differs from its neighbours'.
+
+    PARAMETERS: iterations is an array of escape counts of shape (width, height).
+
+    RETURNS: A float32 array of the same shape holding, for every pixel, the largest absolute
+             difference between its escape count and that of its 8 neighbours.
+    """
+    values = np.asarray(iterations, dtype=np.float32)
+    width, height = values.shape
+    padded = np.pad(values, 1, mode="edge")
+    contrast = np.zeros_like(values)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbour = padded[1 + dx:1 + dx + width, 1 + dy:1 + dy + height]
+            np.maximum(contrast, np.abs(neighbour - values), out=contrast)
+    return contrast
+
+
+def get_edge_pixels(iterations, max_iterations, budget=None) -> tuple:
+    """
+    PURPOSE: Choose the pixels to supersample.
+
+    PARAMETERS: iterations is an array of escape counts of shape (width, height).
+                max_iterations is the iteration limit it was computed with.
+                budget is the most sub-samples to take (defaults to AA_SAMPLE_BUDGET).
+
+    RETURNS: A tuple (xs, ys) of integer arrays: the pixels whose escape count differs from
+             a neighbour's by more than AA_EDGE_THRESHOLD of max_iterations (and by more
+             than one), at most budget // AA_SAMPLES of them, the sharpest edges first.
+    """
+    budget = AA_SAMPLE_BUDGET if budget is None else budget
+    contrast = get_edge_contrast(iterations).ravel()
+    edges = np.flatnonzero(contrast > max(1, AA_EDGE_THRESHOLD * max_iterations))
+    most = budget // AA_SAMPLES
+    if edges.size > most:
+        sharpest = np.argsort(contrast[edges], kind="stable")[edges.size - most:]
+        edges = edges[sharpest]
+    return np.unravel_index(np.sort(edges), np.shape(iterations))
+
+
+def get_subsample_offsets(count, rng) -> tuple:
+    """
+    PURPOSE: Jittered sub-sample positions for count pixels.
+
+    PARAMETERS: count is the number of pixels.
+                rng is a numpy.random.Generator.
+
+    RETURNS: A tuple (dx, dy) of float arrays of shape (count, AA_SAMPLES) in [-0.5, 0.5):
+             the pixel is split in a grid of AA_SAMPLES cells and every sub-sample lies at
+             a random position of its own cell (stratified sampling).
+    """
+    side = int(np.sqrt(AA_SAMPLES))
+    cells = np.arange(side * side)
+    dx = (cells % side + rng.random((count, side * side))) / side - 0.5
+    dy = (cells // side + rng.random((count, side * side))) / side - 0.5
+    return dx, dy
+
+
+def supersample_pixels(compute_pixels, xs, ys, rng=None) -> np.ndarray:
+    """
+    PURPOSE: Compute jittered sub-samples of some pixels.
+
+    PARAMETERS: compute_pixels maps fractional pixel coordinate arrays to escape counts
+                (see get_float_pixel_kernel and get_pixel_kernel).
+                xs, ys are integer arrays of pixel coordinates.
+                rng is an optional numpy.random.Generator (defaults to one seeded with AA_SEED).
+
+    RETURNS: An array of shape (len(xs), AA_SAMPLES) with the escape counts of the sub-samples.
+    """
+    rng = np.random.default_rng(AA_SEED) if rng is None else rng
+    dx, dy = get_subsample_offsets(len(xs), rng)
+    return compute_pixels(xs[:, np.newaxis] + dx, ys[:, np.newaxis] + dy)
+
+
+def supersample_edges(compute_pixels, iterations, max_iterations, budget=None) -> tuple:
+    """
+    PURPOSE: Adaptive anti-aliasing: supersample only the pixels on sharp edges of a frame.
+
+    PARAMETERS: compute_pixels is as in supersample_pixels.
+                iterations is the frame's array of escape counts, of shape (width, height).
+                max_iterations is the iteration limit it was computed with.
+                budget is the most sub-samples to take (defaults to AA_SAMPLE_BUDGET).
+
+    RETURNS: A tuple (xs, ys, values) for blit_iterations: the supersampled pixels
+             (see get_edge_pixels) and the escape counts of their sub-samples.
+    """
+    xs, ys = get_edge_pixels(iterations, max_iterations, budget)
+    count_stat("frame_pixels", np.size(iterations))
+    count_stat("supersampled_pixels", xs.size)
+    return xs, ys, supersample_pixels(compute_pixels, xs, ys)
+
+
+def color_supersampled(rgb, samples, max_iterations):
+    """
+    PURPOSE: Color the supersampled pixels of a frame with the average color of their sub-samples.
+
+    PARAMETERS: rgb is the frame's uint8 array of shape (width, height, 3).
+                samples is a tuple (xs, ys, values) from supersample_edges.
+                max_iterations is a positive integer.
+
+    MODIFIES: rgb.
+    """
+    xs, ys, values = samples
+    if xs.size:
+        rgb[xs, ys] = np.rint(color_iterations_mandelbrot(values, max_iterations).mean(axis=1)).astype(np.uint8)
+
 
 def color_pixels_mandelbrot(complex_num, num_iterations, screen):
     """
@@ -73,9 +1063,7 @@ def get_color_mandelbrot(n, max_iterations):
     """
     if n == max_iterations:
         return COLOR_BLACK  # black for inside
-    hue = n / max_iterations
-    r, g, b = colorsys.hsv_to_rgb(hue, 1, 1)
-    return int(r*255), int(g*255), int(b*255)
+    return get_palette_color(n / max_iterations)
 
 
 def zoom_in(screen, mouse_pos):
@@ -101,20 +1089,101 @@ def set_viewport(mouse_pos):
 
     PARAMETERS: mouse_pos is a tuple (x, y) of integers.
 
-    MODIFIES: DOMAIN, RANGE (global variables).
+    MODIFIES: DOMAIN, RANGE, CENTER, SIZE (global variables).
 
-    EFFECTS: Computes new DOMAIN and RANGE based on the zoom factor.
+    EFFECTS: Computes the new high-precision CENTER and SIZE based on the zoom factor,
+             and DOMAIN and RANGE from them.
              Updates X_PIXEL_WEIGHT and Y_PIXEL_WEIGHT via recompute_weights().
     """
-    global DOMAIN, RANGE
+    center, size = compute_precise_viewport(mouse_pos)
+    set_precise_viewport(center, size)
 
-    my_domain, my_range = compute_range_domain(mouse_pos)
+
+def set_domain_range(my_domain, my_range):
+    """
+    PURPOSE: Set the DOMAIN and RANGE globals to a given viewport.
+
+    PARAMETERS: my_domain, my_range are tuples of floats (the viewport's x and y limits).
+
+    MODIFIES: DOMAIN, RANGE, CENTER, SIZE, X_PIXEL_WEIGHT, Y_PIXEL_WEIGHT (global variables).
+    """
+    global DOMAIN, RANGE, CENTER, SIZE
 
     DOMAIN = my_domain
     RANGE = my_range
+    x1, x2 = Decimal(my_domain[0]), Decimal(my_domain[1])
+    y1, y2 = Decimal(my_range[0]), Decimal(my_range[1])
+    with localcontext() as context:
+        context.prec = 60 # enough to represent the sums of two floats exactly
+        CENTER = ((x1 + x2) / 2, (y1 + y2) / 2)
+        SIZE = (x2 - x1, y2 - y1)
+
+    recompute_weights()
+
+
+def set_precise_viewport(center, size):
+    """
+    PURPOSE: Set the viewport from a high-precision center and size.
+
+    PARAMETERS: center is a tuple (x, y) of Decimals.
+                size is a tuple (width, height) of Decimals.
+
+    MODIFIES: CENTER, SIZE, DOMAIN, RANGE, X_PIXEL_WEIGHT, Y_PIXEL_WEIGHT (global variables).
+
+    EFFECTS: DOMAIN and RANGE are the float approximations of the precise viewport.
+    """
+    global DOMAIN, RANGE, CENTER, SIZE
+
+    CENTER = center
+    SIZE = size
+    DOMAIN, RANGE = get_domain_range(center, size)
 
     recompute_weights()
 
+
+def get_domain_range(center, size) -> tuple:
+    """
+    PURPOSE: Convert a high-precision viewport to float DOMAIN and RANGE tuples.
+
+    PARAMETERS: center is a tuple (x, y) of Decimals.
+                size is a tuple (width, height) of Decimals.
+
+    RETURNS: A tuple (domain, range), each a tuple of floats.
+    """
+    with localcontext() as context:
+        context.prec = get_precision(size)
+        return ((float(center[0] - size[0] / 2), float(center[0] + size[0] / 2)),
+                (float(center[1] - size[1] / 2), float(center[1] + size[1] / 2)))
+
+
+def get_precision(size) -> int:
+    """
+    PURPOSE: Number of decimal digits needed to do exact-enough arithmetic on a viewport.
+
+    PARAMETERS: size is a tuple (width, height) of Decimals.
+
+    RETURNS: The digits needed to resolve a pixel of the viewport, plus EXTRA_DIGITS.
+    """
+    return max(28, -min(size).adjusted() + EXTRA_DIGITS)
+
+
+def compute_precise_viewport(mouse_pos) -> tuple:
+    """
+    PURPOSE: High-precision version of compute_range_domain.
+
+    PARAMETERS: mouse_pos is a tuple (x, y) of integers.
+
+    RETURNS: A tuple (center, size) of Decimal pairs describing the zoomed viewport.
+    """
+    with localcontext() as context:
+        context.prec = get_precision(SIZE) + 2
+        x_weight, y_weight = SIZE[0] / WIDTH, SIZE[1] / HEIGHT
+        center = (CENTER[0] + (mouse_pos[0] - Decimal(WIDTH) / 2) * x_weight,
+                  CENTER[1] - (mouse_pos[1] - Decimal(HEIGHT) / 2) * y_weight)
+        zoom = Decimal(str(ZOOM_IN_FACTOR))
+        size = (SIZE[0] * zoom, SIZE[1] * zoom)
+    return center, size
+
 def compute_range_domain(mouse_pos) -> tuple:
     """
     PURPOSE: Compute the new DOMAIN and RANGE for a zoom centered at mouse_pos.
@@ -124,20 +1193,7 @@ def compute_range_domain(mouse_pos) -> tuple:
     RETURNS: A tuple (new_domain, new_range), each a tuple of floats representing
              the x-axis and y-axis limits of the zoomed viewport.
     """
-    my_domain = DOMAIN
-    my_range = RANGE
-
-    x1, x2 = my_domain
-    y1, y2 = my_range
-    new_x_length = abs(x1 - x2) * ZOOM_IN_FACTOR
-    new_y_length = abs(y1 - y2) * ZOOM_IN_FACTOR
-
-    cx, cy = pixel_to_complex(mouse_pos).real, pixel_to_complex(mouse_pos).imag
-
-    new_x1, new_x2 = cx - (new_x_length / 2), cx + (new_x_length / 2)
-    new_y1, new_y2 = cy - (new_y_length / 2), cy + (new_y_length / 2)
-
-    return (new_x1, new_x2), (new_y1, new_y2)
+    return get_domain_range(*compute_precise_viewport(mouse_pos))
 
 def recompute_weights():
     """
@@ -154,6 +1210,44 @@ def recompute_weights():
     X_PIXEL_WEIGHT = (DOMAIN[1] - DOMAIN[0]) / WIDTH
     Y_PIXEL_WEIGHT = (RANGE[1]  - RANGE[0])  / HEIGHT
 
+def get_viewport() -> tuple:
+    """
+    PURPOSE: Returns the current viewport as a tuple (DOMAIN, RANGE)
+    """
+    return DOMAIN, RANGE
+
+
+def get_precise_viewport() -> tuple:
+    """
+    PURPOSE: Returns the current high-precision viewport as a tuple (CENTER, SIZE)
+    """
+    return CENTER, SIZE
+
+
+def set_max_iterations(max_iterations):
+    """
+    PURPOSE: Set the iteration limit MAX_ITERATIONS used to render and color the Mandelbrot set.
+
+    MODIFIES: MAX_ITERATIONS (global variable).
+    """
+    global MAX_ITERATIONS
+    MAX_ITERATIONS = max_iterations
+
+
+def get_max_iterations() -> int:
+    """
+    PURPOSE: Returns the current iteration limit MAX_ITERATIONS
+    """
+    return MAX_ITERATIONS
+
+
+def get_iterated_pixels() -> int:
+    """
+    PURPOSE: Returns how many pixels the last generate_mandelbrot actually iterated
+    """
+    return iterated_pixels
+
+
 def get_top_left_complex() -> tuple:
     """
     PURPOSE: Returns top-left corner in the complex plane
@@ -0,0 +1,221 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from utils import COLOR_BLACK
+
+SMOOTH_STEPS = 16 # entries per escape count in the smooth-coloring lookup table
+PALETTE_TABLE_CACHE_SIZE = 8 # lookup tables kept, e.g. every palette at the current limit, plain and smooth
+
+
+def hsv_to_rgb(h, s, v) -> tuple:
+    """
+    PURPOSE: colorsys.hsv_to_rgb for NumPy arrays as well as numbers, with the same arithmetic
+             so that the colors are identical.
+
+    PARAMETERS: h, s, v are floats in [0, 1] or arrays of them (broadcast together).
+
+    RETURNS: A tuple (r, g, b) of floats in [0, 1], or of arrays.
+    """
+    h, s, v = np.broadcast_arrays(*(np.asarray(value, dtype=np.float64) for value in (h, s, v)))
+    sector = np.floor(h * 6.0)
+    f = (h * 6.0) - sector
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    sector = sector.astype(np.intp) % 6
+    r = np.choose(sector, (v, q, p, p, t, v))
+    g = np.choose(sector, (t, v, v, q, p, p))
+    b = np.choose(sector, (p, p, t, v, v, q))
+    gray = s == 0.0
+    return np.where(gray, v, r)[()], np.where(gray, v, g)[()], np.where(gray, v, b)[()]
+
+
+def get_hsv_color(t) -> tuple:
+    """
+    PURPOSE: The original rainbow palette: the hue goes around the color wheel once.
+    """
+    return hsv_to_rgb(t, 1, 1)
+
+
+def get_fire_color(t) -> tuple:
+    """
+    PURPOSE: Black-body style palette going from red through orange and yellow to white.
+    """
+    return np.minimum(1.0, 3 * t), np.minimum(1.0, np.maximum(0.0, 3 * t - 1)), \
+        np.minimum(1.0, np.maximum(0.0, 3 * t - 2))
+
+
+def get_grayscale_color(t) -> tuple:
+    """
+    PURPOSE: Palette going from black to white.
+    """
+    return t, t, t
+
+
+def get_banded_color(t) -> tuple:
+    """
+    PURPOSE: Rainbow palette that goes around the color wheel eight times, showing more bands.
+    """
+    return hsv_to_rgb((8 * t) % 1, 0.8, 1)
+
+
+# Every palette maps t in [0, 1), a number or a NumPy array, to (r, g, b) floats in [0, 1].
+PALETTES = {
+    "hsv": get_hsv_color,
+    "fire": get_fire_color,
+    "grayscale": get_grayscale_color,
+    "banded": get_banded_color,
+}
+palette_name = "hsv" # palette used when no palette is given explicitly
+smooth_coloring = False # whether frames are colored with fractional escape counts
+palette_tables = OrderedDict() # (name, max_iterations, smooth) -> lookup table, least recently used first
+palette_tables_lock = threading.Lock() # render threads and the main thread color frames concurrently
+
+
+def get_palette_name() -> str:
+    """
+    PURPOSE: Returns the name of the current palette
+    """
+    return palette_name
+
+
+def set_palette_name(name):
+    """
+    PURPOSE: Select the current palette.
+
+    PARAMETERS: name is a key of PALETTES.
+
+    MODIFIES: palette_name (global variable).
+    """
+    global palette_name
+    if name not in PALETTES:
+        raise ValueError(f"Unknown palette: {name}")
+    palette_name = name
+
+
+def cycle_palette() -> str:
+    """
+    PURPOSE: Switch to the next palette of PALETTES, wrapping around.
+
+    MODIFIES: palette_name (global variable).
+
+    RETURNS: The name of the new palette.
+    """
+    names = list(PALETTES)
+    set_palette_name(names[(names.index(palette_name) + 1) % len(names)])
+    return palette_name
+
+
+def is_smooth_coloring() -> bool:
+    """
+    PURPOSE: Returns whether smooth (fractional escape count) coloring is on
+    """
+    return smooth_coloring
+
+
+def set_smooth_coloring(smooth):
+    """
+    PURPOSE: Turn smooth (fractional escape count) coloring on or off.
+
+    MODIFIES: smooth_coloring (global variable).
+    """
+    global smooth_coloring
+    smooth_coloring = smooth
+
+
+def get_palette_color(t, name=None) -> tuple:
+    """
+    PURPOSE: Color of a point of a palette.
+
+    PARAMETERS: t is a float in [0, 1), usually escape count / max iterations.
+                name is a key of PALETTES (defaults to the current palette).
+
+    RETURNS: A tuple (R, G, B) of integers 0-255.
+    """
+    r, g, b = PALETTES[name or palette_name](t)
+    return int(r*255), int(g*255), int(b*255)
+
+
+def get_palette_table(max_iterations, name=None, smooth=False) -> np.ndarray:
+    """
+    PURPOSE: Lookup table mapping escape counts to colors, built once per
+             palette and iteration limit.
+
+    PARAMETERS: max_iterations is a positive integer.
+                name is a key of PALETTES (defaults to the current palette).
+                smooth selects the larger table used for fractional escape counts,
+                with SMOOTH_STEPS entries per escape count.
+
+    MODIFIES: palette_tables (the table is cached there, evicting the least recently used
+              table beyond PALETTE_TABLE_CACHE_SIZE, so raising the limit again and again
+              does not keep the tables of the old limits).
+
+    RETURNS: A uint8 array of shape (entries, 3). The last entry is black, for points
+             inside the set. Without smooth, entry n is the color of escape count n.
+
+    EFFECTS: The palette is evaluated on the array of all entries at once; every entry has
+             the color get_palette_color gives it.
+    """
+    name = name or palette_name
+    key = name, max_iterations, smooth
+    with palette_tables_lock:
+        table = palette_tables.get(key)
+        if table is not None:
+            palette_tables.move_to_end(key)
+            return table
+    steps = max_iterations * (SMOOTH_STEPS if smooth else 1)
+    table = np.empty((steps + 1, 3), dtype=np.uint8)
+    rgb = np.broadcast_arrays(*PALETTES[name](np.arange(steps) / steps))
+    table[:-1] = (np.stack(rgb, axis=-1) * 255).astype(np.uint8)
+    table[-1] = COLOR_BLACK
+    with palette_tables_lock:
+        palette_tables[key] = table
+        while len(palette_tables) > PALETTE_TABLE_CACHE_SIZE:
+            palette_tables.popitem(last=False)
+    return table
+
+
+def color_iterations(iterations, max_iterations, name=None) -> np.ndarray:
+    """
+    PURPOSE: Color a whole buffer of escape counts with one lookup.
+
+    PARAMETERS: iterations is an integer NumPy array with values in [0, max_iterations].
+                max_iterations is a positive integer.
+                name is a key of PALETTES (defaults to the current palette).
+
+    RETURNS: A uint8 array of shape iterations.shape + (3,) holding RGB colors.
+    """
+    return get_palette_table(max_iterations, name)[iterations]
+
+
+def get_smooth_iterations(iterations, magnitudes, max_iterations) -> np.ndarray:
+    """
+    PURPOSE: Compute fractional escape counts, which vary continuously across the bands.
+
+    PARAMETERS: iterations is an integer array of escape counts.
+                magnitudes is a float array of the same shape holding |z| at escape.
+                max_iterations is a positive integer.
+
+    RETURNS: A float array with n + 1 - log2(log2(|z|)) for escaped points, clipped to
+             [0, max_iterations), and max_iterations for points inside the set.
+    """
+    inside = iterations >= max_iterations
+    with np.errstate(divide="ignore", invalid="ignore"):
+        smooth = iterations + 1 - np.log2(np.log2(np.maximum(magnitudes, 2.0)))
+    smooth = np.clip(np.nan_to_num(smooth), 0, np.nextafter(max_iterations, 0))
+    return np.where(inside, max_iterations, smooth)
+
+
+def color_smooth_iterations(smooth_iterations, max_iterations, name=None) -> np.ndarray:
+    """
+    PURPOSE: Color a whole buffer of fractional escape counts with one lookup.
+
+    PARAMETERS: smooth_iterations is an array from get_smooth_iterations.
+                max_iterations is a positive integer.
+                name is a key of PALETTES (defaults to the current palette).
+
+    RETURNS: A uint8 array of shape smooth_iterations.shape + (3,) holding RGB colors.
+    """
+    table = get_palette_table(max_iterations, name, smooth=True)
+    index = np.minimum((smooth_iterations * SMOOTH_STEPS).astype(np.intp), table.shape[0] - 1)
+    return table[index]
@@ -0,0 +1,155 @@
+from decimal import Decimal, localcontext
+import numpy as np
+from mandelbrot import *
+
+DEEP_ZOOM_THRESHOLD = 1e-12 # pixel size (relative to the center) below which perturbation is used
+
+
+def is_deep_zoom(center, size, frame_size) -> bool:
+    """
+    PURPOSE: Decide whether a viewport is too deep for plain float64 pixel coordinates.
+
+    PARAMETERS: center is a tuple (x, y) of Decimals.
+                size is a tuple (width, height) of Decimals.
+                frame_size is a tuple (width, height) in pixels.
+
+    RETURNS: True when a pixel is smaller than DEEP_ZOOM_THRESHOLD times the magnitude of
+             the center (or than DEEP_ZOOM_THRESHOLD itself near the origin).
+    """
+    pixel_size = float(min(size[0] / frame_size[0], size[1] / frame_size[1]))
+    magnitude = max(abs(float(center[0])), abs(float(center[1])), 1.0)
+    return pixel_size < DEEP_ZOOM_THRESHOLD * magnitude
+
+
+def compute_reference_orbit(center, max_iterations, precision) -> tuple:
+    """
+    PURPOSE: Iterate the center of the viewport in arbitrary precision.
+
+    PARAMETERS: center is a tuple (x, y) of Decimals.
+                max_iterations is a positive integer.
+                precision is the number of decimal digits to compute with.
+
+    RETURNS: A tuple (orbit_real, orbit_imag) of float64 arrays holding Z_0 = 0, Z_1, ...
+             rounded to float. The orbit stops after the first Z with |Z| > 2, or after
+             max_iterations + 1 values if the center does not escape.
+    """
+    orbit_real, orbit_imag = [], []
+    with localcontext() as context:
+        context.prec = precision
+        c_real, c_imag = +center[0], +center[1]
+        z_real, z_imag = Decimal(0), Decimal(0)
+        for n in range(max_iterations + 1):
+            orbit_real.append(float(z_real))
+            orbit_imag.append(float(z_imag))
+            if z_real * z_real + z_imag * z_imag > 4:
+                break
+            z_real, z_imag = z_real * z_real - z_imag * z_imag + c_real, 2 * z_real * z_imag + c_imag
+    return np.array(orbit_real), np.array(orbit_imag)
+
+
+def compute_perturbation_counts(orbit, dc_real, dc_imag, max_iterations) -> tuple:
+    """
+    PURPOSE: Compute escape counts of points given as float64 offsets from the reference point.
+
+    PARAMETERS: orbit is a tuple (orbit_real, orbit_imag) from compute_reference_orbit.
+                dc_real, dc_imag are float arrays of the same shape with the offsets of
+                the points from the reference point.
+                max_iterations is a positive integer.
+
+    RETURNS: A tuple (counts, rebased) where counts is an int32 array shaped like dc_real
+             and rebased is the number of times a glitch was detected and the orbit rebased.
+
+    EFFECTS: Every point is followed as z = Z_m + d, iterating only the small delta
+             d <- 2 Z_m d + d ** 2 + dc in float64. A glitch is detected when |z| < |d|
+             (the delta has lost the precision it needs) or when the reference orbit has
+             escaped before the point; the point is then rebased onto the start of the
+             reference orbit with d = z, m = 0, which keeps the result accurate.
+    """
+    orbit_real, orbit_imag = orbit
+    last = orbit_real.size - 1
+    counts = np.full(dc_real.size, max_iterations, dtype=np.int32)
+    c_real, c_imag = dc_real.ravel().astype(np.float64), dc_imag.ravel().astype(np.float64)
+    alive = np.arange(c_real.size)
+    d_real, d_imag = np.zeros_like(c_real), np.zeros_like(c_imag)
+    m = np.zeros(c_real.size, dtype=np.intp)
+    rebased = 0
+
+    for n in range(max_iterations):
+        if alive.size == 0:
+            break
+        z_real, z_imag = orbit_real[m] + d_real, orbit_imag[m] + d_imag
+        magnitude = z_real * z_real + z_imag * z_imag
+        escaped = magnitude > 4
+        if escaped.any():
+            counts[alive[escaped]] = n
+            keep = ~escaped
+            alive, m = alive[keep], m[keep]
+            d_real, d_imag, c_real, c_imag = d_real[keep], d_imag[keep], c_real[keep], c_imag[keep]
+            z_real, z_imag, magnitude = z_real[keep], z_imag[keep], magnitude[keep]
+
+        glitched = (magnitude < d_real * d_real + d_imag * d_imag) | (m == last)
+        if glitched.any():
+            d_real[glitched], d_imag[glitched] = z_real[glitched], z_imag[glitched]
+            m[glitched] = 0
+            rebased += int(glitched.sum())
+
+        reference_real, reference_imag = orbit_real[m], orbit_imag[m]
+        d_real, d_imag = (2 * (reference_real * d_real - reference_imag * d_imag)
+                          + (d_real * d_real - d_imag * d_imag) + c_real,
+                          2 * (reference_real * d_imag + reference_imag * d_real)
+                          + 2 * d_real * d_imag + c_imag)
+        m += 1
+
+    return counts.reshape(dc_real.shape), rebased
+
+
+def get_pixel_kernel(center, size, frame_size, max_iterations):
+    """
+    PURPOSE: Build a function computing the escape counts of arbitrary pixels of a viewport,
+             with plain float64 math or with perturbation depending on the zoom depth.
+
+    PARAMETERS: center is a tuple (x, y) of Decimals.
+                size is a tuple (width, height) of Decimals.
+                frame_size is a tuple (width, height) in pixels.
+                max_iterations is a positive integer.
+
+    RETURNS: A function taking integer pixel coordinate arrays (xs, ys) and returning
+             their escape counts. For deep viewports the reference orbit is computed
+             once, here, and shared by every call.
+    """
+    frame_width, frame_height = frame_size
+    if not is_deep_zoom(center, size, frame_size):
+        domain, my_range = get_domain_range(center, size)
+
+        def compute_pixels(xs, ys):
+            return compute_escape_counts(get_complex_points(domain, my_range, frame_size, xs, ys), max_iterations)
+        return compute_pixels
+
+    orbit = compute_reference_orbit(center, max_iterations, get_precision(size))
+    x_weight = float(size[0] / frame_width)
+    y_weight = float(size[1] / frame_height)
+
+    def compute_pixels(xs, ys):
+        with render_stage("mapping"):
+            dc_real = (xs - frame_width / 2) * x_weight
+            dc_imag = (frame_height / 2 - ys) * y_weight
+        with render_stage("iterations"):
+            count_stat("iterated_pixels", xs.size)
+            return compute_perturbation_counts(orbit, dc_real, dc_imag, max_iterations)[0]
+    return compute_pixels
+
+
+def compute_iterations_precise(center, size, frame_size, max_iterations, rect=None) -> np.ndarray:
+    """
+    PURPOSE: Compute the escape counts of a high-precision viewport (or of a block of it).
+
+    PARAMETERS: center, size describe the viewport as in get_pixel_kernel.
+                frame_size is a tuple (width, height) in pixels.
+                max_iterations is a positive integer.
+                rect is an optional tuple (x, y, width, height) as in get_complex_grid.
+
+    RETURNS: An int32 array of shape (width, height) of the rect.
+    """
+    x, y, width, height = rect if rect is not None else (0, 0) + tuple(frame_size)
+    xs, ys = np.mgrid[x:x + width, y:y + height]
+    return get_pixel_kernel(center, size, frame_size, max_iterations)(xs, ys)
@@ -0,0 +1,309 @@
+import time
+import numpy as np
+from mandelbrot import *
+from perturbation import get_pixel_kernel, is_deep_zoom
+
+FRAME_BUDGET = 0.03 # seconds of computation between two display updates
+PREVIEW_SAMPLES = 1500 # at most this many samples are computed for the first preview
+MIN_CHUNK = 256 # smallest number of samples computed between two clock checks
+AA_CHUNK = 1024 # pixels supersampled between two updates of the anti-aliasing job
+
+pixel_kernels = {} # per-process cache of the deep-zoom kernels of compute_pixel_block, keyed by viewport
+
+
+def get_preview_step(frame_size) -> int:
+    """
+    PURPOSE: Choose the block size of the first (coarsest) pass.
+
+    PARAMETERS: frame_size is a tuple (width, height) in pixels.
+
+    RETURNS: The smallest power of two such that the preview needs at most PREVIEW_SAMPLES samples.
+    """
+    frame_width, frame_height = frame_size
+    step = 1
+    while -(-frame_width // step) * -(-frame_height // step) > PREVIEW_SAMPLES:
+        step *= 2
+    return step
+
+
+def get_block_image(iterations, known, step, frame_size) -> np.ndarray:
+    """
+    PURPOSE: Build a full-frame image in which every step x step block shows its sample.
+
+    PARAMETERS: iterations is the frame's escape-count buffer.
+                known is a boolean array telling which samples of iterations are computed.
+                step is the block size of the current pass.
+                frame_size is a tuple (width, height) in pixels.
+
+    RETURNS: An escape-count array of shape frame_size. Samples of the current pass that
+             are not computed yet show the value of their parent block from the previous pass.
+    """
+    frame_width, frame_height = frame_size
+    lattice = iterations[::step, ::step]
+    if not known[::step, ::step].all():
+        parent = iterations[::2 * step, ::2 * step].repeat(2, axis=0).repeat(2, axis=1)
+        parent = parent[:lattice.shape[0], :lattice.shape[1]]
+        lattice = np.where(known[::step, ::step], lattice, parent)
+    return lattice.repeat(step, axis=0).repeat(step, axis=1)[:frame_width, :frame_height]
+
+
+def progressive_passes(domain, my_range, frame_size, max_iterations, frame_budget=FRAME_BUDGET, compute_pixels=None,
+                       mirror=True):
+    """
+    PURPOSE: Compute a viewport coarse-to-fine, one time slice at a time.
+
+    PARAMETERS: domain, my_range, frame_size are as in get_complex_grid.
+                max_iterations is a positive integer.
+                frame_budget is the computation time, in seconds, between two yields.
+                compute_pixels is an optional function mapping pixel coordinate arrays
+                (xs, ys) to escape counts (see get_pixel_kernel). Defaults to plain
+                float64 iteration of the viewport given by domain and my_range, spread over
+                the render process pool (see get_pool_kernel).
+                mirror lets rows that mirror others across the real axis be copied instead
+                of computed (see get_mirror); compute_pixels must then be symmetric about it.
+
+    YIELDS: A tuple (step, image) after every pass and whenever frame_budget runs out
+            in the middle of a pass. image is the current block image (see get_block_image)
+            and step is the block size of the pass in progress. The last yield has step 1
+            and contains the exact escape counts of every pixel.
+
+    EFFECTS: Every pass halves the block size and only computes the lattice points that
+             earlier passes did not already sample. The number of samples computed between
+             two clock checks adapts to the measured speed so each slice fits frame_budget.
+             Samples in mirrored rows are replaced by their mirror image, which is computed
+             instead when not known yet, and copied back after every chunk.
+    """
+    if compute_pixels is None:
+        compute_pixels = get_pool_kernel(domain, my_range, frame_size, max_iterations)
+
+    iterations = np.zeros(frame_size, dtype=np.int32)
+    known = np.zeros(frame_size, dtype=bool)
+    frame_height = frame_size[1]
+    mirror = get_mirror(my_range, frame_size) if mirror else None
+    if mirror is not None:
+        computed, offset, targets, sources = mirror
+        row_sources = np.arange(frame_height) # row computed for every row
+        row_sources[targets] = sources
+    step = get_preview_step(frame_size)
+    chunk = MIN_CHUNK
+    deadline = time.perf_counter() + frame_budget
+
+    while step >= 1:
+        lattice_known = known[::step, ::step]
+        xs, ys = np.nonzero(~lattice_known)
+        xs, ys = xs * step, ys * step
+        if mirror is not None:
+            index = np.unique(xs * frame_height + row_sources[ys])
+            index = index[~known.ravel()[index]]
+            xs, ys = index // frame_height, index % frame_height
+
+        start = 0
+        while start < xs.size:
+            chunk_xs, chunk_ys = xs[start:start + chunk], ys[start:start + chunk]
+            chunk_start = time.perf_counter()
+            iterations[chunk_xs, chunk_ys] = compute_pixels(chunk_xs, chunk_ys)
+            known[chunk_xs, chunk_ys] = True
+            if mirror is not None:
+                iterations[:, targets] = iterations[:, sources]
+                known[:, targets] = known[:, sources]
+            start += chunk
+
+            now = time.perf_counter()
+            rate = chunk_xs.size / max(now - chunk_start, 1e-6)
+            chunk = max(MIN_CHUNK, int(rate * frame_budget))
+            if now >= deadline and start < xs.size:
+                yield step, get_block_image(iterations, known, step, frame_size)
+                deadline = time.perf_counter() + frame_budget
+
+        yield step, get_block_image(iterations, known, step, frame_size)
+        deadline = time.perf_counter() + frame_budget
+        step //= 2
+
+
+def compute_pixel_block(domain, my_range, frame_size, max_iterations, xs, ys, keep_state=False,
+                        viewport=None) -> tuple:
+    """
+    PURPOSE: Compute the escape counts of some pixels of a viewport. Runs inside the worker
+             processes, or in this process for small blocks.
+
+    PARAMETERS: domain, my_range, frame_size are as in get_complex_grid.
+                max_iterations is a positive integer.
+                xs, ys are integer arrays of pixel coordinates.
+                keep_state asks for the EscapeState of the pixels too (float64 viewports only).
+                viewport is a tuple (center, size) of Decimals for deep viewports, which are
+                computed with get_pixel_kernel, or None.
+
+    MODIFIES: pixel_kernels (the reference orbit of a deep viewport is computed once per process).
+
+    RETURNS: A tuple (counts, state, work), state being None unless keep_state, and work a
+             tuple (iterated, steps) of the points iterated and of the z updates done, for the
+             render stats of the calling process.
+    """
+    state = None
+    with StatsCollector() as stats:
+        if viewport is not None:
+            key = (viewport, frame_size, max_iterations)
+            if key not in pixel_kernels:
+                pixel_kernels.clear()
+                pixel_kernels[key] = get_pixel_kernel(*viewport, frame_size, max_iterations)
+            counts = pixel_kernels[key](xs, ys)
+        elif keep_state:
+            state = EscapeState(get_complex_points(domain, my_range, frame_size, xs, ys))
+            state.iterate(max_iterations)
+            counts = state.counts
+        else:
+            counts = compute_escape_counts(get_complex_points(domain, my_range, frame_size, xs, ys), max_iterations)
+    return counts, state, (stats.counters.get("iterated_pixels", 0), stats.counters.get("iterations", 0))
+
+
+def get_pool_kernel(domain, my_range, frame_size, max_iterations, workers=None, states=None, viewport=None):
+    """
+    PURPOSE: Build a pixel kernel for progressive_passes that spreads every call over the
+             render process pool.
+
+    PARAMETERS: domain, my_range, frame_size are as in get_complex_grid.
+                max_iterations is a positive integer.
+                workers is the number of processes (defaults to RENDER_WORKERS).
+                states is an optional list receiving the iteration state of the pixels computed,
+                so the frame can be deepened later (see IterationDeepener).
+                viewport is as in compute_pixel_block.
+
+    MODIFIES: states: every call appends a tuple (pixels, state) per block computed, pixels
+              being the flat indices in the frame of the block's pixels and state their EscapeState.
+
+    RETURNS: A function mapping pixel coordinate arrays (xs, ys) to escape counts.
+
+    EFFECTS: Calls with fewer than MIN_CHUNK pixels per worker are computed in this process,
+             the round trips to the pool costing more than they save. Otherwise worker i gets
+             every workers-th pixel from the i-th, so the cost of interior and exterior regions
+             is shared evenly. The iterated points and iterations of every block are added to
+             the render in progress in this process, whichever process computed them.
+    """
+    workers = RENDER_WORKERS if workers is None else workers
+    keep_state = states is not None
+
+    def compute_pixels(xs, ys):
+        with render_stage("iterations"):
+            if workers < 2 or xs.size < workers * MIN_CHUNK:
+                blocks = [slice(None)]
+                results = [compute_pixel_block(domain, my_range, frame_size, max_iterations, xs, ys, keep_state,
+                                               viewport)]
+            else:
+                pool = get_process_pool(workers)
+                blocks = [slice(i, None, workers) for i in range(workers)]
+                futures = [pool.submit(compute_pixel_block, domain, my_range, frame_size, max_iterations,
+                                       xs[block], ys[block], keep_state, viewport) for block in blocks]
+                results = [future.result() for future in futures]
+        counts = np.empty(xs.size, dtype=np.int32)
+        for block, (block_counts, state, (iterated, steps)) in zip(blocks, results):
+            counts[block] = block_counts
+            count_stat("iterated_pixels", iterated)
+            count_stat("iterations", steps)
+            if keep_state:
+                states.append((xs[block] * frame_size[1] + ys[block], state))
+        return counts
+
+    return compute_pixels
+
+
+def viewport_passes(center, size, frame_size, max_iterations, states=None, workers=None):
+    """
+    PURPOSE: progressive_passes for a high-precision viewport.
+
+    PARAMETERS: center is a tuple (x, y) of Decimals.
+                size is a tuple (width, height) of Decimals.
+                frame_size is a tuple (width, height) in pixels.
+                max_iterations is a positive integer.
+                states is an optional list receiving the iteration state of the pixels
+                computed (see get_pool_kernel). Deep viewports keep none.
+                workers is the number of processes (defaults to RENDER_WORKERS).
+
+    RETURNS: A progressive_passes generator that switches to the perturbation engine
+             when the viewport is too deep for float64 pixel coordinates (without mirroring,
+             as its reference orbit is not symmetric about the real axis).
+    """
+    domain, my_range = get_domain_range(center, size)
+    deep = is_deep_zoom(center, size, frame_size)
+    compute_pixels = get_pool_kernel(domain, my_range, frame_size, max_iterations, workers,
+                                     None if deep else states, (center, size) if deep else None)
+    return progressive_passes(domain, my_range, frame_size, max_iterations, compute_pixels=compute_pixels,
+                              mirror=not deep)
+
+
+def antialias_passes(center, size, frame_size, iterations, max_iterations, budget=None):
+    """
+    PURPOSE: Supersample the edges of a finished frame as a job for RenderWorker.submit_passes.
+
+    PARAMETERS: center, size, frame_size are as in viewport_passes.
+                iterations is the frame's escape-count array.
+                max_iterations is the iteration limit it was computed with.
+                budget is the most sub-samples to take (defaults to AA_SAMPLE_BUDGET).
+
+    YIELDS: A tuple (1, samples) after every AA_CHUNK pixels, samples being the
+            (xs, ys, values) of the pixels supersampled so far (see supersample_edges).
+
+    EFFECTS: Uses the viewport's pixel kernel, so deep zooms are supersampled with perturbation.
+    """
+    compute_pixels = get_pixel_kernel(center, size, frame_size, max_iterations)
+    xs, ys = get_edge_pixels(iterations, max_iterations, budget)
+    count_stat("frame_pixels", frame_size[0] * frame_size[1])
+    rng = np.random.default_rng(AA_SEED)
+    values = np.empty((xs.size, AA_SAMPLES), dtype=np.int32)
+    for start in range(0, xs.size, AA_CHUNK):
+        end = min(start + AA_CHUNK, xs.size)
+        values[start:end] = supersample_pixels(compute_pixels, xs[start:end], ys[start:end], rng)
+        count_stat("supersampled_pixels", end - start)
+        yield 1, (xs[:end], ys[:end], values[:end])
+    if xs.size == 0:
+        yield 1, (xs, ys, values)
+
+
+def render_progressive(screen, domain, my_range, max_iterations, buttons=()):
+    """
+    PURPOSE: Render a viewport on the screen coarse-to-fine, showing every refinement.
+
+    PARAMETERS: screen is a valid pygame Surface object.
+                domain, my_range are tuples of floats (the viewport's x and y limits).
+                max_iterations is a positive integer.
+                buttons is a collection of Button objects drawn on top of every update.
+
+    MODIFIES: screen (its pixel buffer is updated), the pygame display.
+
+    EFFECTS: Blits each update from progressive_passes, redraws the buttons and flips
+             the display, then pumps the event queue so the window stays responsive.
+    """
+    for step, image in progressive_passes(domain, my_range, screen.get_size(), max_iterations):
+        blit_iterations(screen, image, max_iterations)
+        for button in buttons:
+            button.draw(screen)
+        pygame.display.flip()
+        pygame.event.pump()
+
+
+def generate_mandelbrot_progressive(screen, buttons=()):
+    """
+    PURPOSE: Progressive version of generate_mandelbrot for the current viewport.
+
+    PARAMETERS: screen is a valid pygame Surface object.
+                buttons is a collection of Button objects drawn on top of every update.
+
+    MODIFIES: screen, the pygame display.
+    """
+    domain, my_range = get_viewport()
+    render_progressive(screen, domain, my_range, get_max_iterations(), buttons)
+
+
+def zoom_in_progressive(screen, mouse_pos, buttons=()):
+    """
+    PURPOSE: Progressive version of zoom_in.
+
+    PARAMETERS: screen is a valid pygame Surface object.
+                mouse_pos is a tuple (x, y) of integers representing the pixel position.
+                buttons is a collection of Button objects drawn on top of every update.
+
+    MODIFIES: DOMAIN, RANGE (globals of the mandelbrot module), screen, the pygame display.
+
+    EFFECTS: Updates the viewport to zoom in, then renders it coarse-to-fine.
+    """
+    set_viewport(mouse_pos)
+    generate_mandelbrot_progressive(screen, buttons)
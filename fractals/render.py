@@ -0,0 +1,276 @@
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, wait
+from decimal import Decimal
+
+if __package__: # run as python -m fractals.render: the modules import each other by their bare names
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+from mandelbrot import *
+from perturbation import get_pixel_kernel, is_deep_zoom
+from tile_store import get_tile_store, get_tile_key
+from backends import BACKEND, get_backend_names, get_calibration_report
+import tile_store
+
+RENDER_TILE_SIZE = 256 # side of the tiles computed by the headless renderer, in pixels
+TILES_IN_FLIGHT_PER_WORKER = 4 # tiles queued per worker process, to bound memory
+
+pixel_kernels = {} # per-process cache of get_pixel_kernel results, keyed by viewport
+
+
+def render_tile(center, size, frame_size, rect, max_iterations, smooth) -> tuple:
+    """
+    PURPOSE: Compute one tile of a headless render. Runs inside the worker processes.
+
+    PARAMETERS: center, size describe the viewport (see get_precise_viewport).
+                frame_size is a tuple (width, height) of the whole image in pixels.
+                rect is a tuple (x, y, width, height) inside the image.
+                max_iterations is a positive integer.
+                smooth selects fractional escape counts.
+
+    MODIFIES: pixel_kernels (the viewport's kernel, and so its reference orbit for deep
+              zooms, is computed once per process).
+
+    RETURNS: A tuple (rect, iterations), iterations being a compact array of shape
+             (height, width), i.e. stored row by row like the image.
+    """
+    x, y, width, height = rect
+    if smooth:
+        domain, my_range = get_domain_range(center, size)
+        return rect, compute_iterations_smooth(domain, my_range, frame_size, max_iterations, rect).T.astype(np.float32)
+    key = center, size, frame_size, max_iterations
+    if key not in pixel_kernels:
+        pixel_kernels.clear()
+        pixel_kernels[key] = get_pixel_kernel(center, size, frame_size, max_iterations)
+    ys, xs = np.mgrid[y:y + height, x:x + width]
+    return rect, pixel_kernels[key](xs, ys).astype(get_iteration_dtype(max_iterations))
+
+
+def compute_image(iterations, center, size, max_iterations, smooth, workers, tile_size):
+    """
+    PURPOSE: Fill a (memory-mapped) escape-count buffer tile by tile.
+
+    PARAMETERS: iterations is an array of shape (height, width) to fill, usually a np.memmap.
+                center, size, max_iterations, smooth are as in render_tile.
+                workers is the number of processes to use.
+                tile_size is the side of the tiles in pixels.
+
+    MODIFIES: iterations, the tile store.
+
+    EFFECTS: Copies the tiles found in the tile store. Keeps at most
+             TILES_IN_FLIGHT_PER_WORKER of the other tiles per worker queued on the
+             process pool, handing the next tile to whichever worker is free, and copies
+             every finished tile into iterations and into the tile store (unless the
+             whole image is larger than the store, whose tiles it would all evict).
+             When the view crosses the real axis (and is not a deep zoom), the tiles of the
+             mirrored rows (see get_mirror) are skipped and those rows copied at the end.
+    """
+    height, width = iterations.shape
+    store = get_tile_store()
+    kind = "smooth" if smooth else "precise"
+    mirror = None
+    if not is_deep_zoom(center, size, (width, height)):
+        mirror = get_mirror(get_domain_range(center, size)[1], (width, height))
+
+    def get_key(rect):
+        return get_tile_key(center, size, (width, height), rect, max_iterations, kind)
+
+    writable = store and iterations.nbytes <= store.size_cap
+
+    def store_tile(rect, tile):
+        copy_tile(iterations, rect, tile)
+        if writable:
+            store.put(get_key(rect), tile, max_iterations)
+
+    tiles = []
+    for rect in get_tiles((width, height), tile_size):
+        if mirror is not None:
+            rect = clip_rows(rect, mirror[0])
+            if rect is None:
+                continue
+        stored = store and store.get(get_key(rect))
+        if stored:
+            copy_tile(iterations, rect, stored[0])
+        else:
+            tiles.append(rect)
+    if workers <= 1:
+        for rect in tiles:
+            store_tile(*render_tile(center, size, (width, height), rect, max_iterations, smooth))
+    else:
+        pool = get_process_pool(workers)
+        pending = set()
+        for rect in tiles:
+            pending.add(pool.submit(render_tile, center, size, (width, height), rect, max_iterations, smooth))
+            if len(pending) >= workers * TILES_IN_FLIGHT_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    store_tile(*future.result())
+        for future in pending:
+            store_tile(*future.result())
+    if mirror is not None:
+        computed, offset, targets, sources = mirror
+        for start in range(0, targets.size, tile_size): # a band of rows at a time, to bound memory
+            iterations[targets[start:start + tile_size]] = iterations[sources[start:start + tile_size]]
+
+
+def copy_tile(iterations, rect, tile):
+    """
+    PURPOSE: Copy a finished tile into the image's escape-count buffer.
+    """
+    x, y, width, height = rect
+    iterations[y:y + height, x:x + width] = tile
+
+
+def write_png_chunk(file, chunk_type, data):
+    """
+    PURPOSE: Write one PNG chunk (length, type, data, CRC) to an open binary file.
+    """
+    file.write(struct.pack(">I", len(data)))
+    file.write(chunk_type)
+    file.write(data)
+    file.write(struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+
+def write_png_header(file, width, height):
+    """
+    PURPOSE: Write the PNG signature and the header chunk of an 8-bit RGB image.
+    """
+    file.write(b"\x89PNG\r\n\x1a\n")
+    write_png_chunk(file, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+
+def write_rgb_png(path, rgb):
+    """
+    PURPOSE: Write an RGB image held in memory as a PNG.
+
+    PARAMETERS: path is the output file name.
+                rgb is a uint8 array of shape (height, width, 3).
+    """
+    height, width = rgb.shape[:2]
+    rows = np.zeros((height, 1 + 3 * width), dtype=np.uint8) # filter byte 0 per row
+    rows[:, 1:] = rgb.reshape(height, 3 * width)
+    with open(path, "wb") as file:
+        write_png_header(file, width, height)
+        write_png_chunk(file, b"IDAT", zlib.compress(rows.tobytes(), 6))
+        write_png_chunk(file, b"IEND", b"")
+
+
+def write_png(path, iterations, max_iterations, palette=None, band_height=RENDER_TILE_SIZE):
+    """
+    PURPOSE: Color an escape-count buffer and write it as an RGB PNG, one band of rows at a time.
+
+    PARAMETERS: path is the output file name.
+                iterations is an array of shape (height, width), usually a np.memmap.
+                max_iterations is a positive integer.
+                palette is a key of PALETTES (defaults to the current palette).
+                band_height is the number of rows colored and compressed at once.
+
+    EFFECTS: Only one band of colored rows is in memory at any time.
+    """
+    height, width = iterations.shape
+    compressor = zlib.compressobj(6)
+    with open(path, "wb") as file:
+        write_png_header(file, width, height)
+        for y in range(0, height, band_height):
+            band = np.asarray(iterations[y:y + band_height])
+            if np.issubdtype(band.dtype, np.floating):
+                rgb = color_smooth_iterations(band, max_iterations, palette)
+            else:
+                rgb = color_iterations(band, max_iterations, palette)
+            rows = np.zeros((band.shape[0], 1 + 3 * width), dtype=np.uint8) # filter byte 0 per row
+            rows[:, 1:] = rgb.reshape(band.shape[0], 3 * width)
+            data = compressor.compress(rows.tobytes())
+            if data:
+                write_png_chunk(file, b"IDAT", data)
+        write_png_chunk(file, b"IDAT", compressor.flush())
+        write_png_chunk(file, b"IEND", b"")
+
+
+def render_png(path, frame_size, center, view_width, max_iterations, palette=None, smooth=False,
+               workers=None, tile_size=RENDER_TILE_SIZE, iterations_path=None):
+    """
+    PURPOSE: Render a Mandelbrot viewport headless and save it as a PNG.
+
+    PARAMETERS: path is the output PNG file name.
+                frame_size is a tuple (width, height) in pixels.
+                center is a tuple (x, y) of Decimals; view_width is a Decimal. The view
+                height follows from the image's aspect ratio, so pixels are square.
+                max_iterations is a positive integer.
+                palette is a key of PALETTES (defaults to the current palette).
+                smooth selects smooth coloring (not available for deep zooms).
+                workers is the number of processes (defaults to RENDER_WORKERS).
+                tile_size is the side of the tiles in pixels.
+                iterations_path is where the escape counts are memory-mapped; a temporary
+                file is used (and deleted) when it is None.
+    """
+    width, height = frame_size
+    size = (view_width, view_width * height / width)
+    if smooth and is_deep_zoom(center, size, frame_size):
+        raise ValueError("Smooth coloring is not available for deep zooms")
+    workers = RENDER_WORKERS if workers is None else workers
+    dtype = np.float32 if smooth else get_iteration_dtype(max_iterations)
+
+    keep = iterations_path is not None
+    if not keep:
+        handle, iterations_path = tempfile.mkstemp(suffix=".iterations", dir=os.path.dirname(os.path.abspath(path)))
+        os.close(handle)
+    try:
+        iterations = np.memmap(iterations_path, dtype=dtype, mode="w+", shape=(height, width))
+        compute_image(iterations, center, size, max_iterations, smooth, workers, tile_size)
+        iterations.flush()
+        write_png(path, iterations, max_iterations, palette, tile_size)
+        del iterations
+    finally:
+        if not keep:
+            os.remove(iterations_path)
+
+
+def main():
+    """
+    PURPOSE: Command-line entry point of the headless renderer.
+    """
+    parser = argparse.ArgumentParser(description="Render the Mandelbrot set to a PNG without a display.")
+    parser.add_argument("output", help="PNG file to write")
+    parser.add_argument("--size", type=int, nargs=2, default=(WIDTH, HEIGHT), metavar=("WIDTH", "HEIGHT"),
+                        help="image size in pixels")
+    parser.add_argument("--center", type=Decimal, nargs=2, default=CENTER, metavar=("X", "Y"),
+                        help="center of the view in the complex plane (any precision)")
+    parser.add_argument("--width", type=Decimal, default=SIZE[0], help="width of the view in the complex plane")
+    parser.add_argument("--iterations", type=int, default=MAX_ITERATIONS, help="iteration limit")
+    parser.add_argument("--palette", choices=list(PALETTES), default=get_palette_name(), help="color palette")
+    parser.add_argument("--smooth", action="store_true", help="use smooth (fractional escape count) coloring")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS, help="number of worker processes")
+    parser.add_argument("--tile-size", type=int, default=RENDER_TILE_SIZE, help="tile side in pixels")
+    parser.add_argument("--keep-iterations", metavar="FILE",
+                        help="keep the memory-mapped escape counts in FILE instead of a temporary file")
+    parser.add_argument("--no-tile-store", action="store_true",
+                        help="neither read nor write the on-disk tile store")
+    parser.add_argument("--store-tiles", action="store_true",
+                        help="also add the computed tiles to the tile store (it is only read by default)")
+    parser.add_argument("--backend", default=BACKEND,
+                        help=f"compute backend: auto or one of {', '.join(get_backend_names())} (default: %(default)s)")
+    args = parser.parse_args()
+    if args.no_tile_store:
+        tile_store.TILE_STORE_ENABLED = False
+    tile_store.TILE_STORE_WRITES = args.store_tiles
+    select_backend(args.backend)
+    report = get_calibration_report()
+    if report:
+        print(report)
+
+    try:
+        render_png(args.output, tuple(args.size), tuple(args.center), args.width, args.iterations,
+                   args.palette, args.smooth, args.workers, args.tile_size, args.keep_iterations)
+    except ValueError as error:
+        parser.error(str(error))
+    finally:
+        shutdown_process_pool()
+    print("Wrote", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import queue
+import threading
+from progressive import progressive_passes
+from instrumentation import take_profiler, save_profile
+
+RENDER_FPS = 60 # how often the event loop polls the worker and refreshes the display
+
+
+class RenderWorker:
+    """
+    PURPOSE: Render Mandelbrot viewports progressively on a background thread so the
+             event loop can keep handling events while a frame is computed.
+    """
+
+    def __init__(self):
+        """
+        PURPOSE: Initialize an idle RenderWorker.
+
+        EFFECTS: Sets up the result queue, the job counter and the cancel flag of the
+                 (not yet started) job.
+        """
+        self.results = queue.Queue() # (job_id, step, image) tuples posted by the thread
+        self.job_id = 0 # id of the most recently submitted job
+        self.cancel_event = threading.Event() # set to stop the job in flight
+        self.thread = None # thread running the current job
+        self.done = True # whether the current job has posted its final image
+        self.result = None # final image of the last finished job, until taken
+
+    def submit(self, domain, my_range, frame_size, max_iterations):
+        """
+        PURPOSE: Start rendering a viewport, cancelling the job in flight.
+
+        PARAMETERS: domain, my_range are tuples of floats (the viewport's x and y limits).
+                    frame_size is a tuple (width, height) in pixels.
+                    max_iterations is a positive integer.
+
+        MODIFIES: self.job_id, self.cancel_event, self.thread, self.done.
+
+        EFFECTS: Starts a daemon thread that posts every progressive update to self.results.
+        """
+        self.submit_passes(progressive_passes(domain, my_range, frame_size, max_iterations))
+
+    def submit_passes(self, passes):
+        """
+        PURPOSE: Start consuming any generator of (step, image) updates, cancelling the job in flight.
+
+        PARAMETERS: passes is a generator shaped like progressive_passes; its last update
+                    must be the finished frame.
+
+        MODIFIES: self.job_id, self.cancel_event, self.thread, self.done, self.result.
+
+        EFFECTS: Starts a daemon thread that posts every update to self.results.
+        """
+        self.cancel()
+        self.job_id += 1
+        self.cancel_event = threading.Event()
+        self.done = False
+        self.result = None
+        self.thread = threading.Thread(target=self.run, args=(self.job_id, self.cancel_event, passes),
+                                       daemon=True)
+        self.thread.start()
+
+    def run(self, job_id, cancel_event, passes):
+        """
+        PURPOSE: Body of the render thread.
+
+        EFFECTS: Posts (job_id, step, image) for every update of passes, then
+                 (job_id, None, image) with the finished frame.
+                 Returns as soon as cancel_event is set.
+                 When a profile was requested (see request_profile), the job is profiled
+                 on this thread, where the frame is computed.
+        """
+        profiler = take_profiler()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            image = None
+            for step, image in passes:
+                if cancel_event.is_set():
+                    return
+                self.results.put((job_id, step, image))
+            self.results.put((job_id, None, image))
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                save_profile(profiler)
+
+    def cancel(self):
+        """
+        PURPOSE: Stop the job in flight, if any.
+
+        MODIFIES: self.cancel_event, self.done.
+
+        EFFECTS: The thread stops at its next time slice; its pending results are ignored by poll.
+        """
+        self.cancel_event.set()
+        self.done = True
+
+    def poll(self):
+        """
+        PURPOSE: Fetch the most recent update of the current job without blocking.
+
+        MODIFIES: self.results (drained), self.done, self.result.
+
+        RETURNS: The latest (step, image) tuple posted by the current job since the last
+                 poll, or None if there is nothing new. Updates of cancelled jobs are dropped.
+        """
+        latest = None
+        while True:
+            try:
+                job_id, step, image = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if job_id != self.job_id or self.cancel_event.is_set():
+                continue
+            if step is None:
+                self.done = True
+                self.result = image
+            else:
+                latest = step, image
+        return latest
+
+    def take_result(self):
+        """
+        PURPOSE: Hand over the finished frame of the last job, once.
+
+        MODIFIES: self.result.
+
+        RETURNS: The escape counts of the finished frame, or None if no job finished
+                 since the last call.
+        """
+        result = self.result
+        self.result = None
+        return result
+
+    def is_busy(self) -> bool:
+        """
+        PURPOSE: Determine whether a job is still being rendered.
+
+        RETURNS: True while the current job has not delivered its final image.
+        """
+        return not self.done
@@ -1,12 +1,18 @@
 import random
 import time
+import numpy as np
 from fractals.utils import *
 from events import *
+from instrumentation import start_render, finish_render, render_stage, count_stat
 
 TOP = (WIDTH / 2, 50)
 LEFT = (50, HEIGHT - 50)
 RIGHT = (WIDTH - 50, HEIGHT - 50)
 CORNERS = [TOP, LEFT, RIGHT]
+CHUNK_SIZE = 65536 # points generated per batch
+MEMORY_DEPTH = 48 # past corner choices that still move a point by more than 2 ** -48 pixels
+REVEAL_TIME = 1.5 # seconds the chaos game animation takes to draw all of its points
+DISPLAY_FPS = 60 # display updates per second while drawing
 pygame.init()
 
 
@@ -25,35 +31,107 @@ def initialize_sierpinski_screen(screen):
 
 
 
-def draw_sierpinski(screen, start, repetitions):
+def draw_sierpinski(screen, start, repetitions, reveal_time=REVEAL_TIME):
     """
     PURPOSE: Draw the Sierpinski triangle on the screen using chaos method.
     PARAMETERS: Screen is a valid pygame Surface object.
                 Start is a coordinate in the screen of type tuple.
                 Repetitions is the number of points that will be drawn on screen of type int.
+                reveal_time is how long, in seconds, the drawing is animated for.
+                With 0 the points are drawn as fast as possible.
 
     MODIFIES:
         - The contents of the Pygame display surface SCREEN
         - The Pygame display buffer
     EFFECTS:
-        - Plots `repetitions` points of the Sierpinski triangle
-        - Updates the display incrementally
+        - Plots `repetitions` points of the Sierpinski triangle, generated in batches
+        - Updates the display DISPLAY_FPS times per second, plotting the points that are
+          due at each frame so the whole triangle appears over reveal_time seconds
+        - Times point generation, pixel writes and flips when instrumentation is on
     """
 
+    start_render("chaos game")
     place_point(screen, start)
-    n = repetitions
-    while n > 0:
-        new_start = get_new_point(start)
-        place_point(screen, new_start)
-        start = new_start
-        n -= 1
+    chunk_size = get_chunk_size(repetitions, reveal_time)
+    clock = pygame.time.Clock()
+    started = time.perf_counter()
+    last_flip = started
+    drawn = 0
+    points = chaos_game_points(start, repetitions, chunk_size)
+    while True:
+        with render_stage("points"):
+            batch = next(points, None)
+        if batch is None:
+            break
+        xs, ys = batch
+        with render_stage("pixel writes"):
+            place_points(screen, xs, ys, COLOR_BLACK)
+        count_stat("points", xs.size)
+        drawn += xs.size
+        now = time.perf_counter()
+        if reveal_time > 0:
+            # wait for the frame at which these points are due
+            while (now - started) < reveal_time * drawn / repetitions:
+                with render_stage("flip"):
+                    pygame.display.flip()
+                pygame.event.pump()
+                clock.tick(DISPLAY_FPS)
+                now = time.perf_counter()
+        elif now - last_flip >= 1 / DISPLAY_FPS:
+            with render_stage("flip"):
+                pygame.display.flip()
+            pygame.event.pump()
+            last_flip = now
+
+    with render_stage("flip"):
+        pygame.display.flip()
+    finish_render()
+
+
+def get_chunk_size(repetitions, reveal_time) -> int:
+    """
+    PURPOSE: Batch size for draw_sierpinski: small enough to animate smoothly over reveal_time.
 
+    RETURNS: CHUNK_SIZE, or the number of points per display frame if that is smaller.
+    """
+    if reveal_time <= 0:
+        return CHUNK_SIZE
+    return max(1, min(CHUNK_SIZE, int(repetitions / (reveal_time * DISPLAY_FPS))))
 
-        if n % 100 == 0:
-            pygame.display.flip()
-            time.sleep(0.001)
 
-    pygame.display.flip()
+def chaos_game_points(start, count, chunk_size=CHUNK_SIZE, corners=None, rng=None):
+    """
+    PURPOSE: Generate chaos-game points in batches of NumPy arrays.
+
+    PARAMETERS: start is the (x, y) starting point.
+                count is the number of points to generate.
+                chunk_size is the number of points per batch.
+                corners is a sequence of (x, y) attractor corners (defaults to CORNERS).
+                rng is an optional numpy.random.Generator.
+
+    YIELDS: Tuples (xs, ys) of float arrays with the next points, in order.
+
+    EFFECTS: Implements the same rule as get_new_point (move halfway towards a random corner)
+             without a Python loop per point: point i of a batch is
+             start / 2 ** (i + 1) + sum over j of corner[i - j] / 2 ** (j + 1),
+             and only the last MEMORY_DEPTH corners matter at pixel precision.
+             Points are not rounded to integers between steps as get_new_point does.
+    """
+    corners = np.array(CORNERS if corners is None else corners, dtype=np.float64)
+    rng = np.random.default_rng() if rng is None else rng
+    x, y = start
+    while count > 0:
+        size = min(chunk_size, count)
+        chosen = corners[rng.integers(len(corners), size=size)]
+        position = np.zeros((size, 2))
+        for j in range(min(MEMORY_DEPTH, size)):
+            position[j:] += chosen[:size - j] * 0.5 ** (j + 1)
+        start_weight = 0.5 ** np.arange(1, size + 1)
+        position[:, 0] += x * start_weight
+        position[:, 1] += y * start_weight
+        yield position[:, 0], position[:, 1]
+        x, y = position[-1]
+        count -= size
 
 
 def draw_line_and_point(screen, mouse_position):
@@ -1,34 +1,140 @@
 from fractals.utils import *
-import time
+import numpy as np
+from instrumentation import start_render, finish_render, render_stage, count_stat
 
+MIN_SIDE = 2 # triangles with shorter sides are not subdivided further, in pixels
+LEVEL_DELAY = 150 # milliseconds between levels when the construction is animated
 
 
-def sierpinski_recursive(screen, top, left, right):
+def draw_sierpinski_levels(screen, top, left, right, instant=False):
     """
-    PURPOSE: Recursively draw a Sierpinski triangle on the screen.
+    PURPOSE: Draw a Sierpinski triangle on the screen one subdivision level at a time, leaving
+             the pace and the display updates to the caller.
 
     PARAMETERS: screen is a valid pygame Surface object.
                 top, left, right are tuples (x, y) representing coordinates of the triangle's vertices.
-    MODIFIES: screen, display is updated recursively.
+                instant draws the final image directly with draw_sierpinski_pascal.
+
+    MODIFIES: screen (its pixel buffer is updated), one level per step of the generator.
+
+    YIELDS: The number of triangles drawn, after every level (once, after the whole image, when instant).
 
     EFFECTS:
-           - Draws outlined triangles on the screen to create the Sierpinski triangle pattern.
-           - Updates the display after drawing each triangle.
-       """
-    side = compute_distance(top, left)
-    if side < 2: # base case
-        create_triangle(screen, COLOR_BLACK, (0,0), (0,0), (0,0), 0)
-    else: # recursive case
-        create_triangle(screen, COLOR_BLACK, top, left, right, 1)
-        pygame.display.update()  # update the screen
-        # pygame.time.delay(1)
-        top_left = compute_mid_point_c(top, left)
-        top_right = compute_mid_point_c(top, right)
-        left_right = compute_mid_point_c(left, right)
-
-        sierpinski_recursive(screen, top, top_left, top_right) # top
-        sierpinski_recursive(screen, top_left, left, left_right) # left
-        sierpinski_recursive(screen, top_right, left_right, right) # right
+           - Draws the outlines of all the triangles of a level at once (level-order instead
+             of depth-first), starting with the outer triangle, until sides are under MIN_SIDE.
+           - Times the vertex math and pixel writes when instrumentation is on.
+    """
+    if instant:
+        with render_stage("pixel writes"):
+            draw_sierpinski_pascal(screen, top, left, right)
+        yield 1
+        return
+    levels = get_levels(top, left, right)
+    while True:
+        with render_stage("vertices"):
+            vertices = next(levels, None)
+        if vertices is None:
+            return
+        with render_stage("pixel writes"):
+            draw_triangles(screen, vertices, COLOR_BLACK)
+        count_stat("triangles", len(vertices))
+        yield len(vertices)
+
+
+def sierpinski_recursive(screen, top, left, right, instant=False):
+    """
+    PURPOSE: Draw a Sierpinski triangle on the screen (see draw_sierpinski_levels) and show it.
+
+    MODIFIES: screen, the pygame display.
+
+    EFFECTS: Every level of a level-order construction redraws lines all over the triangle,
+             so no dirty rectangle would be smaller than the triangle itself: the display is
+             flipped once, when the image is complete.
+    """
+    start_render("recursive triangle")
+    for _ in draw_sierpinski_levels(screen, top, left, right, instant):
+        pass
+    with render_stage("flip"):
+        pygame.display.flip()
+    finish_render()
 
 
+def get_levels(top, left, right):
+    """
+    PURPOSE: Generate the triangles of the Sierpinski construction level by level.
+
+    PARAMETERS: top, left, right are tuples (x, y), the vertices of the outer triangle.
+
+    YIELDS: A float array of shape (n, 3, 2) per level with the (top, left, right) vertices
+            of its n = 3 ** level triangles, while their sides are at least MIN_SIDE.
+    """
+    vertices = np.array([[top, left, right]], dtype=np.float64)
+    while compute_distance(vertices[0, 0], vertices[0, 1]) >= MIN_SIDE:
+        yield vertices
+        top, left, right = vertices[:, 0], vertices[:, 1], vertices[:, 2]
+        top_left = compute_mid_point(top, left)
+        top_right = compute_mid_point(top, right)
+        left_right = compute_mid_point(left, right)
+        vertices = np.concatenate((np.stack((top, top_left, top_right), axis=1), # top
+                                   np.stack((top_left, left, left_right), axis=1), # left
+                                   np.stack((top_right, left_right, right), axis=1))) # right
+
+
+def draw_triangles(screen, vertices, color):
+    """
+    PURPOSE: Draw the outlines of many triangles with a single write to the pixel buffer.
+
+    PARAMETERS: screen is a valid pygame Surface object.
+                vertices is an array of shape (n, 3, 2) of triangle corners.
+                color is a tuple of 3 integers (R, G, B).
+
+    MODIFIES: screen (its pixel buffer is updated).
+
+    EFFECTS: Samples every edge at least once per pixel of its length and plots the samples.
+    """
+    starts = vertices
+    ends = np.roll(vertices, -1, axis=1)
+    length = np.hypot(*(ends - starts).reshape(-1, 2).T).max()
+    steps = np.linspace(0, 1, int(np.ceil(length)) + 1)
+    points = starts[:, :, None, :] + steps[:, None] * (ends - starts)[:, :, None, :]
+    place_points(screen, points[..., 0].ravel(), points[..., 1].ravel(), color)
+
+
+def get_bounding_rect(vertices) -> pygame.Rect:
+    """
+    PURPOSE: Returns the smallest pygame.Rect containing all the given (x, y) points.
+    """
+    points = vertices.reshape(-1, 2)
+    low = np.floor(points.min(axis=0)).astype(int)
+    high = np.floor(points.max(axis=0)).astype(int) + 1
+    return pygame.Rect(*low, *(high - low))
+
+
+def draw_sierpinski_pascal(screen, top, left, right):
+    """
+    PURPOSE: Draw the Sierpinski triangle at pixel resolution without recursion.
+
+    PARAMETERS: screen is a valid pygame Surface object.
+                top, left, right are tuples (x, y), the vertices of the triangle.
+
+    MODIFIES: screen (its pixel buffer is updated).
+
+    EFFECTS: Every pixel of the triangle's bounding box is mapped to lattice coordinates
+             (u, v) along the top-left and top-right edges, the lattice having n = 2 ** k
+             cells per edge so that no cell is smaller than a pixel. Pascal's triangle
+             has an odd binomial coefficient C(u + v, v) exactly when u & v == 0, and the
+             odd entries are the cells of the Sierpinski triangle, which are colored black.
+    """
+    corners = np.array([top, left, right], dtype=np.float64)
+    rect = get_bounding_rect(corners).clip(screen.get_rect())
+    side = max(compute_distance(top, left), compute_distance(top, right), compute_distance(left, right))
+    n = 1 << max(0, int(np.log2(max(side, 1))))
 
+    xs, ys = np.mgrid[rect.left:rect.right, rect.top:rect.bottom]
+    to_left, to_right = corners[1] - corners[0], corners[2] - corners[0]
+    determinant = to_left[0] * to_right[1] - to_left[1] * to_right[0]
+    dx, dy = xs + 0.5 - corners[0][0], ys + 0.5 - corners[0][1]
+    u = np.floor(n * (dx * to_right[1] - dy * to_right[0]) / determinant).astype(np.int64)
+    v = np.floor(n * (to_left[0] * dy - to_left[1] * dx) / determinant).astype(np.int64)
+    inside = (u >= 0) & (v >= 0) & (u + v < n) & ((u & v) == 0)
+    place_points(screen, xs[inside], ys[inside], COLOR_BLACK)
@@ -0,0 +1,214 @@
+import hashlib
+import os
+import struct
+from collections import OrderedDict
+from decimal import Decimal, localcontext
+import numpy as np
+
+TILE_STORE_ENABLED = True # check the on-disk store before computing tiles and frames
+TILE_STORE_WRITES = True # add computed tiles to the store; the batch renderers only read it unless asked
+TILE_STORE_DIR = os.environ.get("FRACTALS_TILE_STORE",
+                                os.path.join(os.path.expanduser("~"), ".cache", "fractals", "tiles"))
+TILE_STORE_SIZE_CAP = 512 * 1024 * 1024 # bytes of tiles kept on disk before the least recently used are evicted
+TILE_STORE_VERSION = 2 # bump whenever the kernels change their results, to invalidate stored tiles
+ZOOM_DIGITS = 12 # significant digits of the pixel size kept in tile keys
+
+# Fixed 32-byte header: magic, version, dtype code, rows, columns, iteration limit, padding.
+# The tile follows as a C-ordered array of rows x columns values.
+TILE_HEADER = struct.Struct("<4sHHIII12x")
+TILE_MAGIC = b"FTIL"
+TILE_DTYPES = [np.dtype(np.uint16), np.dtype(np.uint32), np.dtype(np.int32), np.dtype(np.float32)]
+TILE_EXTENSION = ".tile"
+
+shared_tile_store = None # TileStore shared by the renderers of this process, opened on first use
+
+
+class TileStore:
+    """
+    PURPOSE: Keep escape-count tiles on disk across sessions, evicting the least recently
+             used ones when the store grows over its size cap.
+    """
+
+    def __init__(self, directory=TILE_STORE_DIR, size_cap=TILE_STORE_SIZE_CAP):
+        """
+        PURPOSE: Open (and create if needed) a tile store directory.
+
+        PARAMETERS: directory is where the tile files are kept.
+                    size_cap is the maximum number of bytes the tile files may use.
+
+        EFFECTS: Indexes the tiles already in the directory, least recently used first.
+        """
+        self.directory = directory
+        self.size_cap = size_cap
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(TILE_EXTENSION):
+                status = entry.stat()
+                files.append((status.st_mtime, entry.name, status.st_size))
+        self.entries = OrderedDict((name, size) for mtime, name, size in sorted(files)) # file name -> bytes
+        self.size_used = sum(self.entries.values())
+
+    def get_path(self, key) -> str:
+        """
+        PURPOSE: Returns the file that stores the tile of a key from get_tile_key.
+        """
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + TILE_EXTENSION)
+
+    def get(self, key):
+        """
+        PURPOSE: Look up a stored tile.
+
+        PARAMETERS: key is a string returned by get_tile_key.
+
+        MODIFIES: The tile becomes the most recently used one (its file's mtime is updated).
+                  Tiles written by another TILE_STORE_VERSION, or damaged, are removed.
+
+        RETURNS: A tuple (iterations, max_iterations) or None if the tile is not stored.
+                 iterations is a read-only np.memmap of the file, so no data is copied;
+                 max_iterations is the limit the tile was computed with.
+        """
+        path = self.get_path(key)
+        try:
+            with open(path, "rb") as file:
+                header = file.read(TILE_HEADER.size)
+            magic, version, dtype_code, rows, columns, max_iterations = TILE_HEADER.unpack(header)
+            if magic != TILE_MAGIC or version != TILE_STORE_VERSION or dtype_code >= len(TILE_DTYPES):
+                raise ValueError("Stale or damaged tile")
+            dtype = TILE_DTYPES[dtype_code]
+            if os.path.getsize(path) != TILE_HEADER.size + rows * columns * dtype.itemsize:
+                raise ValueError("Truncated tile")
+            iterations = np.memmap(path, dtype=dtype, mode="r", offset=TILE_HEADER.size, shape=(rows, columns))
+            os.utime(path)
+        except FileNotFoundError:
+            self.entries.pop(os.path.basename(path), None)
+            return None
+        except (ValueError, struct.error):
+            self.remove(os.path.basename(path))
+            return None
+        name = os.path.basename(path)
+        if name in self.entries:
+            self.entries.move_to_end(name)
+        return iterations, max_iterations
+
+    def put(self, key, iterations, max_iterations):
+        """
+        PURPOSE: Store a tile.
+
+        PARAMETERS: key is a string returned by get_tile_key.
+                    iterations is a 2D array of escape counts (uint16, uint32, int32 or float32).
+                    max_iterations is the iteration limit it was computed with.
+
+        MODIFIES: The store directory, self.entries, self.size_used.
+
+        EFFECTS: Writes the file under a temporary name and renames it, so readers never see
+                 a partial tile, then evicts least recently used tiles until the store fits
+                 its size cap. Tiles larger than the whole cap are not stored, nor is
+                 anything while TILE_STORE_WRITES is off.
+        """
+        if not TILE_STORE_WRITES:
+            return
+        iterations = np.ascontiguousarray(iterations)
+        if iterations.dtype not in TILE_DTYPES:
+            iterations = iterations.astype(np.int32)
+        size = TILE_HEADER.size + iterations.nbytes
+        if size > self.size_cap:
+            return
+        path = self.get_path(key)
+        name = os.path.basename(path)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(TILE_HEADER.pack(TILE_MAGIC, TILE_STORE_VERSION, TILE_DTYPES.index(iterations.dtype),
+                                        iterations.shape[0], iterations.shape[1], int(max_iterations)))
+            file.write(iterations.tobytes())
+        os.replace(temporary, path)
+        self.size_used -= self.entries.pop(name, 0)
+        self.entries[name] = size
+        self.size_used += size
+        while self.size_used > self.size_cap:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, name):
+        """
+        PURPOSE: Delete a tile file from the store.
+
+        MODIFIES: The store directory, self.entries, self.size_used.
+        """
+        self.size_used -= self.entries.pop(name, 0)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def get_tile_store():
+    """
+    PURPOSE: Return the tile store of this process, opening it on first use.
+
+    MODIFIES: shared_tile_store (global variable).
+
+    RETURNS: The shared TileStore, or None when TILE_STORE_ENABLED is off or the store
+             directory cannot be created.
+    """
+    global shared_tile_store
+    if not TILE_STORE_ENABLED:
+        return None
+    if shared_tile_store is None:
+        try:
+            shared_tile_store = TileStore()
+        except OSError:
+            return None
+    return shared_tile_store
+
+
+def get_exact_key(value) -> str:
+    """
+    PURPOSE: Write a number exactly, in the same way for every representation of its value.
+
+    PARAMETERS: value is a Decimal, float or int.
+
+    RETURNS: The normalized Decimal string of value ("0.5" for 0.5, Decimal("0.50") and
+             Decimal("5E-1")), with all of its digits.
+    """
+    value = Decimal(str(value))
+    if not value:
+        return "0"
+    with localcontext() as context:
+        context.prec = len(value.as_tuple().digits)
+        return str(value.normalize())
+
+
+def get_tile_key(center, size, frame_size, rect, max_iterations, kind) -> str:
+    """
+    PURPOSE: Build the store key of a tile of a viewport.
+
+    PARAMETERS: center is a tuple (x, y) and size a tuple (width, height) of Decimals or floats.
+                frame_size is a tuple (width, height) of the whole frame in pixels.
+                rect is a tuple (x, y, width, height), the tile inside the frame.
+                max_iterations is the iteration limit.
+                kind names the kernel and layout of the tile (e.g. "full", "smooth"), so
+                results of different renderers are never mixed.
+
+    RETURNS: A string combining the zoom level (the pixel size rounded to ZOOM_DIGITS
+             significant digits), the exact center (see get_exact_key), the frame size,
+             the tile and the iteration limit. Keying on the exact center means a tile is
+             only reused for the pixel grid it was computed on, never shifted by a fraction
+             of a pixel.
+    """
+    frame_width, frame_height = frame_size
+    size = Decimal(str(size[0])), Decimal(str(size[1]))
+    with localcontext() as context:
+        context.prec = max(28, 20 - min(size).adjusted() + ZOOM_DIGITS)
+        pixel_width, pixel_height = size[0] / frame_width, size[1] / frame_height
+    zoom = f"{pixel_width:.{ZOOM_DIGITS - 1}e}/{pixel_height:.{ZOOM_DIGITS - 1}e}"
+    x, y = get_exact_key(center[0]), get_exact_key(center[1])
+    return "|".join(str(part) for part in (kind, zoom, x, y, frame_width, frame_height, *rect, max_iterations))
+
+
+def get_float_tile_key(domain, my_range, frame_size, rect, max_iterations, kind) -> str:
+    """
+    PURPOSE: Build the store key of a tile of a viewport given as float limits (DOMAIN, RANGE).
+    """
+    center = ((domain[0] + domain[1]) / 2, (my_range[0] + my_range[1]) / 2)
+    size = (domain[1] - domain[0], my_range[1] - my_range[0])
+    return get_tile_key(center, size, frame_size, rect, max_iterations, kind)
@@ -1,9 +1,14 @@
+import os
+import numpy as np
 import pygame
 WIDTH, HEIGHT = 600, 600
 COLOR_BLACK = (0, 0, 0)
 COLOR_WHITE = (255, 255, 255)
 COLOR_GREEN = (68, 255, 5)
 
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__)) # relative asset paths are relative to this folder
+assets = {} # images, scaled images and fonts loaded so far, keyed by (kind, path, size)
+
 def place_point(screen, point):
     """
     PURPOSE:  To draw a point on the given screen at the specified coordinates.
@@ -14,14 +19,58 @@ def place_point(screen, point):
     """
     screen.set_at((int(point[0]), int(point[1])), COLOR_BLACK)
 
+def place_points(screen, xs, ys, color):
+    """
+    PURPOSE:  To draw many points on the given screen at once.
+    PARAMETERS: screen is a valid pygame Surface object.
+              xs and ys are arrays of numbers (int or float) of the same length.
+              color is a tuple of 3 integers (R, G, B).
+    MODIFIES: screen (its pixel buffer is updated).
+    EFFECTS: Colors the pixels at (⌊x⌋, ⌊y⌋) with color in one write to the pixel buffer.
+             Points outside the screen are ignored.
+    """
+    xs, ys = np.asarray(xs).astype(np.intp), np.asarray(ys).astype(np.intp)
+    width, height = screen.get_size()
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    pixels = pygame.surfarray.pixels2d(screen)
+    pixels[xs[inside], ys[inside]] = screen.map_rgb(color)
+    del pixels # unlocks the surface
+
 def get_font(size) -> pygame.font.Font:
     """
     PURPOSE: Getter for program's font
     PARAMETERS: Consumes an int which will be the size of the font
     RETURNS: The pixel font used in the program
     """
-    font = pygame.font.Font("pixelFont.ttf", size)
-    return font
+    return load_font("pixelFont.ttf", size)
+
+def load_font(path, size) -> pygame.font.Font:
+    """
+    PURPOSE: Load a font once per process.
+    PARAMETERS: path is the font file (relative to ASSET_DIR), size is an int.
+    MODIFIES: assets (the font is stored the first time it is loaded).
+    RETURNS: The shared pygame Font object for path and size.
+    """
+    key = ("font", path, size)
+    if key not in assets:
+        assets[key] = pygame.font.Font(os.path.join(ASSET_DIR, path), size)
+    return assets[key]
+
+def load_image(path, size=None) -> pygame.Surface:
+    """
+    PURPOSE: Load an image, optionally scaled, once per process.
+    PARAMETERS: path is the image file (relative to ASSET_DIR).
+                size is an optional tuple (width, height) to scale the image to.
+    MODIFIES: assets (the image, and the scaled variant, are stored the first time they are used).
+    RETURNS: The shared pygame Surface. Callers must not draw on it.
+    """
+    key = ("image", path, None if size is None else tuple(size))
+    if key not in assets:
+        if size is None:
+            assets[key] = pygame.image.load(os.path.join(ASSET_DIR, path))
+        else:
+            assets[key] = pygame.transform.scale(load_image(path), size)
+    return assets[key]
 
 def compute_mid_point(point_1, point_2) -> int or float:
     """
@@ -87,12 +136,11 @@ def display_title(font, screen):
 def get_main_screen_background():
     """
     PURPOSE: To load and scale the background image for the main screen.
-    EFFECTS: Loads an image from disk.
-             Scales the image to dimensions (WIDTH, HEIGHT).
+    EFFECTS: Loads the image from disk and scales it to dimensions (WIDTH, HEIGHT)
+             the first time it is used (see load_image).
     RETURNS: A pygame Surface object containing the scaled background image.
     """
-    image = pygame.image.load('images/background.png')
-    return pygame.transform.scale(image, (WIDTH, HEIGHT))
+    return load_image('images/background.png', (WIDTH, HEIGHT))
 
 def compute_end_point(point, mid_point):
     """
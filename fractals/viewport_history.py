@@ -0,0 +1,333 @@
+from collections import OrderedDict
+from decimal import Decimal, localcontext
+import numpy as np
+from mandelbrot import *
+from perturbation import compute_iterations_precise
+from progressive import viewport_passes
+from deepening import get_starting_iterations
+from tile_store import get_tile_store, get_tile_key
+
+CACHE_MEMORY_BUDGET = 256 * 1024 * 1024 # bytes of iteration buffers and frames kept in memory
+PAN_STEP = 100 # pixels the view moves per pan
+PAN_KEYS = {pygame.K_LEFT: (-PAN_STEP, 0), pygame.K_RIGHT: (PAN_STEP, 0),
+            pygame.K_UP: (0, -PAN_STEP), pygame.K_DOWN: (0, PAN_STEP)}
+BACK_KEY = pygame.K_b
+FORWARD_KEY = pygame.K_f
+
+
+class RenderCache:
+    """
+    PURPOSE: Keep rendered Mandelbrot frames in memory, evicting the least recently used
+             ones when the memory budget is exceeded.
+    """
+
+    def __init__(self, memory_budget=CACHE_MEMORY_BUDGET):
+        """
+        PURPOSE: Initialize an empty cache.
+
+        PARAMETERS: memory_budget is the maximum number of bytes the cached buffers may use.
+        """
+        self.entries = OrderedDict() # key -> [iterations, frame, palette, max_iterations], least recently used first
+        self.memory_budget = memory_budget
+        self.memory_used = 0
+
+    def get(self, key):
+        """
+        PURPOSE: Look up a rendered viewport.
+
+        PARAMETERS: key is a tuple returned by get_cache_key.
+
+        MODIFIES: The entry becomes the most recently used one. Its frame is recolored
+                  if the palette changed since it was stored.
+
+        RETURNS: A tuple (iterations, frame, max_iterations) or None if the viewport is not cached.
+                 frame is the RGB array of the iterations colored with the current palette,
+                 max_iterations the limit the iterations were computed with (it can be
+                 higher than the limit in the key when the frame was deepened).
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        iterations, frame, palette, max_iterations = entry
+        if palette != get_palette_name():
+            frame = color_iterations(iterations, max_iterations)
+            entry[1:3] = frame, get_palette_name()
+        return iterations, frame, max_iterations
+
+    def put(self, key, iterations, max_iterations):
+        """
+        PURPOSE: Store the escape counts of a rendered viewport and its colored frame.
+
+        PARAMETERS: key is a tuple returned by get_cache_key.
+                    iterations is the viewport's escape-count buffer.
+                    max_iterations is the iteration limit it was computed with.
+
+        MODIFIES: self.entries, self.memory_used.
+
+        EFFECTS: Evicts least recently used entries until the cache fits its memory budget.
+                 Buffers larger than the whole budget are not stored.
+        """
+        iterations = iterations.astype(get_iteration_dtype(max_iterations))
+        frame = color_iterations_mandelbrot(iterations, max_iterations)
+        size = iterations.nbytes + frame.nbytes
+        if size > self.memory_budget:
+            return
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = [iterations, frame, get_palette_name(), max_iterations]
+        self.memory_used += size
+        while self.memory_used > self.memory_budget:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        """
+        PURPOSE: Drop an entry from the cache.
+
+        MODIFIES: self.entries, self.memory_used.
+        """
+        iterations, frame, palette, max_iterations = self.entries.pop(key)
+        self.memory_used -= iterations.nbytes + frame.nbytes
+
+
+class ViewportHistory:
+    """
+    PURPOSE: Remember the visited viewports so the user can go back and forward, like a browser.
+    """
+
+    def __init__(self, viewport):
+        """
+        PURPOSE: Start a history at the given viewport.
+
+        PARAMETERS: viewport is a tuple (center, size) of the first view (see get_precise_viewport).
+        """
+        self.viewports = [viewport] # visited viewports, oldest first
+        self.index = 0 # position of the current viewport in self.viewports
+
+    def current(self) -> tuple:
+        """
+        PURPOSE: Returns the viewport currently shown.
+        """
+        return self.viewports[self.index]
+
+    def push(self, viewport):
+        """
+        PURPOSE: Visit a new viewport.
+
+        MODIFIES: self.viewports, self.index.
+
+        EFFECTS: Drops the viewports ahead of the current one (they can no longer be
+                 reached with forward) and appends viewport.
+        """
+        del self.viewports[self.index + 1:]
+        self.viewports.append(viewport)
+        self.index += 1
+
+    def back(self) -> bool:
+        """
+        PURPOSE: Move to the previous viewport.
+
+        MODIFIES: self.index.
+
+        RETURNS: True if there was a previous viewport, False otherwise.
+        """
+        if self.index == 0:
+            return False
+        self.index -= 1
+        return True
+
+    def forward(self) -> bool:
+        """
+        PURPOSE: Move to the next viewport after going back.
+
+        MODIFIES: self.index.
+
+        RETURNS: True if there was a next viewport, False otherwise.
+        """
+        if self.index == len(self.viewports) - 1:
+            return False
+        self.index += 1
+        return True
+
+
+def get_cache_key(center, size, frame_size, max_iterations) -> tuple:
+    """
+    PURPOSE: Build the RenderCache key of a viewport rendered at a given size and iteration limit.
+
+    PARAMETERS: max_iterations is the viewport's starting limit (see get_starting_iterations),
+                also when the cached frame was deepened past it.
+    """
+    return tuple(center), tuple(size), tuple(frame_size), max_iterations
+
+
+def get_frame_key(center, size, frame_size, max_iterations) -> str:
+    """
+    PURPOSE: Build the tile store key of a whole frame of the Mandelbrot screen.
+
+    PARAMETERS: max_iterations is the viewport's starting limit, as in get_cache_key.
+    """
+    return get_tile_key(center, size, frame_size, (0, 0) + tuple(frame_size), max_iterations, "frame")
+
+
+def store_frame(center, size, frame_size, max_iterations, iterations, iterations_limit):
+    """
+    PURPOSE: Save a finished frame to the tile store, so later sessions can show it at once.
+
+    PARAMETERS: center, size, frame_size, max_iterations are as in get_frame_key.
+                iterations is the frame's escape-count buffer.
+                iterations_limit is the limit it was computed with (higher if deepened).
+    """
+    store = get_tile_store()
+    if store:
+        store.put(get_frame_key(center, size, frame_size, max_iterations),
+                  iterations.astype(get_iteration_dtype(iterations_limit)), iterations_limit)
+
+
+def load_stored_frame(cache, center, size, frame_size, max_iterations):
+    """
+    PURPOSE: Move a frame from the tile store into a RenderCache.
+
+    PARAMETERS: cache is a RenderCache.
+                center, size, frame_size, max_iterations are as in get_frame_key.
+
+    RETURNS: The cache entry (see RenderCache.get), or None if the frame is not stored.
+    """
+    store = get_tile_store()
+    stored = store and store.get(get_frame_key(center, size, frame_size, max_iterations))
+    if not stored:
+        return None
+    key = get_cache_key(center, size, frame_size, max_iterations)
+    cache.put(key, stored[0], stored[1])
+    return cache.get(key)
+
+
+def get_zoomed_out_viewport(center, size) -> tuple:
+    """
+    PURPOSE: Compute the viewport that undoes one zoom_in step around the same center.
+
+    PARAMETERS: center, size describe the viewport (see get_precise_viewport).
+
+    RETURNS: A tuple (center, new_size).
+    """
+    with localcontext() as context:
+        context.prec = get_precision(size)
+        zoom = Decimal(str(ZOOM_IN_FACTOR))
+        return center, (size[0] / zoom, size[1] / zoom)
+
+
+def get_panned_viewport(center, size, frame_size, shift) -> tuple:
+    """
+    PURPOSE: Compute the viewport moved by a whole number of pixels.
+
+    PARAMETERS: center, size describe the viewport (see get_precise_viewport).
+                frame_size is a tuple (width, height) in pixels.
+                shift is a tuple (dx, dy) of integers; positive values move the view
+                right and down, so pixel (x, y) of the new view shows pixel (x + dx, y + dy)
+                of the old one.
+
+    RETURNS: A tuple (new_center, size).
+    """
+    dx, dy = shift
+    with localcontext() as context:
+        context.prec = get_precision(size)
+        return (center[0] + dx * size[0] / frame_size[0], center[1] - dy * size[1] / frame_size[1]), size
+
+
+def pan_iterations(previous, center, size, frame_size, max_iterations, shift) -> np.ndarray:
+    """
+    PURPOSE: Compute the escape counts of a panned viewport from those of the previous one.
+
+    PARAMETERS: previous is the escape-count buffer of the viewport before the pan.
+                center, size describe the panned viewport (see get_panned_viewport).
+                frame_size is a tuple (width, height) in pixels.
+                max_iterations is a positive integer.
+                shift is the (dx, dy) pan in pixels.
+
+    RETURNS: An int32 array of shape frame_size.
+
+    EFFECTS: Copies the overlapping part of previous, shifted, and only iterates the
+             newly exposed columns and rows.
+    """
+    width, height = frame_size
+    dx, dy = shift
+    iterations = np.empty(frame_size, dtype=np.int32)
+
+    overlap_width, overlap_height = width - abs(dx), height - abs(dy)
+    if overlap_width <= 0 or overlap_height <= 0:
+        return compute_iterations_precise(center, size, frame_size, max_iterations)
+    new_x, old_x = max(-dx, 0), max(dx, 0)
+    new_y, old_y = max(-dy, 0), max(dy, 0)
+    iterations[new_x:new_x + overlap_width, new_y:new_y + overlap_height] = \
+        previous[old_x:old_x + overlap_width, old_y:old_y + overlap_height]
+
+    strips = []
+    if dx:
+        strips.append((width - dx if dx > 0 else 0, 0, abs(dx), height))
+    if dy:
+        strips.append((new_x, height - dy if dy > 0 else 0, overlap_width, abs(dy)))
+    for x, y, strip_width, strip_height in strips:
+        iterations[x:x + strip_width, y:y + strip_height] = \
+            compute_iterations_precise(center, size, frame_size, max_iterations, (x, y, strip_width, strip_height))
+    return iterations
+
+
+def pan_passes(previous, center, size, frame_size, max_iterations, shift):
+    """
+    PURPOSE: Wrap pan_iterations as a single-update job for RenderWorker.submit_passes.
+
+    YIELDS: One tuple (1, iterations) with the finished frame.
+    """
+    yield 1, pan_iterations(previous, center, size, frame_size, max_iterations, shift)
+
+
+def show_viewport(screen, worker, cache, viewport, pan_from=None, states=None):
+    """
+    PURPOSE: Make a viewport current and display it, from the cache when possible.
+
+    PARAMETERS: screen is a valid pygame Surface object.
+                worker is a RenderWorker.
+                cache is a RenderCache.
+                viewport is a tuple (center, size) (see get_precise_viewport).
+                pan_from is an optional tuple (previous_viewport, shift) when viewport
+                was reached by panning.
+                states is an optional list receiving the iteration state of a full render
+                (see viewport_passes).
+
+    MODIFIES: CENTER, SIZE, DOMAIN, RANGE, MAX_ITERATIONS (globals of the mandelbrot module),
+              screen, worker.
+
+    EFFECTS: Sets the iteration limit to the viewport's starting limit, or to the limit of
+             the frame it is drawn from. On a hit in the cache, or else in the tile store,
+             cancels any render and blits the stored frame. Otherwise,
+             if the view was panned from a cached viewport, submits a job that only
+             computes the exposed strips, and else submits a full progressive render
+             (with the perturbation engine for deep viewports).
+
+    RETURNS: The stored escape counts if the frame was drawn from the cache or the store,
+             None if a render was submitted.
+    """
+    set_precise_viewport(*viewport)
+    frame_size = screen.get_size()
+    max_iterations = get_starting_iterations(*get_viewport())
+    set_max_iterations(max_iterations)
+
+    entry = cache.get(get_cache_key(*viewport, frame_size, max_iterations))
+    if entry is None:
+        entry = load_stored_frame(cache, *viewport, frame_size, max_iterations)
+    if entry is not None:
+        worker.cancel()
+        set_max_iterations(entry[2])
+        pygame.surfarray.blit_array(screen, entry[1])
+        return entry[0]
+
+    if pan_from is not None:
+        previous_viewport, shift = pan_from
+        previous = cache.get(get_cache_key(*previous_viewport, frame_size, max_iterations))
+        if previous is not None:
+            iterations, frame, previous_max = previous
+            set_max_iterations(previous_max)
+            worker.submit_passes(pan_passes(iterations, *viewport, frame_size, previous_max, shift))
+            return None
+
+    worker.submit_passes(viewport_passes(*viewport, frame_size, max_iterations, states))
+    return None
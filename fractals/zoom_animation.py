@@ -0,0 +1,330 @@
+import argparse
+import math
+import os
+import queue
+import sys
+import threading
+import time
+from decimal import Decimal, localcontext
+
+if __package__: # run as python -m fractals.zoom_animation: the modules import each other by their bare names
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+from mandelbrot import *
+from perturbation import is_deep_zoom
+from deepening import get_starting_iterations
+from render import compute_image, write_rgb_png, RENDER_TILE_SIZE
+from backends import BACKEND, get_backend_names, get_calibration_report
+import tile_store
+
+ZOOM_RATE = Decimal("1.05") # factor the view width shrinks by from one frame to the next
+FRAME_COUNT = 120 # frames exported by default
+KEYFRAME_SCALE = 2 # keyframes are rendered at this multiple of the frame resolution
+RESAMPLE_TAPS = 2 # bilinear samples per side of a frame pixel when it is derived from a keyframe
+PIPELINE_DEPTH = 2 # keyframes (and frames) waiting between two stages, to bound memory
+FRAME_NAME = "frame_{:05d}.png" # file name of the frames, numbered from 0
+
+
+def get_zoom_viewport(start_center, start_width, target, zoom_rate, frame_size, index) -> tuple:
+    """
+    PURPOSE: Compute the viewport of one frame of a zoom animation.
+
+    PARAMETERS: start_center is a tuple (x, y) of Decimals and start_width a Decimal, the view
+                of frame 0.
+                target is a tuple (x, y) of Decimals, the point zoomed into.
+                zoom_rate is a Decimal, the factor the view width shrinks by per frame
+                (below 1 the animation zooms out).
+                frame_size is a tuple (width, height) in pixels; pixels are square.
+                index is the frame number.
+
+    RETURNS: A tuple (center, size) (see get_precise_viewport). Every frame is the previous
+             one scaled about target, so target stays at the same pixel of all frames.
+    """
+    with localcontext() as context:
+        context.prec = get_precision((start_width, start_width)) + int(index * abs(math.log10(zoom_rate))) + 2
+        zoom = zoom_rate ** index
+        width = start_width / zoom
+        center = (target[0] + (start_center[0] - target[0]) / zoom,
+                  target[1] + (start_center[1] - target[1]) / zoom)
+        return center, (width, width * frame_size[1] / frame_size[0])
+
+
+def plan_keyframes(frame_count, zoom_rate, scale=KEYFRAME_SCALE) -> tuple:
+    """
+    PURPOSE: Group the frames of a zoom animation around the keyframes they are derived from.
+
+    PARAMETERS: frame_count is the number of frames.
+                zoom_rate is the zoom factor per frame (see get_zoom_viewport).
+                scale is the resolution of the keyframes relative to the frames.
+
+    RETURNS: A tuple (scale, groups). groups is a list of (keyframe, frames) tuples, keyframe
+             being the frame whose view is rendered and frames the frames taken from it.
+             A keyframe at scale times the frame resolution serves every frame its view
+             covers without upscaling, i.e. whose width is at least 1 / scale of its own.
+             When that is no more than scale * scale frames (the extra cost of one keyframe),
+             keyframes do not pay off: every frame is then rendered on its own and scale is 1.
+    """
+    log_rate = abs(math.log(zoom_rate))
+    per_keyframe = frame_count if log_rate == 0 else int(math.log(scale) / log_rate + 1e-9) + 1
+    if scale <= 1 or per_keyframe <= scale * scale:
+        return 1, [(index, [index]) for index in range(frame_count)]
+    groups = []
+    for first in range(0, frame_count, per_keyframe):
+        frames = list(range(first, min(first + per_keyframe, frame_count)))
+        groups.append((frames[0] if zoom_rate >= 1 else frames[-1], frames)) # the widest view of the group
+    return scale, groups
+
+
+def get_frame_mapping(frame_viewport, keyframe_viewport, frame_size, scale) -> tuple:
+    """
+    PURPOSE: Find where the pixels of a frame fall in the image of a keyframe.
+
+    PARAMETERS: frame_viewport, keyframe_viewport are tuples (center, size) of Decimals.
+                frame_size is a tuple (width, height) of the frames in pixels.
+                scale is the resolution of the keyframe relative to the frames.
+
+    RETURNS: A tuple (x, y, step): frame pixel (i, j) is at keyframe pixel
+             (x + i * step, y + j * step), using the pixel mapping of pixel_to_complex.
+    """
+    (center, size), (key_center, key_size) = frame_viewport, keyframe_viewport
+    with localcontext() as context:
+        context.prec = get_precision(size) + 2
+        key_pixel = key_size[0] / (frame_size[0] * scale)
+        x = ((center[0] - size[0] / 2) - (key_center[0] - key_size[0] / 2)) / key_pixel
+        y = ((key_center[1] + key_size[1] / 2) - (center[1] + size[1] / 2)) / key_pixel
+        return float(x), float(y), float(size[0] / frame_size[0] / key_pixel)
+
+
+def get_resample_weights(start, step, count, size, taps) -> tuple:
+    """
+    PURPOSE: Weights of derive_frame along one axis of the keyframe.
+
+    PARAMETERS: start, step give the keyframe coordinate start + k * step of frame pixel k.
+                count is the number of frame pixels along the axis.
+                size is the number of keyframe pixels along the axis.
+                taps is the number of samples per frame pixel.
+
+    RETURNS: A tuple (indices, weights) of arrays of shape (count, 2 * taps): frame pixel k
+             is the sum of the keyframe pixels indices[k] times weights[k], i.e. the average
+             of taps linear interpolations spread over the keyframe pixels it covers.
+             Coordinates past the edges take the edge pixels.
+    """
+    offsets = (np.arange(taps) + 0.5) / taps - 0.5
+    positions = start + (np.arange(count)[:, np.newaxis] + offsets) * step
+    low = np.clip(np.floor(positions).astype(np.intp), 0, size - 2)
+    fraction = np.clip(positions - low, 0, 1)
+    weights = np.concatenate((1 - fraction, fraction), axis=1) / taps
+    return np.concatenate((low, low + 1), axis=1), weights.astype(np.float32)
+
+
+def derive_frame(keyframe_rgb, mapping, frame_size, taps=RESAMPLE_TAPS) -> np.ndarray:
+    """
+    PURPOSE: Rescale the part of a keyframe a frame shows to the frame resolution.
+
+    PARAMETERS: keyframe_rgb is the colored keyframe, a uint8 array of shape (height, width, 3).
+                mapping is a tuple returned by get_frame_mapping.
+                frame_size is a tuple (width, height) in pixels.
+                taps is the number of samples per side of a frame pixel.
+
+    RETURNS: A uint8 array of shape (height, width, 3): every frame pixel is the average of
+             taps x taps bilinear samples spread over the keyframe pixels it covers.
+
+    EFFECTS: The filter is separable, so the rows the frame uses are resampled horizontally
+             first and the result vertically.
+    """
+    x, y, step = mapping
+    frame_width, frame_height = frame_size
+    columns, column_weights = get_resample_weights(x, step, frame_width, keyframe_rgb.shape[1], taps)
+    rows, row_weights = get_resample_weights(y, step, frame_height, keyframe_rgb.shape[0], taps)
+    used_rows, inverse = np.unique(rows, return_inverse=True)
+    rows = inverse.reshape(rows.shape)
+    band = keyframe_rgb[used_rows]
+    horizontal = np.zeros((used_rows.size, frame_width, 3), dtype=np.float32)
+    for k in range(columns.shape[1]):
+        horizontal += band[:, columns[:, k]] * column_weights[:, k, np.newaxis]
+    frame = np.zeros((frame_height, frame_width, 3), dtype=np.float32)
+    for k in range(rows.shape[1]):
+        frame += horizontal[rows[:, k]] * row_weights[:, k, np.newaxis, np.newaxis]
+    return np.rint(frame).astype(np.uint8)
+
+
+def run_stage(work, inputs, outputs, errors):
+    """
+    PURPOSE: Body of a pipeline thread: hand every item of a queue to a function.
+
+    PARAMETERS: work is a function taking an item and returning an iterable of results.
+                inputs is the queue.Queue of items, ended by None.
+                outputs is the queue.Queue the results are put on, or None for the last stage.
+                errors is a list shared by the stages, collecting their exceptions.
+
+    EFFECTS: Once any stage has failed, the remaining items are taken without being worked
+             on, so the stages before never block on a full queue. None is always passed on.
+    """
+    while True:
+        item = inputs.get()
+        if item is None:
+            break
+        if errors:
+            continue
+        try:
+            for result in work(item):
+                if outputs is not None:
+                    outputs.put(result)
+        except Exception as error:
+            errors.append(error)
+    if outputs is not None:
+        outputs.put(None)
+
+
+def export_zoom(directory, frame_size, start_center, start_width, target, zoom_rate=ZOOM_RATE,
+                frame_count=FRAME_COUNT, max_iterations=None, palette=None, smooth=False, workers=None,
+                tile_size=RENDER_TILE_SIZE, keyframe_scale=KEYFRAME_SCALE) -> int:
+    """
+    PURPOSE: Render a zoom animation headless, as a numbered sequence of PNG frames.
+
+    PARAMETERS: directory is where the frames are written (created if needed).
+                frame_size is a tuple (width, height) in pixels.
+                start_center, start_width, target, zoom_rate are as in get_zoom_viewport;
+                target must be inside the first frame.
+                frame_count is the number of frames.
+                max_iterations is the iteration limit of every frame, so colors do not shift
+                during the animation. Defaults to the starting limit of the deepest frame
+                (see get_starting_iterations).
+                palette is a key of PALETTES (defaults to the current palette).
+                smooth selects smooth coloring (not available for deep zooms).
+                workers is the number of processes (defaults to RENDER_WORKERS).
+                tile_size is the side of the tiles in pixels.
+                keyframe_scale is as in plan_keyframes.
+
+    EFFECTS: Three stages overlap: this thread computes the escape counts of the keyframes
+             (on the process pool, like render_png), a second thread colors them and derives
+             their frames (see derive_frame), and a third one compresses and writes the PNGs.
+             At most PIPELINE_DEPTH items wait between two stages.
+             When the zoom step is large, every frame is computed on its own (see plan_keyframes).
+             The stages are timed when instrumentation is on (see start_render).
+
+    RETURNS: The number of keyframes computed.
+    """
+    width, height = frame_size
+    if not (abs(target[0] - start_center[0]) <= start_width / 2
+            and abs(target[1] - start_center[1]) <= start_width * height / width / 2):
+        raise ValueError("The target must be inside the first frame")
+    first, last = (get_zoom_viewport(start_center, start_width, target, zoom_rate, frame_size, index)
+                   for index in (0, frame_count - 1))
+    deepest = min(first, last, key=lambda viewport: viewport[1][0])
+    if smooth and is_deep_zoom(*deepest, frame_size):
+        raise ValueError("Smooth coloring is not available for deep zooms")
+    if max_iterations is None:
+        max_iterations = get_starting_iterations(*get_domain_range(*deepest))
+    workers = RENDER_WORKERS if workers is None else workers
+    scale, groups = plan_keyframes(frame_count, zoom_rate, keyframe_scale)
+    key_size = (width * scale, height * scale)
+    os.makedirs(directory, exist_ok=True)
+
+    def color_keyframe(item):
+        keyframe, iterations, frames = item
+        with render_stage("coloring"):
+            if smooth:
+                rgb = color_smooth_iterations(iterations, max_iterations, palette)
+            else:
+                rgb = color_iterations(iterations, max_iterations, palette)
+        keyframe_viewport = get_zoom_viewport(start_center, start_width, target, zoom_rate, frame_size, keyframe)
+        for index in frames:
+            if scale == 1:
+                yield index, rgb
+                continue
+            viewport = get_zoom_viewport(start_center, start_width, target, zoom_rate, frame_size, index)
+            with render_stage("rescaling"):
+                frame = derive_frame(rgb, get_frame_mapping(viewport, keyframe_viewport, frame_size, scale), frame_size)
+            yield index, frame
+
+    def write_frame(item):
+        index, rgb = item
+        with render_stage("png writes"):
+            write_rgb_png(os.path.join(directory, FRAME_NAME.format(index)), rgb)
+        count_stat("frames", 1)
+        return ()
+
+    start_render("zoom animation")
+    count_stat("keyframes", len(groups))
+    keyframes, frames = queue.Queue(PIPELINE_DEPTH), queue.Queue(PIPELINE_DEPTH)
+    errors = []
+    threads = [threading.Thread(target=run_stage, args=(color_keyframe, keyframes, frames, errors), daemon=True),
+               threading.Thread(target=run_stage, args=(write_frame, frames, None, errors), daemon=True)]
+    for thread in threads:
+        thread.start()
+    try:
+        for keyframe, group in groups:
+            if errors:
+                break
+            center, size = get_zoom_viewport(start_center, start_width, target, zoom_rate, key_size, keyframe)
+            iterations = np.empty((key_size[1], key_size[0]), dtype=np.float32 if smooth
+                                  else get_iteration_dtype(max_iterations))
+            with render_stage("compute"):
+                compute_image(iterations, center, size, max_iterations, smooth, workers, tile_size)
+            keyframes.put((keyframe, iterations, group))
+    finally:
+        keyframes.put(None)
+        for thread in threads:
+            thread.join()
+    finish_render()
+    if errors:
+        raise errors[0]
+    return len(groups)
+
+
+def main():
+    """
+    PURPOSE: Command-line entry point of the zoom animation exporter.
+    """
+    parser = argparse.ArgumentParser(description="Render a Mandelbrot zoom animation to numbered PNG frames.")
+    parser.add_argument("directory", help="folder the frames are written to")
+    parser.add_argument("--target", type=Decimal, nargs=2, required=True, metavar=("X", "Y"),
+                        help="point zoomed into (any precision); it keeps its place in the frame")
+    parser.add_argument("--center", type=Decimal, nargs=2, default=CENTER, metavar=("X", "Y"),
+                        help="center of the first frame")
+    parser.add_argument("--width", type=Decimal, default=SIZE[0], help="width of the first frame in the complex plane")
+    parser.add_argument("--rate", type=Decimal, default=ZOOM_RATE,
+                        help="zoom factor from one frame to the next (below 1 zooms out)")
+    parser.add_argument("--frames", type=int, default=FRAME_COUNT, help="number of frames")
+    parser.add_argument("--size", type=int, nargs=2, default=(WIDTH, HEIGHT), metavar=("WIDTH", "HEIGHT"),
+                        help="frame size in pixels")
+    parser.add_argument("--iterations", type=int, help="iteration limit (default: grows with the final zoom)")
+    parser.add_argument("--palette", choices=list(PALETTES), default=get_palette_name(), help="color palette")
+    parser.add_argument("--smooth", action="store_true", help="use smooth (fractional escape count) coloring")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS, help="number of worker processes")
+    parser.add_argument("--tile-size", type=int, default=RENDER_TILE_SIZE, help="tile side in pixels")
+    parser.add_argument("--keyframe-scale", type=int, default=KEYFRAME_SCALE,
+                        help="resolution of the keyframes relative to the frames (1 renders every frame)")
+    parser.add_argument("--no-tile-store", action="store_true",
+                        help="neither read nor write the on-disk tile store")
+    parser.add_argument("--store-tiles", action="store_true",
+                        help="also add the computed tiles to the tile store (it is only read by default)")
+    parser.add_argument("--backend", default=BACKEND,
+                        help=f"compute backend: auto or one of {', '.join(get_backend_names())} (default: %(default)s)")
+    args = parser.parse_args()
+    if args.rate <= 0 or args.frames <= 0:
+        parser.error("--rate and --frames must be positive")
+    if args.no_tile_store:
+        tile_store.TILE_STORE_ENABLED = False
+    tile_store.TILE_STORE_WRITES = args.store_tiles
+    select_backend(args.backend)
+    report = get_calibration_report()
+    if report:
+        print(report)
+
+    started = time.perf_counter()
+    try:
+        keyframes = export_zoom(args.directory, tuple(args.size), tuple(args.center), args.width, tuple(args.target),
+                                args.rate, args.frames, args.iterations, args.palette, args.smooth, args.workers,
+                                args.tile_size, args.keyframe_scale)
+    except ValueError as error:
+        parser.error(str(error))
+    finally:
+        shutdown_process_pool()
+    print(f"Wrote {args.frames} frames ({keyframes} computed) to {args.directory} "
+          f"in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()